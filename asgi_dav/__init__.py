@@ -11,17 +11,45 @@ from asgiref.typing import (
 )
 
 from urllib.parse import unquote, urlparse, parse_qs
+import asyncio
+import dataclasses
+import functools
+import logging
 from fs.base import FS
+from fs.info import Info
 import fs.errors
+import fs.path
 from jinja2 import Environment, PackageLoader
 import humanize
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
 from xml.dom.minidom import parseString, Document
+from xml.etree.ElementTree import ParseError, fromstring
 from hashlib import md5
 import http.client  # for HTTP status codes constants
-from .utils import concat_uri, make_data_url, get_parent_href
+from .utils import concat_uri, content_disposition, make_data_url, get_parent_href
 from .props import FileProps, PropfindResponseBuilder
 from .events import *
+from .watcher import InotifyWatcher
+from .singleflight import PathLocks, SingleFlight
+from .cache import NegativeCache
+from .backends import Backend, FSBackend, OSBackend, ResourceInfo
+from .metrics import (
+    Metrics,
+    InstrumentedBackend,
+    RequestStats,
+    current_request_stats,
+)
+from .profiling import RequestProfiler, annotate
+from .uploads import ChunkedUploads
+from .search import SearchIndex, SearchQuery, parse_basicsearch
+from .quota import QuotaIndex
+from .dedup import DedupBackend
+from .scheduling import Overloaded, Scheduler
+from .mounts import MountBackend
+from .archive import ARCHIVE_FORMATS, ChunkWriter, format_available, walk, write_archive
 
 # ------------------------------------------------------------------------------
 __version__ = "0.1.0"
@@ -35,6 +63,18 @@ CHUNK_SIZE = 128 * 1024
 # The maximum number of items to display in a directory listing
 MAX_DIR_LISTING = 10000
 
+# The number of archive chunks buffered ahead of a slow client
+ARCHIVE_QUEUE_SIZE = 8
+
+# The maximum number of archives built at the same time
+ARCHIVE_WORKERS = 8
+
+# The number of search results sent at once
+SEARCH_RESULTS_PER_CHUNK = 200
+
+# The content type of the PATCH requests, as defined by SabreDAV
+PARTIAL_UPDATE_CONTENT_TYPE = "application/x-sabredav-partialupdate"
+
 
 # ------------------------------------------------------------------------------
 class DAVApp(EventSupport):
@@ -42,14 +82,66 @@ class DAVApp(EventSupport):
     An ASGI application that handles WebDAV requests
     """
 
-    def __init__(self, fs: FS):
+    def __init__(
+        self,
+        fs: FS | Backend | dict[str, FS | Backend],
+        watch: bool = False,
+        negative_cache: NegativeCache | None = None,
+        metrics: Metrics | None = None,
+        profiler: RequestProfiler | None = None,
+        uploads: ChunkedUploads | None = None,
+        search: SearchIndex | None = None,
+        quota: QuotaIndex | None = None,
+        scheduler: Scheduler | None = None,
+    ):
         """
         Create a new DAVApp instance
-        :param fs: the filesystem to use
+        :param fs: the filesystem to use, either a pyfilesystem2 FS or a Backend
+            (e.g. OSBackend, for a local directory), or a dict of path prefix ->
+            filesystem, to serve several of them
+        :param watch: also report the changes made to the filesystem by other
+            programs, using inotify. Requires a local filesystem (e.g. OSFS) on Linux.
+            When several filesystems are served, the local ones are watched
+        :param negative_cache: an optional cache of the paths known not to exist
+        :param metrics: where to record latencies, sizes and cache statistics.
+            Nothing is measured when None
+        :param profiler: profiles a sample of the requests, and the slow ones
+        :param uploads: enables the resumable, chunked uploads of large files
+        :param search: an index of the resources, enabling the SEARCH method
+        :param quota: the usage of the collections, and their quota limits
+        :param scheduler: limits the expensive requests run at once, shares them
+            fairly between the clients, and shapes the bandwidth
         """
         super().__init__()
         assert fs, "fs is required"
-        self.fs = fs
+        # the filesystems by path prefix, if several are served
+        self.mounts: MountBackend | None = None
+        if isinstance(fs, dict):
+            self.backend = self.mounts = MountBackend(fs)
+        else:
+            self.backend = fs if isinstance(fs, Backend) else FSBackend(fs)
+        # the pyfilesystem2 FS, if any
+        self.fs = getattr(self.backend, "fs", None)
+        self.metrics = metrics
+        if metrics is not None:
+            self.backend = InstrumentedBackend(self.backend, metrics)
+            metrics.add_collector(self._collect_metrics)
+        self.profiler = profiler
+        self.uploads = uploads
+        self.search = search
+        self.quota = quota
+        self.scheduler = scheduler
+        self.watch = watch
+        # (path prefix, watcher of the filesystem mounted there)
+        self.watchers: list[tuple[str, InotifyWatcher]] = []
+        if watch and self.mounts is not None and not self._watched_roots():
+            raise ValueError("watch=True requires at least one local filesystem")
+        self.singleflight = SingleFlight()
+        self.write_locks = PathLocks()
+        # the archives are built in their own threads : they wait for the backend,
+        # which must not be starved by them. Created on the first archive
+        self.archive_executor: ThreadPoolExecutor | None = None
+        self.negative_cache = negative_cache
         self.jinja_env = Environment(loader=PackageLoader(__name__, "templates"))
         self.jinja_env.globals["make_data_url"] = make_data_url
         self.jinja_env.globals["naturalsize"] = humanize.naturalsize
@@ -65,7 +157,11 @@ class DAVApp(EventSupport):
             "PROPPATCH": self.proppatch,
             "COPY": self.copy_or_move,
             "MOVE": self.copy_or_move,
+            "PATCH": self.patch,
         }
+        if search is not None:
+            self.handlers["SEARCH"] = self.search_request
+            self.on("*", search.on_event)
 
     async def __call__(
         self, scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable
@@ -81,14 +177,317 @@ class DAVApp(EventSupport):
                     await send({"type": "lifespan.shutdown.complete"})
                     return
         elif scope["type"] == "http":
-            handler = self.handlers.get(scope["method"], self.not_implemented)
-            await handler(scope, receive, send)
+            if self.profiler is not None:
+                await self.profiler.profile(self._handle, scope, receive, send)
+            else:
+                await self._handle(scope, receive, send)
         else:
             raise ValueError(f"Unsupported scope type {scope['type']}")
 
-    async def startup(self): ...
+    async def _handle(
+        self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
+    ):
+        handler = self.handlers.get(scope["method"], self.not_implemented)
+        if self.scheduler is not None and (op := self.scheduler.operation(scope)):
+            handler = functools.partial(self._admitted, op, handler)
+        if self.metrics is None:
+            await handler(scope, receive, send)
+        else:
+            await self._handle_instrumented(handler, scope, receive, send)
+
+    async def _handle_instrumented(
+        self,
+        handler,
+        scope: HTTPScope,
+        receive: ASGIReceiveCallable,
+        send: ASGISendCallable,
+    ):
+        """
+        Run a handler, measuring its latency, the time it spent in the backend
+        and in send(), and the bytes it received and sent
+        """
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+
+        async def timed_receive():
+            message = await receive()
+            stats.bytes_in += len(message.get("body", b""))
+            return message
+
+        async def timed_send(message):
+            start = time.perf_counter()
+            await send(message)
+            stats.send_time += time.perf_counter() - start
+            if message["type"] == "http.response.start":
+                stats.status = message["status"]
+            else:
+                stats.bytes_out += len(message.get("body", b""))
+
+        start = time.perf_counter()
+        try:
+            await handler(scope, timed_receive, timed_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request_stats.reset(token)
+            method = scope["method"] if scope["method"] in self.handlers else "other"
+            status = str(stats.status or 500)
+            m = self.metrics
+            m.observe("asgi_dav_request_seconds", elapsed, method=method, status=status)
+            m.observe(
+                "asgi_dav_request_backend_seconds", stats.backend_time, method=method
+            )
+            m.observe("asgi_dav_request_send_seconds", stats.send_time, method=method)
+            m.inc("asgi_dav_received_bytes_total", stats.bytes_in, method=method)
+            m.inc("asgi_dav_sent_bytes_total", stats.bytes_out, method=method)
+
+    async def _admitted(
+        self,
+        op: str,
+        handler,
+        scope: HTTPScope,
+        receive: ASGIReceiveCallable,
+        send: ASGISendCallable,
+    ):
+        """
+        Run a handler once the scheduler gives the request a slot, or answer
+        429/503 when it cannot
+        """
+        try:
+            ticket = await self.scheduler.acquire(scope)
+        except Overloaded as e:
+            if self.metrics is not None:
+                self.metrics.inc(
+                    "asgi_dav_scheduler_rejected_total", op=op, status=str(e.status)
+                )
+            await self.respond(
+                send,
+                e.status,
+                http.client.responses[e.status],
+                {"Retry-After": str(e.retry_after)},
+            )
+            return
+        if self.metrics is not None:
+            self.metrics.observe("asgi_dav_scheduler_wait_seconds", ticket.wait, op=op)
+        try:
+            await handler(scope, receive, send)
+        finally:
+            self.scheduler.release(ticket)
+
+    async def _throttle(self, scope: HTTPScope, nbytes: int):
+        if self.scheduler is not None and self.scheduler.shapes_bandwidth:
+            await self.scheduler.throttle(scope, nbytes)
+
+    def _collect_metrics(self):
+        for op, stats in self.singleflight.stats().items():
+            labels = {"op": op}
+            yield "asgi_dav_singleflight_calls_total", "counter", labels, stats["calls"]
+            yield "asgi_dav_singleflight_collapsed_total", "counter", labels, stats[
+                "collapsed"
+            ]
+        if self.negative_cache is not None:
+            cache = self.negative_cache
+            yield "asgi_dav_negative_cache_avoided_total", "counter", {}, cache.avoided
+            yield "asgi_dav_negative_cache_entries", "gauge", {}, len(cache)
+        if self.scheduler is not None:
+            scheduler = self.scheduler
+            yield "asgi_dav_scheduler_active", "gauge", {}, scheduler.active
+            yield "asgi_dav_scheduler_queued", "gauge", {}, scheduler.queued
+
+    async def startup(self):
+        await self.backend.start()
+        if self.uploads is not None:
+            await self.uploads.start(self.backend)
+        if self.search is not None:
+            await self.search.start(self.backend)
+        if self.quota is not None:
+            await self.quota.start(self.backend)
+        if self.watch:
+            for prefix, root in self._watched_roots():
+                watcher = InotifyWatcher(
+                    root,
+                    functools.partial(self._on_external_change, prefix=prefix),
+                    overflow_callback=self.invalidate_all,
+                )
+                await watcher.start()
+                self.watchers.append((prefix, watcher))
+
+    async def shutdown(self):
+        for _, watcher in self.watchers:
+            await watcher.stop()
+        self.watchers = []
+        if self.profiler is not None:
+            await self.profiler.stop()
+        if self.uploads is not None:
+            await self.uploads.stop()
+        if self.search is not None:
+            await self.search.stop()
+        if self.quota is not None:
+            await self.quota.stop()
+        if self.archive_executor is not None:
+            self.archive_executor.shutdown(wait=False, cancel_futures=True)
+            self.archive_executor = None
+        await self.backend.close()
+
+    async def emit(self, event: eventname_t, *args, **kwargs):
+        staging = False
+        for evt in args:
+            if isinstance(evt, Event):
+                if event != "file.downloaded":
+                    self.invalidate(evt)
+                    await self._suppress(event, evt)
+                staging = staging or self._is_staging(evt)
+        if not staging:
+            await self._dispatch(event, *args, **kwargs)
+
+    def _is_staging(self, evt: Event) -> bool:
+        """
+        Tell if an event only concerns the staging area of the chunked uploads
+        """
+        return (
+            self.uploads is not None
+            and self.uploads.is_staging(evt.path)
+            and self.uploads.is_staging(getattr(evt, "dest_path", evt.path))
+        )
+
+    def _watched_roots(self) -> list[tuple[str, str]]:
+        """
+        Get the (path prefix, local directory) of the filesystems to watch
+        """
+        if self.mounts is None:
+            return [("/", self.backend.getsyspath("/"))]
+        roots = []
+        for prefix, backend in self.mounts.mounts.items():
+            try:
+                roots.append((prefix, backend.getsyspath("/")))
+            except fs.errors.NoSysPath:
+                logging.warning(f"{prefix} is not a local filesystem, not watched")
+        return roots
+
+    async def _suppress(self, event: eventname_t, evt: Event):
+        """
+        Tell the watchers about a change made through this app : they see it
+        too, it must not be reported twice
+        """
+        if not self.watchers:
+            return
+        path, dest_path = evt.path, getattr(evt, "dest_path", None)
+        if dest_path is None or (
+            event.endswith(".moved")
+            and self._watcher_of(path) == self._watcher_of(dest_path)
+        ):
+            changes = [(event, path, dest_path)]
+        else:
+            # seen as the creation of the destination tree, and the deletion of
+            # the source tree for a move between two filesystems
+            tree = [("/", event.startswith("directory."))]
+            if tree[0][1]:
+                tree += await self._list_tree(dest_path)
+            changes = [
+                (
+                    "directory.created" if is_dir else "file.uploaded",
+                    fs.path.join(dest_path, name.lstrip("/")),
+                    None,
+                )
+                for name, is_dir in tree
+            ]
+            if event.endswith(".moved"):
+                changes += [
+                    (
+                        "directory.deleted" if is_dir else "file.deleted",
+                        fs.path.join(path, name.lstrip("/")),
+                        None,
+                    )
+                    for name, is_dir in tree
+                ]
+        for name, path, dest_path in changes:
+            if (watched := self._watcher_of(path)) is not None:
+                prefix, watcher = watched
+                watcher.suppress(
+                    name,
+                    _relative_path(path, prefix),
+                    _relative_path(dest_path, prefix) if dest_path else None,
+                )
+
+    def _watcher_of(self, path: str) -> tuple[str, InotifyWatcher] | None:
+        """
+        Get the (path prefix, watcher) of the filesystem holding a path
+        """
+        watched = [(p, w) for p, w in self.watchers if _is_below(path, p)]
+        return max(watched, key=lambda pw: len(pw[0]), default=None)
+
+    async def _list_tree(self, path: str) -> list[tuple[str, bool]]:
+        """
+        Get the (path relative to `path`, is_dir) of everything below a collection
+        """
+        tree = []
+        directories = [""]
+        while directories:
+            directory = directories.pop()
+            try:
+                infos = await self.backend.scandir(
+                    fs.path.join(path, directory.lstrip("/"))
+                )
+            except (fs.errors.ResourceNotFound, fs.errors.DirectoryExpected):
+                continue
+            for info in infos:
+                child = f"{directory}/{info.name}"
+                tree.append((child, info.is_dir))
+                if info.is_dir:
+                    directories.append(child)
+        return tree
+
+    async def _on_external_change(
+        self, event: eventname_t, evt: Event, prefix: str = "/"
+    ):
+        """
+        Called by the watchers for the changes that were not made through this
+        app, with the paths in the filesystem mounted at `prefix`
+        """
+        if prefix != "/":
+            changes = {"path": fs.path.join(prefix, evt.path.lstrip("/"))}
+            if dest_path := getattr(evt, "dest_path", None):
+                changes["dest_path"] = fs.path.join(prefix, dest_path.lstrip("/"))
+            evt = dataclasses.replace(evt, **changes)
+        self.invalidate(evt)
+        if self.quota is not None:
+            await self.quota.refresh(evt.path)
+            if dest_path := getattr(evt, "dest_path", None):
+                await self.quota.refresh(dest_path)
+        # the staging area only changes through this app : its moves are the
+        # assemblies, reported as uploads, and its sweeps are not reported
+        if self.uploads is not None and self.uploads.is_staging(evt.path):
+            return
+        await self._dispatch(event, evt)
+
+    async def _dispatch(self, event: eventname_t, *args, **kwargs):
+        if self.metrics is None:
+            await super().emit(event, *args, **kwargs)
+            return
+        start = time.perf_counter()
+        await super().emit(event, *args, **kwargs)
+        self.metrics.observe(
+            "asgi_dav_event_dispatch_seconds", time.perf_counter() - start, event=event
+        )
+
+    def invalidate(self, evt: Event):
+        """
+        Drop the cached state made stale by a change to the filesystem
+        """
+        if self.negative_cache is not None:
+            self.negative_cache.invalidate(evt.path)
+            if dest_path := getattr(evt, "dest_path", None):
+                self.negative_cache.invalidate(dest_path)
 
-    async def shutdown(self): ...
+    def invalidate_all(self):
+        """
+        Drop all the cached state, e.g. when some changes may have been missed
+        """
+        if self.negative_cache is not None:
+            self.negative_cache.clear()
+        if self.search is not None:
+            self.search.schedule_rebuild()
+        if self.quota is not None:
+            self.quota.schedule_reconcile()
 
     async def options(
         self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
@@ -96,13 +495,56 @@ class DAVApp(EventSupport):
         methods = list(self.handlers.keys())
         methods.sort()
         headers = {
-            "DAV": "1,2",
+            "DAV": "1,2,sabredav-partialupdate",
             "Allow": ", ".join(methods),
             "MS-Author-Via": "DAV",
             "Accept-Ranges": "bytes",
         }
+        if self.search is not None:
+            headers["DASL"] = "<DAV:basicsearch>"
         await self.respond(send, http.client.OK, b"OK", headers)
 
+    async def _getinfo(self, path: str) -> Info | ResourceInfo | None:
+        """
+        Get the details of a resource, or None if it does not exist.
+        Concurrent lookups of the same path share a single filesystem call
+        """
+        if self.negative_cache is not None and self.negative_cache.is_missing(path):
+            return None
+        cache = self.negative_cache
+        generation = cache.generation if cache is not None else None
+        info = await self.singleflight.do(
+            "getinfo", path, lambda: self.backend.getinfo(path)
+        )
+        if info is None and cache is not None:
+            # not remembered if something was created during the lookup
+            cache.add(path, generation)
+        return info
+
+    async def _scandir(self, path: str) -> list[Info | ResourceInfo]:
+        """
+        List the details of the resources of a directory.
+        Concurrent listings of the same path share a single filesystem call
+        """
+        return await self.singleflight.do(
+            "scandir", path, lambda: self.backend.scandir(path)
+        )
+
+    async def _readbytes(self, path: str) -> bytes:
+        """
+        Read a whole (small) file.
+        Concurrent reads of the same path share a single filesystem call
+        """
+        return await self.singleflight.do(
+            "readbytes", path, lambda: self.backend.readbytes(path)
+        )
+
+    def _is_read_only(self, path: str) -> bool:
+        """
+        Tell if a path cannot be written : the mount points, and their ancestors
+        """
+        return self.mounts is not None and self.mounts.is_read_only(path)
+
     def _get_path_and_href(self, scope: HTTPScope) -> tuple[str, str]:
         root_path = scope.get("root_path", "")
         path = scope["path"][len(root_path) :]
@@ -127,28 +569,63 @@ class DAVApp(EventSupport):
         if destination == "":
             destination = "/"
 
+        if self._is_read_only(destination) or (
+            not is_copy and self._is_read_only(path)
+        ):
+            await self.respond(send, http.client.FORBIDDEN, b"Forbidden")
+            return
+
+        if self.uploads is not None and (upload := self.uploads.assembly_upload(path)):
+            await self.assemble_upload(scope, send, upload, destination)
+            return
+
         overwrite = self.get_first_header(scope, "Overwrite") == "T"
         evtname, evt = None, None
+        info, dest_parent_info = await asyncio.gather(
+            self.backend.getinfo(path),
+            self.backend.getinfo(_parent_path(destination)),
+        )
+        if info is None:
+            await self.respond(send, http.client.NOT_FOUND, b"Not found")
+            return
+        if dest_parent_info is None or not dest_parent_info.is_dir:
+            await self.respond(send, http.client.CONFLICT, b"Conflict")
+            return
+        is_dir = info.is_dir
+        dest_info = None
+        if self.quota is not None:
+            dest_info = await self.backend.getinfo(destination)
+            replaced = dest_info.size if dest_info and not dest_info.is_dir else 0
+            if not self.quota.allows(
+                _parent_path(destination),
+                self._quota_size(path, info) - replaced,
+                # the bytes of a MOVE already count in the collections it stays in
+                source=None if is_copy else _parent_path(path),
+            ):
+                await self.respond(
+                    send, http.client.INSUFFICIENT_STORAGE, b"Insufficient Storage"
+                )
+                return
         try:
             if is_copy:
-                if self.fs.isdir(path):
-                    self.fs.copydir(path, destination, create=True)
+                if is_dir:
+                    await self.backend.copydir(path, destination)
                     evtname, evt = "directory.copied", DirectoryCopiedEvent(
                         path=path, dest_path=destination
                     )
                 else:
-                    self.fs.copy(path, destination, overwrite=overwrite)
+                    await self.backend.copy(path, destination, overwrite=overwrite)
                     evtname, evt = "file.copied", FileCopiedEvent(
                         path=path, dest_path=destination
                     )
             else:
-                if self.fs.isdir(path):
-                    self.fs.movedir(path, destination, create=True)
+                if is_dir:
+                    await self.backend.movedir(path, destination)
                     evtname, evt = "directory.moved", DirectoryMovedEvent(
                         path=path, dest_path=destination
                     )
                 else:
-                    self.fs.move(path, destination, overwrite=overwrite)
+                    await self.backend.move(path, destination, overwrite=overwrite)
                     evtname, evt = "file.moved", FileMovedEvent(
                         path=path, dest_path=destination
                     )
@@ -163,11 +640,141 @@ class DAVApp(EventSupport):
             await self.respond(send, http.client.CONFLICT, b"Conflict")
             return
 
+        if self.quota is not None:
+            await self.account_copy_or_move(path, destination, info, dest_info, is_copy)
+        await self.emit(evtname, evt)
         if is_copy:
-            await self.emit(evtname, evt)
             await self.respond(send, http.client.CREATED, b"Created")
         else:
+            await self.respond(send, http.client.NO_CONTENT)
+
+    async def account_copy_or_move(
+        self,
+        path: str,
+        destination: str,
+        info: Info | ResourceInfo,
+        dest_info: Info | ResourceInfo | None,
+        is_copy: bool,
+    ):
+        """
+        Update the quota usage after a COPY or a MOVE
+        """
+        if not info.is_dir:
+            if not is_copy:
+                self.quota.file_changed(path, info.size, None)
+            self.quota.file_changed(
+                destination, dest_info.size if dest_info else None, info.size
+            )
+        elif dest_info is None:
+            if is_copy:
+                self.quota.tree_copied(path, destination)
+            else:
+                self.quota.tree_moved(path, destination)
+        else:
+            # merged with an existing collection
+            if not is_copy:
+                self.quota.dir_removed(path)
+            await self.quota.refresh(destination)
+
+    def _quota_size(self, path: str, info: Info | ResourceInfo) -> int:
+        """
+        The bytes held by a resource, as known by the quota index
+        """
+        if not info.is_dir:
+            return info.size
+        usage = self.quota.usage(path)
+        return usage[0] if usage is not None else 0
+
+    def _quota_of(
+        self, path: str, info: Info | ResourceInfo
+    ) -> tuple[int, int | None] | None:
+        """
+        The (used, available) bytes of a collection, for the quota properties
+        """
+        if self.quota is None or not info.is_dir:
+            return None
+        usage = self.quota.usage(path)
+        if usage is None:
+            return None
+        return usage[0], self.quota.available(path)
+
+    async def assemble_upload(
+        self, scope: HTTPScope, send: ASGISendCallable, upload: str, destination: str
+    ):
+        """
+        Assemble the parts of a chunked upload at `destination`
+        """
+        if self.uploads.is_staging(destination):
+            await self.respond(send, http.client.BAD_REQUEST, b"Bad Request")
+            return
+        # a concurrent assembly of the same upload waits, then finds it gone
+        async with self.write_locks.hold(upload), self.write_locks.hold(destination):
+            await self.assemble_parts(scope, send, upload, destination)
 
+    async def assemble_parts(
+        self, scope: HTTPScope, send: ASGISendCallable, upload: str, destination: str
+    ):
+        """
+        Assemble the parts of a chunked upload at `destination`, once nothing
+        else writes to them
+        """
+        info, dest_info, dest_parent_info = await asyncio.gather(
+            self.backend.getinfo(upload),
+            self.backend.getinfo(destination),
+            self.backend.getinfo(_parent_path(destination)),
+        )
+        if info is None or not info.is_dir:
+            await self.respond(send, http.client.NOT_FOUND, b"Not found")
+            return
+        if dest_parent_info is None or not dest_parent_info.is_dir:
+            await self.respond(send, http.client.CONFLICT, b"Conflict")
+            return
+        if dest_info is not None and dest_info.is_dir:
+            await self.respond(send, http.client.CONFLICT, b"Conflict")
+            return
+
+        if self.quota is not None:
+            size = sum(
+                part.size for part in await self.uploads.parts(self.backend, upload)
+            )
+            if not self.quota.allows(
+                _parent_path(destination),
+                size - (dest_info.size if dest_info is not None else 0),
+                source=upload,
+            ):
+                await self.respond(
+                    send, http.client.INSUFFICIENT_STORAGE, b"Insufficient Storage"
+                )
+                return
+
+        total_length = self.get_first_header(scope, "OC-Total-Length")
+        try:
+            await self.uploads.assemble(
+                self.backend,
+                upload,
+                destination,
+                total_length=int(total_length) if total_length else None,
+                # unlike the other MOVEs, overwriting is the default
+                overwrite=self.get_first_header(scope, "Overwrite") != "F",
+            )
+        except ValueError as e:
+            await self.respond(send, http.client.BAD_REQUEST, str(e))
+            return
+        except fs.errors.DestinationExists:
+            await self.respond(send, http.client.PRECONDITION_FAILED)
+            return
+        except fs.errors.ResourceNotFound:
+            # assembled or aborted by a concurrent request
+            await self.respond(send, http.client.NOT_FOUND, b"Not found")
+            return
+
+        if self.quota is not None:
+            await self.quota.refresh(upload)
+            await self.quota.refresh(destination)
+        await self.emit("file.uploaded", FileUploadedEvent(path=destination))
+        if dest_info is None:
+            await self.respond(send, http.client.CREATED, b"Created")
+        else:
             await self.respond(send, http.client.NO_CONTENT)
 
     async def get_or_head(
@@ -175,60 +782,267 @@ class DAVApp(EventSupport):
     ):
         is_head = scope["method"] == "HEAD"
         path, href = self._get_path_and_href(scope)
-        if not self.fs.exists(path):
+        info = await self._getinfo(path)
+        if info is None:
             await self.respond(send, http.client.NOT_FOUND, b"Not found")
             return
-        if self.fs.isdir(path):
+        if info.is_dir:
             query = parse_qs(scope["query_string"].decode())
             if query.get("propfind"):
                 await self.propfind(scope, receive, send)
+            elif query.get("search") and self.search is not None:
+                await self.send_search_results(
+                    scope,
+                    send,
+                    SearchQuery.name_contains(query["search"][0], scope=path),
+                )
+            elif query.get("archive"):
+                send_archive = lambda scope, receive, send: self.send_archive(
+                    scope, send, path, query["archive"][0], is_head=is_head
+                )
+                if self.scheduler is not None and not is_head:
+                    await self._admitted("GET", send_archive, scope, receive, send)
+                else:
+                    await send_archive(scope, receive, send)
             else:
                 await self.send_dir_listing(send, path, href, is_head=is_head)
         else:
-
-            await self.send_file(
-                scope,
-                send,
-                path,
-                FileProps(self.fs.getinfo(path, ["details"]), href),
-                is_head=is_head,
+            send_file = lambda scope, receive, send: self.send_file(
+                scope, send, path, FileProps(info, href), is_head=is_head
             )
+            if (
+                self.scheduler is not None
+                and not is_head
+                and info.size >= self.scheduler.large_transfer_size
+            ):
+                await self._admitted("GET", send_file, scope, receive, send)
+            else:
+                await send_file(scope, receive, send)
 
     async def put(
         self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
     ):
         path, href = self._get_path_and_href(scope)
+        if self._is_read_only(path):
+            await self.respond(send, http.client.FORBIDDEN, b"Forbidden")
+            return
+        # nothing else writes the file between the If-Match check and the end
+        async with self.write_locks.hold(path):
+            await self.write_file(scope, receive, send, path, href)
 
-        if self.fs.isdir(path):
+    async def write_file(
+        self,
+        scope: HTTPScope,
+        receive: ASGIReceiveCallable,
+        send: ASGISendCallable,
+        path: str,
+        href: str,
+    ):
+        """
+        Write the body of a PUT request, the path being locked
+        """
+        info, parent_info = await asyncio.gather(
+            self.backend.getinfo(path), self.backend.getinfo(_parent_path(path))
+        )
+        if info is not None and info.is_dir:
             await self.respond(send, http.client.METHOD_NOT_ALLOWED)
             return
+        if parent_info is None or not parent_info.is_dir:
+            await self.respond(send, http.client.CONFLICT, b"Conflict")
+            return
+        if self.is_precondition_failed(scope, info):
+            await self.respond(send, http.client.PRECONDITION_FAILED)
+            return
+
+        content_length = int(self.get_first_header(scope, "Content-Length") or 0)
+        content_range = self.get_first_header(scope, "Content-Range")
+        old_size = info.size if info is not None else 0
+        new_size = content_length
+        if content_range:
+            try:
+                start, end, total = self.parse_content_range(content_range)
+            except ValueError:
+                await self.respond(send, http.client.BAD_REQUEST, b"Bad Request")
+                return
+            if end - start + 1 != content_length:
+                await self.respond(send, http.client.BAD_REQUEST, b"Bad Request")
+                return
+            new_size = total if total is not None else max(old_size, end + 1)
 
-        remaining = int(self.get_first_header(scope, "Content-Length") or 0)
+        # rejected before anything is received
+        if self.quota is not None and not self.quota.allows(
+            _parent_path(path), new_size - old_size
+        ):
+            await self.respond(
+                send, http.client.INSUFFICIENT_STORAGE, b"Insufficient Storage"
+            )
+            return
 
-        with self.fs.open(path, "wb" if self.fs.isfile(path) else "xb") as f:
+        if content_range:
+            await self.write_range(
+                scope, receive, send, path, href, info, start, content_length, total
+            )
+            return
+
+        remaining = content_length
+        f = await self.backend.open_async(path, "wb" if info is not None else "xb")
+        try:
             while remaining > 0:
                 message: HTTPRequestEvent = await receive()  # type: ignore
                 if message["type"] == "http.disconnect":
                     break
                 chunk = message["body"]
+                await self._throttle(scope, len(chunk))
                 f.write(chunk)
                 remaining -= len(chunk)
-            await self.emit("file.uploaded", FileUploadedEvent(path=path))
+        finally:
+            await self.backend.close_async(f)
+        if self.quota is not None:
+            self.quota.file_changed(
+                path, info.size if info else None, content_length - remaining
+            )
+        await self.emit("file.uploaded", FileUploadedEvent(path=path))
         await self.respond(send, http.client.CREATED)
 
+    async def patch(
+        self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
+    ):
+        """
+        Handle PATCH requests, in the SabreDAV partial update format : the body
+        is written at the place given by the X-Update-Range header
+        """
+        path, href = self._get_path_and_href(scope)
+        if self._is_read_only(path):
+            await self.respond(send, http.client.FORBIDDEN, b"Forbidden")
+            return
+        content_type = self.get_first_header(scope, "Content-Type") or ""
+        if content_type.split(";")[0].strip() != PARTIAL_UPDATE_CONTENT_TYPE:
+            await self.respond(send, http.client.UNSUPPORTED_MEDIA_TYPE)
+            return
+        async with self.write_locks.hold(path):
+            await self.update_file(scope, receive, send, path, href)
+
+    async def update_file(
+        self,
+        scope: HTTPScope,
+        receive: ASGIReceiveCallable,
+        send: ASGISendCallable,
+        path: str,
+        href: str,
+    ):
+        """
+        Write the body of a PATCH request, the path being locked
+        """
+        info = await self.backend.getinfo(path)
+        if info is None:
+            await self.respond(send, http.client.NOT_FOUND, b"Not found")
+            return
+        if info.is_dir:
+            await self.respond(send, http.client.METHOD_NOT_ALLOWED)
+            return
+        if self.is_precondition_failed(scope, info):
+            await self.respond(send, http.client.PRECONDITION_FAILED)
+            return
+        content_length = self.get_first_header(scope, "Content-Length")
+        if content_length is None:
+            await self.respond(send, http.client.LENGTH_REQUIRED)
+            return
+
+        length = int(content_length)
+        try:
+            start = self.parse_update_range(
+                self.get_first_header(scope, "X-Update-Range") or "", info.size, length
+            )
+        except ValueError:
+            await self.respond(send, http.client.BAD_REQUEST, b"Bad Request")
+            return
+        if start < 0 or start > info.size:
+            await self.respond(send, http.client.REQUESTED_RANGE_NOT_SATISFIABLE)
+            return
+        if self.quota is not None and not self.quota.allows(
+            _parent_path(path), max(info.size, start + length) - info.size
+        ):
+            await self.respond(
+                send, http.client.INSUFFICIENT_STORAGE, b"Insufficient Storage"
+            )
+            return
+        await self.write_range(scope, receive, send, path, href, info, start, length)
+
+    async def write_range(
+        self,
+        scope: HTTPScope,
+        receive: ASGIReceiveCallable,
+        send: ASGISendCallable,
+        path: str,
+        href: str,
+        info: Info | ResourceInfo | None,
+        start: int,
+        length: int,
+        total: int | None = None,
+    ):
+        """
+        Write the request body at `start`, updating the file in place
+        :param total: the new size of the file, if known
+        """
+        # for some backends, opening copies the file and closing hashes it
+        f = await self.backend.open_async(path, "r+b" if info is not None else "wb")
+        try:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                message: HTTPRequestEvent = await receive()  # type: ignore
+                if message["type"] == "http.disconnect":
+                    break
+                chunk = message["body"]
+                await self._throttle(scope, len(chunk))
+                f.write(chunk)
+                remaining -= len(chunk)
+            if total is not None:
+                f.truncate(total)
+        finally:
+            await self.backend.close_async(f)
+        if self.quota is not None:
+            old_size = info.size if info is not None else None
+            self.quota.file_changed(
+                path,
+                old_size,
+                (
+                    total
+                    if total is not None
+                    else max(old_size or 0, start + length - remaining)
+                ),
+            )
+        await self.emit("file.uploaded", FileUploadedEvent(path=path))
+
+        # the new ETag, for the next If-Match
+        headers = {}
+        if (new_info := await self.backend.getinfo(path)) is not None:
+            headers["ETag"] = f'"{FileProps(new_info, href).etag}"'
+        if info is None:
+            await self.respond(send, http.client.CREATED, None, headers)
+        else:
+            await self.respond(send, http.client.NO_CONTENT, None, headers)
+
     async def delete(
         self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
     ):
         path, href = self._get_path_and_href(scope)
-        if not self.fs.exists(path):
+        info = await self.backend.getinfo(path)
+        if info is None:
             await self.respond(send, http.client.NOT_FOUND)
             return
-        is_dir = self.fs.isdir(path)
-        if is_dir:
-            self.fs.removedir(path)
+        if self._is_read_only(path):
+            await self.respond(send, http.client.FORBIDDEN, b"Forbidden")
+            return
+        if info.is_dir:
+            await self.backend.removedir(path)
+            if self.quota is not None:
+                self.quota.dir_removed(path)
             await self.emit("directory.deleted", DirectoryDeletedEvent(path=path))
         else:
-            self.fs.remove(path)
+            await self.backend.remove(path)
+            if self.quota is not None:
+                self.quota.file_changed(path, info.size, None)
             await self.emit("file.deleted", FileDeletedEvent(path=path))
         await self.respond(send, http.client.NO_CONTENT)
 
@@ -236,44 +1050,69 @@ class DAVApp(EventSupport):
         self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
     ):
         path, href = self._get_path_and_href(scope)
-        if self.fs.exists(path):
+        if await self.backend.getinfo(path) is not None:
             await self.respond(send, 405, b"Method Not Allowed")
             return
+        if self._is_read_only(path):
+            await self.respond(send, http.client.FORBIDDEN, b"Forbidden")
+            return
 
-        self.fs.makedirs(path)
-        await self.respond(send, http.client.CREATED)
+        await self.backend.makedirs(path)
+        if self.quota is not None:
+            self.quota.dir_created(path)
         await self.emit("directory.created", DirectoryCreatedEvent(path=path))
+        await self.respond(send, http.client.CREATED)
 
     async def propfind(
         self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
     ):
         path, href = self._get_path_and_href(scope)
 
-        if not self.fs.exists(path):
-            await self.respond(send, http.client.NOT_FOUND, b"Not found")
-            return
-
         depth = self.get_first_header(scope, "Depth")
         if not depth:
             depth = "1"
 
+        if self.negative_cache is not None and self.negative_cache.is_missing(path):
+            await self.respond(send, http.client.NOT_FOUND, b"Not found")
+            return
+
+        listing = None
+        if depth == "1":
+            # the listing does not depend on the details of the resource :
+            # fetch both at once, the listing is dropped if it is not a collection
+            async def try_scandir() -> list[Info | ResourceInfo] | None:
+                try:
+                    return await self._scandir(path)
+                except (fs.errors.ResourceNotFound, fs.errors.DirectoryExpected):
+                    return None
+
+            info, listing = await asyncio.gather(self._getinfo(path), try_scandir())
+        else:
+            info = await self._getinfo(path)
+
+        if info is None:
+            await self.respond(send, http.client.NOT_FOUND, b"Not found")
+            return
+
         builder = PropfindResponseBuilder()
+        quota = self._quota_of(path, info)
         if path == "/":
-            builder.add_response(FileProps(self.fs.getinfo("/", ["details"]), href))
+            builder.add_response(FileProps(info, href, quota))
         else:
-            builder.add_response(
-                FileProps(self.fs.getinfo(path, ["details"]), get_parent_href(href))
-            )
+            builder.add_response(FileProps(info, get_parent_href(href), quota))
 
-        if depth == "0":
+        if depth == "0" or not info.is_dir:
             pass
-        elif depth == "1" or depth is None:
+        elif depth == "1":
             fprops = [
-                FileProps(info, href)
-                for info in self.fs.scandir(path, namespaces=["details"])
+                FileProps(
+                    info, href, self._quota_of(fs.path.join(path, info.name), info)
+                )
+                for info in listing or []
                 if info.name[0] != "."
             ]
-            fprops.sort()
+            fprops.sort(key=attrgetter("sort_key"))
+            annotate(entries=len(fprops))
             for fileprop in fprops:
                 builder.add_response(fileprop)
         elif depth == "infinity":
@@ -299,7 +1138,7 @@ class DAVApp(EventSupport):
         raw_path = scope["path"]
         path, href = self._get_path_and_href(scope)
 
-        if not self.fs.exists(path):
+        if await self._getinfo(path) is None:
             await self.respond(send, http.client.NOT_FOUND, b"Not found")
             return
 
@@ -387,16 +1226,65 @@ class DAVApp(EventSupport):
             }
         )
 
+    async def search_request(
+        self, scope: HTTPScope, receive: ASGIReceiveCallable, send: ASGISendCallable
+    ):
+        """
+        Handle SEARCH requests (RFC 5323, DAV:basicsearch), answered from the
+        search index
+        """
+        try:
+            document = fromstring(await self.read_request_body(scope, receive))
+            query = parse_basicsearch(document, scope.get("root_path", ""))
+        except (ParseError, ValueError) as e:
+            await self.respond(send, http.client.BAD_REQUEST, str(e))
+            return
+        await self.send_search_results(scope, send, query)
+
+    async def send_search_results(
+        self, scope: HTTPScope, send: ASGISendCallable, query: SearchQuery
+    ):
+        """
+        Run a search, and stream the results as a multistatus document
+        """
+        results = await self.search.search(query)
+        annotate(entries=len(results))
+        root_path = scope.get("root_path", "")
+        builder = PropfindResponseBuilder()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": http.client.MULTI_STATUS,
+                "headers": [(b"Content-Type", b"text/xml; charset=utf-8")],
+            }
+        )
+        chunk = [builder.xml_head()]
+        for path, info in results:
+            parent_href = concat_uri(root_path, fs.path.dirname(path))
+            chunk.append(builder.render_response(FileProps(info, parent_href)))
+            if len(chunk) >= SEARCH_RESULTS_PER_CHUNK:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": "".join(chunk).encode(),
+                        "more_body": True,
+                    }
+                )
+                chunk = []
+        chunk.append(builder.xml_tail())
+        await send({"type": "http.response.body", "body": "".join(chunk).encode()})
+
     async def send_dir_listing(
         self, send: ASGISendCallable, path: str, href: str, is_head: bool = False
     ):
         template = self.jinja_env.get_template("dir_listing.html")
         listing = [
             FileProps(info, href)
-            for info in self.fs.scandir(path, namespaces=["details"])
+            for info in await self._scandir(path)
             if info.name[0] != "."
         ]
-        listing.sort()
+        listing.sort(key=attrgetter("sort_key"))
+        annotate(entries=len(listing))
         body = template.render(path=path, href=href, listing=listing)
         await self.respond(
             send,
@@ -405,6 +1293,103 @@ class DAVApp(EventSupport):
             {"Content-Type": "text/html; charset=utf-8"},
         )
 
+    async def send_archive(
+        self,
+        scope: HTTPScope,
+        send: ASGISendCallable,
+        path: str,
+        format: str,
+        is_head: bool = False,
+    ):
+        """
+        Stream an archive (zip, tar or tar.zst) of a whole collection.
+        The archive is written in a worker thread, through a bounded queue of chunks
+        """
+        if not format_available(format):
+            await self.respond(
+                send, http.client.BAD_REQUEST, b"Unsupported archive format"
+            )
+            return
+        content_type, extension = ARCHIVE_FORMATS[format]
+        filename = (fs.path.basename(path.rstrip("/")) or "root") + extension
+        await send(
+            {
+                "type": "http.response.start",
+                "status": http.client.OK,
+                "headers": [
+                    (b"Content-Type", content_type.encode()),
+                    (b"Content-Disposition", content_disposition(filename).encode()),
+                ],
+            }
+        )
+        if is_head:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[bytes | None] = asyncio.Queue(ARCHIVE_QUEUE_SIZE)
+        aborted = False
+        files = 0
+
+        def run(coro):
+            # from the worker thread, run a coroutine in the event loop
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+        def put(chunk: bytes):
+            if aborted:
+                raise ConnectionAbortedError("the client went away")
+            run(queue.put(chunk))
+
+        def on_file(file_path: str):
+            nonlocal files
+            files += 1
+            run(self.emit("file.downloaded", FileDownloadedEvent(path=file_path)))
+
+        def write():
+            try:
+                out = ChunkWriter(put, CHUNK_SIZE)
+                write_archive(
+                    format,
+                    out,
+                    path,
+                    walk(lambda p: run(self._scandir(p)), path),
+                    lambda p: self.backend.open(p, "rb"),
+                    on_file,
+                    CHUNK_SIZE,
+                )
+                out.close()
+            finally:
+                if not aborted:
+                    run(queue.put(None))
+
+        if self.archive_executor is None:
+            self.archive_executor = ThreadPoolExecutor(
+                ARCHIVE_WORKERS, thread_name_prefix="asgi_dav-archive"
+            )
+        worker = loop.run_in_executor(self.archive_executor, write)
+        try:
+            while (chunk := await queue.get()) is not None:
+                await self._throttle(scope, len(chunk))
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+            # raises the errors of the worker, the client sees a truncated body
+            await worker
+        finally:
+            if not worker.done():
+                aborted = True
+                # unblock the worker, which stops at its next write
+                while not worker.done():
+                    while not queue.empty():
+                        queue.get_nowait()
+                    await asyncio.wait([worker], timeout=0.05)
+                # the client is gone, the error of the worker is of no interest :
+                # retrieved, so that asyncio does not log it
+                if not worker.cancelled():
+                    worker.exception()
+        annotate(entries=files)
+        await send({"type": "http.response.body", "body": b""})
+
     def is_unmodified(self, scope: HTTPScope, etag: str) -> bool:
         if_none_match = self.get_first_header(scope, "If-None-Match")
         if if_none_match:
@@ -462,14 +1447,26 @@ class DAVApp(EventSupport):
             }
         )
 
-        if not is_head:
+        if not is_head and content_length == fp.size and fp.size <= CHUNK_SIZE:
+            # small files are read in one go, so that concurrent downloads of
+            # the same file (e.g. thumbnails) share the read
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": await self._readbytes(path),
+                    "more_body": True,
+                }
+            )
+            await self.emit("file.downloaded", FileDownloadedEvent(path=path))
+        elif not is_head:
 
-            with self.fs.open(path, "rb") as f:
+            with self.backend.open(path, "rb") as f:
                 f.seek(start)
                 remaining = content_length
                 while remaining > 0:
                     chunk = f.read(min(remaining, CHUNK_SIZE))
                     remaining -= len(chunk)
+                    await self._throttle(scope, len(chunk))
                     await send(
                         {
                             "type": "http.response.body",
@@ -488,6 +1485,25 @@ class DAVApp(EventSupport):
 
         
 
+    def is_precondition_failed(
+        self, scope: HTTPScope, info: Info | ResourceInfo | None
+    ) -> bool:
+        """
+        Check the If-Match header against the current ETag of a resource
+        """
+        if_match = self.get_first_header(scope, "If-Match")
+        if not if_match:
+            return False
+        if info is None:
+            return True
+        if if_match.strip() == "*":
+            return False
+        etag = FileProps(info, "").etag
+        return all(
+            value.strip().removeprefix("W/").strip('"') != etag
+            for value in if_match.split(",")
+        )
+
     def get_first_header(self, scope: HTTPScope, name: str) -> str | None:
         headers = scope.get("headers", [])
         for key, value in headers:
@@ -509,5 +1525,70 @@ class DAVApp(EventSupport):
         start, end = map(int, match.groups())
         return start, end
 
+    def parse_content_range(self, content_range: str) -> tuple[int, int, int | None]:
+        """
+        Parse a 'bytes start-end/total' Content-Range header, total being None
+        when it is '*'
+        :raises ValueError: if the header is invalid
+        """
+        match = re.fullmatch(r"\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*", content_range)
+        if not match:
+            raise ValueError(f"Invalid Content-Range {content_range}")
+        start, end = int(match.group(1)), int(match.group(2))
+        total = None if match.group(3) == "*" else int(match.group(3))
+        if end < start or (total is not None and end >= total):
+            raise ValueError(f"Invalid Content-Range {content_range}")
+        return start, end, total
+
+    def parse_update_range(self, update_range: str, size: int, length: int) -> int:
+        """
+        Get the offset an X-Update-Range header ('bytes=start-end', 'bytes=start-',
+        'bytes=-count' or 'append') points to, in a file of `size` bytes
+        :raises ValueError: if the header is invalid, or does not match `length`
+        """
+        update_range = update_range.strip()
+        if update_range == "append":
+            return size
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", update_range)
+        if not match or not (match.group(1) or match.group(2)):
+            raise ValueError(f"Invalid X-Update-Range {update_range}")
+        if not match.group(1):
+            # the last bytes of the file
+            return size - int(match.group(2))
+        start = int(match.group(1))
+        if match.group(2) and int(match.group(2)) - start + 1 != length:
+            raise ValueError(f"Invalid X-Update-Range {update_range}")
+        return start
+
+
+# ------------------------------------------------------------------------------
+def _is_below(path: str, prefix: str) -> bool:
+    """
+    Tell if a path is `prefix` itself or below it
+    """
+    return prefix == "/" or path == prefix or path.startswith(prefix + "/")
+
+
+def _relative_path(path: str, prefix: str) -> str:
+    """
+    Get the path of a resource in the filesystem mounted at `prefix`
+    """
+    return "/" + path[len(prefix) :].lstrip("/")
+
+
+def _parent_path(path: str) -> str:
+    return fs.path.dirname(path.rstrip("/")) or "/"
+
 
-__all__ = ["DAVApp"]
+__all__ = [
+    "DAVApp",
+    "Backend",
+    "FSBackend",
+    "OSBackend",
+    "ChunkedUploads",
+    "SearchIndex",
+    "QuotaIndex",
+    "DedupBackend",
+    "Scheduler",
+    "MountBackend",
+]
@@ -0,0 +1,225 @@
+"""
+    Streaming ZIP / TAR archives of whole collections, written in a worker
+    thread into a bounded stream of chunks
+"""
+
+import datetime
+import io
+import shutil
+import tarfile
+import time
+import zipfile
+from typing import BinaryIO, Callable, Iterator
+
+import fs.path
+from fs.info import Info
+
+from .backends import ResourceInfo
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ------------------------------------------------------------------------------
+# format -> (content type, file extension)
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar": ("application/x-tar", ".tar"),
+    "tar.zst": ("application/zstd", ".tar.zst"),
+}
+
+# the files that would not get any smaller, stored as is in zip archives
+STORED_EXTENSIONS = frozenset(
+    [
+        ".7z",
+        ".apk",
+        ".avi",
+        ".br",
+        ".bz2",
+        ".docx",
+        ".epub",
+        ".flac",
+        ".gif",
+        ".gz",
+        ".heic",
+        ".jar",
+        ".jpeg",
+        ".jpg",
+        ".lz",
+        ".lzma",
+        ".m4a",
+        ".mkv",
+        ".mov",
+        ".mp3",
+        ".mp4",
+        ".odp",
+        ".ods",
+        ".odt",
+        ".ogg",
+        ".opus",
+        ".png",
+        ".pptx",
+        ".rar",
+        ".tgz",
+        ".webm",
+        ".webp",
+        ".xlsx",
+        ".xz",
+        ".zip",
+        ".zst",
+    ]
+)
+
+# the oldest date a zip entry can have
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+info_t = Info | ResourceInfo
+
+
+# ------------------------------------------------------------------------------
+def format_available(format: str) -> bool:
+    return format in ARCHIVE_FORMATS and (format != "tar.zst" or zstandard is not None)
+
+
+def is_stored(name: str) -> bool:
+    """
+    Tell if a file is already compressed, judging by its extension
+    """
+    return fs.path.splitext(name)[1].lower() in STORED_EXTENSIONS
+
+
+# ------------------------------------------------------------------------------
+class ChunkWriter(io.RawIOBase):
+    """
+    A write-only, unseekable file object gathering what is written into chunks
+    of `chunk_size` bytes, handed to `put` (which may block, to apply
+    back-pressure)
+    """
+
+    def __init__(self, put: Callable[[bytes], None], chunk_size: int):
+        super().__init__()
+        self._put = put
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self._chunk_size:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+        super().close()
+
+
+# ------------------------------------------------------------------------------
+def walk(
+    scandir: Callable[[str], list[info_t]], path: str
+) -> Iterator[tuple[str, info_t]]:
+    """
+    Walk a collection depth-first, yielding the (path, info) of every resource
+    except the hidden ones, as the listings do
+    """
+    for info in sorted(scandir(path), key=lambda i: i.name):
+        if info.name[0] == ".":
+            continue
+        child = fs.path.join(path, info.name)
+        yield child, info
+        if info.is_dir:
+            yield from walk(scandir, child)
+
+
+def write_archive(
+    format: str,
+    out: BinaryIO,
+    root: str,
+    entries: Iterator[tuple[str, info_t]],
+    open_file: Callable[[str], BinaryIO],
+    on_file: Callable[[str], None],
+    chunk_size: int,
+):
+    """
+    Write an archive of `entries` (named relatively to `root`) into `out`.
+    Blocking, meant to be run in a worker thread
+    :param on_file: called with the path of each file, once archived
+    """
+    if format == "zip":
+        _write_zip(out, root, entries, open_file, on_file, chunk_size)
+    elif format == "tar":
+        _write_tar(out, root, entries, open_file, on_file, chunk_size)
+    elif format == "tar.zst":
+        compressor = zstandard.ZstdCompressor().stream_writer(out, closefd=False)
+        with compressor:
+            _write_tar(compressor, root, entries, open_file, on_file, chunk_size)
+    else:
+        raise ValueError(f"Unsupported archive format {format}")
+
+
+def _write_zip(out, root, entries, open_file, on_file, chunk_size):
+    # an unseekable output makes zipfile stream the entries, with data descriptors
+    with zipfile.ZipFile(out, "w", allowZip64=True) as archive:
+        for path, info in entries:
+            name = fs.path.relativefrom(root, path)
+            if info.is_dir:
+                zinfo = zipfile.ZipInfo(name + "/", _zip_date(info.modified))
+                zinfo.external_attr = (0o40755 << 16) | 0x10
+                archive.writestr(zinfo, b"")
+                continue
+            zinfo = zipfile.ZipInfo(name, _zip_date(info.modified))
+            zinfo.external_attr = 0o644 << 16
+            # known in advance, so that zipfile switches to ZIP64 by itself
+            zinfo.file_size = info.size
+            zinfo.compress_type = (
+                zipfile.ZIP_STORED if is_stored(name) else zipfile.ZIP_DEFLATED
+            )
+            with open_file(path) as src, archive.open(zinfo, "w") as dst:
+                shutil.copyfileobj(src, dst, chunk_size)
+            on_file(path)
+
+
+def _write_tar(out, root, entries, open_file, on_file, chunk_size):
+    with tarfile.open(
+        fileobj=out, mode="w|", format=tarfile.PAX_FORMAT, copybufsize=chunk_size
+    ) as archive:
+        for path, info in entries:
+            tarinfo = tarfile.TarInfo(fs.path.relativefrom(root, path))
+            modified = info.modified
+            tarinfo.mtime = int(modified.timestamp()) if modified else int(time.time())
+            if info.is_dir:
+                tarinfo.type = tarfile.DIRTYPE
+                tarinfo.mode = 0o755
+                archive.addfile(tarinfo)
+                continue
+            tarinfo.mode = 0o644
+            tarinfo.size = info.size
+            with open_file(path) as src:
+                archive.addfile(tarinfo, src)
+            on_file(path)
+
+
+def _zip_date(modified: datetime.datetime | None) -> tuple:
+    if modified is None:
+        return time.localtime()[:6]
+    return max(_ZIP_EPOCH, modified.timetuple()[:6])
+
+
+__all__ = [
+    "ARCHIVE_FORMATS",
+    "STORED_EXTENSIONS",
+    "ChunkWriter",
+    "format_available",
+    "walk",
+    "write_archive",
+]
@@ -0,0 +1,444 @@
+"""
+    Storage backends : the filesystem operations DAVApp needs, as coroutines.
+
+    FSBackend adapts any pyfilesystem2 FS object, OSBackend works directly on
+    the results of os.scandir() / os.stat() for local directories.
+"""
+
+import asyncio
+import datetime
+import functools
+import os
+import shutil
+import stat
+from concurrent.futures import Executor
+from typing import Any, BinaryIO, Callable
+
+import fs.errors
+import fs.path
+from fs.base import FS
+from fs.error_tools import convert_os_errors
+from fs.info import Info
+
+# The size of the chunks of the copies made by hand
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+# ------------------------------------------------------------------------------
+class ResourceInfo:
+    """
+    The details of a file or directory, as returned by OSBackend.
+    Exposes the same attributes as the fs.info.Info objects used by FileProps,
+    timestamps are only converted to datetime objects when asked for.
+    The backends knowing a better ETag than the one derived from the name, size
+    and date (e.g. a content hash) give it as `etag`
+    """
+
+    __slots__ = ("name", "is_dir", "size", "mtime", "ctime", "etag")
+
+    def __init__(
+        self,
+        name: str,
+        is_dir: bool,
+        size: int,
+        mtime: float | None,
+        ctime: float | None,
+        etag: str | None = None,
+    ):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+        self.ctime = ctime
+        self.etag = etag
+
+    @classmethod
+    def from_stat(cls, name: str, st: os.stat_result) -> "ResourceInfo":
+        return cls(
+            name,
+            stat.S_ISDIR(st.st_mode),
+            st.st_size,
+            st.st_mtime,
+            getattr(st, "st_birthtime", None),
+        )
+
+    @property
+    def is_file(self) -> bool:
+        return not self.is_dir
+
+    @property
+    def modified(self) -> datetime.datetime | None:
+        return _to_datetime(self.mtime)
+
+    @property
+    def created(self) -> datetime.datetime | None:
+        return _to_datetime(self.ctime)
+
+
+# ------------------------------------------------------------------------------
+class Backend:
+    """
+    Base class of the storage backends.
+    The methods raise the exceptions from fs.errors, like pyfilesystem2 does.
+    Blocking calls are run in `executor` (the default executor of the event loop
+    when None)
+    """
+
+    def __init__(self, executor: Executor | None = None):
+        self.executor = executor
+
+    async def _run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def start(self):
+        """
+        Called when the application starts
+        """
+
+    async def close(self):
+        """
+        Called when the application shuts down
+        """
+
+    def getsyspath(self, path: str) -> str:
+        """
+        Get the local path of a resource, for the backends that have one
+        """
+        raise fs.errors.NoSysPath(path=path)
+
+    async def getinfo(self, path: str) -> Info | ResourceInfo | None:
+        """
+        Get the details of a resource, or None if it does not exist
+        """
+        raise NotImplementedError()
+
+    async def scandir(self, path: str) -> list[Info | ResourceInfo]:
+        """
+        Get the details of the resources of a directory
+        """
+        raise NotImplementedError()
+
+    async def readbytes(self, path: str) -> bytes:
+        raise NotImplementedError()
+
+    def open(self, path: str, mode: str) -> BinaryIO:
+        """
+        Open a file in binary mode
+        """
+        raise NotImplementedError()
+
+    async def open_async(self, path: str, mode: str) -> BinaryIO:
+        """
+        Open a file in the executor, for the backends that may take a while
+        (e.g. DedupBackend copies the content of a file updated in place)
+        """
+        return await self._run(self.open, path, mode)
+
+    async def close_async(self, f: BinaryIO):
+        """
+        Close a file opened by `open_async()` in the executor (e.g. DedupBackend
+        hashes and stores the content written when it is closed)
+        """
+        await self._run(f.close)
+
+    async def makedirs(self, path: str):
+        raise NotImplementedError()
+
+    async def remove(self, path: str):
+        raise NotImplementedError()
+
+    async def removedir(self, path: str):
+        raise NotImplementedError()
+
+    async def copy(self, src: str, dst: str, overwrite: bool = False):
+        raise NotImplementedError()
+
+    async def copydir(self, src: str, dst: str):
+        raise NotImplementedError()
+
+    async def move(self, src: str, dst: str, overwrite: bool = False):
+        raise NotImplementedError()
+
+    async def movedir(self, src: str, dst: str):
+        raise NotImplementedError()
+
+    async def removetree(self, path: str):
+        """
+        Remove a directory and everything it contains
+        """
+        raise NotImplementedError()
+
+    async def concat(self, parts: list[str], dst: str):
+        """
+        Write the concatenation of the files `parts` to `dst`, which is replaced
+        """
+
+        def concat():
+            with self.open(dst, "wb") as out:
+                for part in parts:
+                    with self.open(part, "rb") as f:
+                        shutil.copyfileobj(f, out, COPY_CHUNK_SIZE)
+
+        await self._run(concat)
+
+
+# ------------------------------------------------------------------------------
+class FSBackend(Backend):
+    """
+    Compatibility adapter for pyfilesystem2 FS objects
+    """
+
+    def __init__(self, fs: FS, executor: Executor | None = None, prefetch: int = 16):
+        """
+        Create a new FSBackend
+        :param fs: the filesystem to adapt
+        :param executor: the executor the blocking calls are run in
+        :param prefetch: for the filesystems that list directories with one
+            getinfo() call per entry, how many of those calls are made at once
+        """
+        super().__init__(executor)
+        self.fs = fs
+        self.prefetch = prefetch
+        # the default FS.scandir() calls getinfo() for each entry, one at a time
+        self._naive_scandir = type(fs).scandir is FS.scandir
+
+    def getsyspath(self, path: str) -> str:
+        return self.fs.getsyspath(path)
+
+    async def getinfo(self, path: str) -> Info | None:
+        def getinfo() -> Info | None:
+            try:
+                return self.fs.getinfo(path, ["details"])
+            except fs.errors.ResourceNotFound:
+                return None
+
+        return await self._run(getinfo)
+
+    async def scandir(self, path: str) -> list[Info]:
+        if self._naive_scandir and self.prefetch > 1:
+            return await self._prefetching_scandir(path)
+        return await self._run(
+            lambda: list(self.fs.scandir(path, namespaces=["details"]))
+        )
+
+    async def _prefetching_scandir(self, path: str) -> list[Info]:
+        """
+        List a directory, then fetch the details of its entries concurrently
+        """
+        names = await self._run(self.fs.listdir, path)
+        semaphore = asyncio.Semaphore(self.prefetch)
+
+        async def getinfo(name: str) -> Info | None:
+            async with semaphore:
+                return await self.getinfo(fs.path.join(path, name))
+
+        infos = await asyncio.gather(*[getinfo(name) for name in names])
+        # entries removed in the meantime are skipped
+        return [info for info in infos if info is not None]
+
+    async def readbytes(self, path: str) -> bytes:
+        return await self._run(self.fs.readbytes, path)
+
+    def open(self, path: str, mode: str) -> BinaryIO:
+        return self.fs.open(path, mode)
+
+    async def makedirs(self, path: str):
+        await self._run(self.fs.makedirs, path)
+
+    async def remove(self, path: str):
+        await self._run(self.fs.remove, path)
+
+    async def removedir(self, path: str):
+        await self._run(self.fs.removedir, path)
+
+    async def copy(self, src: str, dst: str, overwrite: bool = False):
+        await self._run(self.fs.copy, src, dst, overwrite=overwrite)
+
+    async def copydir(self, src: str, dst: str):
+        await self._run(self.fs.copydir, src, dst, create=True)
+
+    async def move(self, src: str, dst: str, overwrite: bool = False):
+        await self._run(self.fs.move, src, dst, overwrite=overwrite)
+
+    async def movedir(self, src: str, dst: str):
+        await self._run(self.fs.movedir, src, dst, create=True)
+
+    async def removetree(self, path: str):
+        await self._run(self.fs.removetree, path)
+
+
+# ------------------------------------------------------------------------------
+class OSBackend(Backend):
+    """
+    A backend for local directories that works on os.scandir() / os.stat()
+    results directly, without building fs.info.Info objects
+    """
+
+    def __init__(self, root: str, executor: Executor | None = None):
+        """
+        Create a new OSBackend
+        :param root: the local directory to serve
+        :param executor: the executor the blocking calls are run in
+        """
+        super().__init__(executor)
+        self.root = os.path.abspath(root)
+        if not os.path.isdir(self.root):
+            raise fs.errors.CreateFailed(f"root path '{root}' does not exist")
+
+    def getsyspath(self, path: str) -> str:
+        # normpath() raises IllegalBackReference for paths escaping the root
+        path = fs.path.relpath(fs.path.normpath(path))
+        return os.path.join(self.root, path.replace("/", os.sep))
+
+    async def getinfo(self, path: str) -> ResourceInfo | None:
+        def getinfo() -> ResourceInfo | None:
+            try:
+                with convert_os_errors("getinfo", path):
+                    st = os.stat(self.getsyspath(path))
+            except fs.errors.ResourceNotFound:
+                return None
+            name = fs.path.basename(fs.path.normpath(path))
+            return ResourceInfo.from_stat(name, st)
+
+        return await self._run(getinfo)
+
+    async def scandir(self, path: str) -> list[ResourceInfo]:
+        def scandir() -> list[ResourceInfo]:
+            infos = []
+            with convert_os_errors("scandir", path, directory=True):
+                with os.scandir(self.getsyspath(path)) as entries:
+                    for entry in entries:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            # e.g. a broken symlink
+                            continue
+                        infos.append(ResourceInfo.from_stat(entry.name, st))
+            return infos
+
+        return await self._run(scandir)
+
+    async def readbytes(self, path: str) -> bytes:
+        def readbytes() -> bytes:
+            with self.open(path, "rb") as f:
+                return f.read()
+
+        return await self._run(readbytes)
+
+    def open(self, path: str, mode: str) -> BinaryIO:
+        with convert_os_errors("open", path):
+            return open(self.getsyspath(path), mode)
+
+    async def makedirs(self, path: str):
+        def makedirs():
+            with convert_os_errors("makedirs", path, directory=True):
+                os.makedirs(self.getsyspath(path))
+
+        await self._run(makedirs)
+
+    async def remove(self, path: str):
+        def remove():
+            with convert_os_errors("remove", path):
+                os.remove(self.getsyspath(path))
+
+        await self._run(remove)
+
+    async def removedir(self, path: str):
+        def removedir():
+            with convert_os_errors("removedir", path, directory=True):
+                os.rmdir(self.getsyspath(path))
+
+        await self._run(removedir)
+
+    def _check_destination(self, src: str, dst: str, overwrite: bool):
+        if not os.path.exists(self.getsyspath(src)):
+            raise fs.errors.ResourceNotFound(src)
+        if os.path.isdir(self.getsyspath(src)):
+            raise fs.errors.FileExpected(src)
+        if not overwrite and os.path.exists(self.getsyspath(dst)):
+            raise fs.errors.DestinationExists(dst)
+        if not os.path.isdir(os.path.dirname(self.getsyspath(dst))):
+            raise fs.errors.ResourceNotFound(dst)
+
+    async def copy(self, src: str, dst: str, overwrite: bool = False):
+        def copy():
+            self._check_destination(src, dst, overwrite)
+            with convert_os_errors("copy", src):
+                shutil.copy2(self.getsyspath(src), self.getsyspath(dst))
+
+        await self._run(copy)
+
+    async def copydir(self, src: str, dst: str):
+        def copydir():
+            with convert_os_errors("copydir", src, directory=True):
+                shutil.copytree(
+                    self.getsyspath(src), self.getsyspath(dst), dirs_exist_ok=True
+                )
+
+        await self._run(copydir)
+
+    async def move(self, src: str, dst: str, overwrite: bool = False):
+        def move():
+            self._check_destination(src, dst, overwrite)
+            with convert_os_errors("move", src):
+                os.replace(self.getsyspath(src), self.getsyspath(dst))
+
+        await self._run(move)
+
+    async def movedir(self, src: str, dst: str):
+        def movedir():
+            src_path, dst_path = self.getsyspath(src), self.getsyspath(dst)
+            with convert_os_errors("movedir", src, directory=True):
+                if os.path.exists(dst_path):
+                    # merge into the existing directory, like FS.movedir()
+                    shutil.copytree(src_path, dst_path, dirs_exist_ok=True)
+                    shutil.rmtree(src_path)
+                else:
+                    shutil.move(src_path, dst_path)
+
+        await self._run(movedir)
+
+    async def removetree(self, path: str):
+        def removetree():
+            with convert_os_errors("removetree", path, directory=True):
+                shutil.rmtree(self.getsyspath(path))
+
+        await self._run(removetree)
+
+    async def concat(self, parts: list[str], dst: str):
+        def concat():
+            with convert_os_errors("concat", dst):
+                with open(self.getsyspath(dst), "wb") as out:
+                    for part in parts:
+                        with open(self.getsyspath(part), "rb") as f:
+                            _copy_file_range(f, out)
+
+        await self._run(concat)
+
+
+# ------------------------------------------------------------------------------
+def _copy_file_range(src: BinaryIO, dst: BinaryIO):
+    """
+    Append a file to another one, in the kernel when possible (and sharing the
+    blocks, on the filesystems supporting reflinks)
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while os.copy_file_range(src.fileno(), dst.fileno(), COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError:
+            # e.g. not supported between these filesystems : copy what is left
+            pass
+    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+
+def _to_datetime(timestamp: float | None) -> datetime.datetime | None:
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+__all__ = ["Backend", "FSBackend", "OSBackend", "ResourceInfo"]
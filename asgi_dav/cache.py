@@ -0,0 +1,104 @@
+"""
+    Caches placed in front of the filesystem
+"""
+
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+import time
+
+# ------------------------------------------------------------------------------
+# Files that macOS Finder keeps asking for on every volume, and that are never
+# user content. The other probes (desktop.ini, Thumbs.db, .DS_Store, ._*...)
+# are real files once a client writes them : they can only be remembered as
+# missing for a while
+CLIENT_PROBE_PATTERNS = (
+    ".Spotlight-V100",
+    ".metadata_never_index",
+    ".metadata_never_index_unless_rootfs",
+)
+
+
+# ------------------------------------------------------------------------------
+class NegativeCache:
+    """
+    A bounded cache of the paths that were recently found not to exist, so
+    that repeated probes for them are answered without calling the filesystem.
+    Paths whose name matches one of `patterns` are always reported as missing.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 4096,
+        ttl: float = 30.0,
+        patterns: tuple[str, ...] | list[str] = (),
+    ):
+        """
+        Create a new negative cache
+        :param maxsize: the maximum number of paths to remember
+        :param ttl: how long (in seconds) a path is remembered as missing
+        :param patterns: glob patterns (e.g. CLIENT_PROBE_PATTERNS) matched
+            against the file names that are answered 404 without looking
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.patterns = tuple(patterns)
+        self._entries: OrderedDict[str, float] = OrderedDict()
+        # incremented by every invalidation : a lookup started before one may
+        # have missed a resource that was created meanwhile
+        self.generation = 0
+        # number of filesystem lookups that were not made thanks to this cache
+        self.avoided = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def matches_pattern(self, path: str) -> bool:
+        name = path.rstrip("/").rsplit("/", 1)[-1]
+        return any(fnmatchcase(name, pattern) for pattern in self.patterns)
+
+    def is_missing(self, path: str) -> bool:
+        """
+        Tell if `path` is known not to exist
+        """
+        if self.patterns and self.matches_pattern(path):
+            self.avoided += 1
+            return True
+        expires = self._entries.get(path)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._entries[path]
+            return False
+        self._entries.move_to_end(path)
+        self.avoided += 1
+        return True
+
+    def add(self, path: str, generation: int | None = None):
+        """
+        Remember that `path` does not exist
+        :param generation: the value of `generation` when the lookup started.
+            Nothing is remembered if the cache was invalidated since
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[path] = time.monotonic() + self.ttl
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, path: str):
+        """
+        Forget about `path` and everything below it, after it has been created
+        """
+        self.generation += 1
+        self._entries.pop(path, None)
+        prefix = path.rstrip("/") + "/"
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+
+__all__ = ["NegativeCache", "CLIENT_PROBE_PATTERNS"]
@@ -0,0 +1,530 @@
+"""
+    A deduplicating storage backend : the content of the files is stored once,
+    in blobs named after its SHA-256 hash, and the tree of the resources is a
+    SQLite table mapping each path to a blob. Copies are metadata operations,
+    and the blobs no longer referenced are removed in the background
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Executor
+from typing import BinaryIO
+
+import fs.errors
+import fs.path
+
+from .backends import COPY_CHUNK_SIZE, Backend, ResourceInfo
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL,
+    ctime REAL,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_unreferenced ON blobs (refs) WHERE refs <= 0;
+"""
+
+_COLUMNS = "path, parent, name, is_dir, size, mtime, ctime, hash"
+
+# the rows of a subtree are between '<path>/' and '<path>0' ('0' follows '/')
+_SUBTREE = "(path = ? OR (path >= ? AND path < ?))"
+
+
+# ------------------------------------------------------------------------------
+class DedupBackend(Backend):
+    """
+    A backend storing the content of the files in content-addressed blobs.
+
+    <root>/blobs/ab/abcdef...   the blobs, named after the SHA-256 of their content
+    <root>/tmp/                 the files being written
+    <root>/index.sqlite         path -> blob, and the reference count of the blobs
+
+    A file written with the content of an existing blob is not stored again,
+    and the ETags are the content hashes
+    """
+
+    def __init__(
+        self,
+        root: str,
+        database: str | None = None,
+        gc_interval: float = 300,
+        executor: Executor | None = None,
+    ):
+        """
+        Create a new DedupBackend
+        :param root: the local directory holding the blobs (and the database)
+        :param database: the SQLite database of the tree, <root>/index.sqlite by
+            default
+        :param gc_interval: the time between two removals of the unreferenced
+            blobs, in seconds
+        :param executor: the executor the blocking calls are run in
+        """
+        super().__init__(executor)
+        self.root = os.path.abspath(root)
+        if not os.path.isdir(self.root):
+            raise fs.errors.CreateFailed(f"root path '{root}' does not exist")
+        self.blobs_dir = os.path.join(self.root, "blobs")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.gc_interval = gc_interval
+        self._db = sqlite3.connect(
+            database or os.path.join(self.root, "index.sqlite"),
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+            now = time.time()
+            self._db.execute(
+                "INSERT OR IGNORE INTO nodes VALUES ('/', '', '', 1, 0, ?, ?, NULL)",
+                (now, now),
+            )
+        self._task: asyncio.Task | None = None
+
+    # --------------------------------------------------------------------------
+    async def start(self):
+        # left over by an interrupted upload
+        for name in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, name))
+        self._task = asyncio.create_task(self._gc_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _gc_loop(self):
+        while True:
+            await asyncio.sleep(self.gc_interval)
+            try:
+                if removed := await self.gc():
+                    logging.info(f"removed {removed} unreferenced blobs")
+            except Exception:
+                logging.exception("removing the unreferenced blobs")
+
+    async def gc(self) -> int:
+        """
+        Remove the blobs no longer referenced, return how many were removed
+        """
+
+        def gc() -> int:
+            with self._lock, self._db:
+                hashes = [
+                    row[0]
+                    for row in self._db.execute(
+                        "SELECT hash FROM blobs WHERE refs <= 0"
+                    )
+                ]
+                self._db.execute("DELETE FROM blobs WHERE refs <= 0")
+                for digest in hashes:
+                    try:
+                        os.remove(self.blob_path(digest))
+                    except FileNotFoundError:
+                        pass
+            return len(hashes)
+
+        return await self._run(gc)
+
+    # --------------------------------------------------------------------------
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def _node(self, path: str) -> tuple | None:
+        return self._db.execute(
+            f"SELECT {_COLUMNS} FROM nodes WHERE path = ?", (path,)
+        ).fetchone()
+
+    def _file_node(self, path: str) -> tuple:
+        node = self._node(path)
+        if node is None:
+            raise fs.errors.ResourceNotFound(path)
+        if node[3]:
+            raise fs.errors.FileExpected(path)
+        return node
+
+    def _check_parent(self, path: str):
+        parent = self._node(fs.path.dirname(path))
+        if parent is None:
+            raise fs.errors.ResourceNotFound(path)
+        if not parent[3]:
+            raise fs.errors.DirectoryExpected(fs.path.dirname(path))
+
+    def _subtree(self, path: str) -> list[tuple]:
+        return self._db.execute(
+            f"SELECT {_COLUMNS} FROM nodes WHERE {_SUBTREE}",
+            (path, path.rstrip("/") + "/", path.rstrip("/") + "0"),
+        ).fetchall()
+
+    def _delete_subtree(self, path: str):
+        self._db.execute(
+            f"DELETE FROM nodes WHERE {_SUBTREE}",
+            (path, path.rstrip("/") + "/", path.rstrip("/") + "0"),
+        )
+
+    def _add_refs(self, refs: Counter):
+        self._db.executemany(
+            "UPDATE blobs SET refs = refs + ? WHERE hash = ?",
+            [(count, digest) for digest, count in refs.items() if digest and count],
+        )
+
+    def _put_file(
+        self,
+        path: str,
+        size: int,
+        digest: str,
+        mtime: float,
+        ctime: float | None = None,
+    ):
+        """
+        Point `path` to a blob, replacing the file that may be there
+        """
+        refs = Counter({digest: 1})
+        if (old := self._node(path)) is not None:
+            refs[old[7]] -= 1
+            ctime = ctime or old[6]
+        self._db.execute(
+            "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, 0, ?, ?, ?, ?)",
+            (
+                path,
+                fs.path.dirname(path),
+                fs.path.basename(path),
+                size,
+                mtime,
+                ctime or mtime,
+                digest,
+            ),
+        )
+        self._add_refs(refs)
+
+    def _commit(self, path: str, tmp_path: str, digest: str, size: int):
+        """
+        Store a file written in the tmp directory : it becomes a blob, unless a
+        blob already holds the same content
+        """
+        with self._lock, self._db:
+            self._check_parent(path)
+            known = self._db.execute(
+                "SELECT 1 FROM blobs WHERE hash = ?", (digest,)
+            ).fetchone()
+            if known and os.path.exists(self.blob_path(digest)):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(self.blob_path(digest)), exist_ok=True)
+                os.replace(tmp_path, self.blob_path(digest))
+                self._db.execute(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, 0)", (digest, size)
+                )
+            self._put_file(path, size, digest, time.time())
+
+    # --------------------------------------------------------------------------
+    async def getinfo(self, path: str) -> ResourceInfo | None:
+        def getinfo() -> ResourceInfo | None:
+            with self._lock:
+                node = self._node(_normalize(path))
+            return _to_info(node) if node is not None else None
+
+        return await self._run(getinfo)
+
+    async def scandir(self, path: str) -> list[ResourceInfo]:
+        def scandir() -> list[ResourceInfo]:
+            path_ = _normalize(path)
+            with self._lock:
+                node = self._node(path_)
+                if node is None:
+                    raise fs.errors.ResourceNotFound(path)
+                if not node[3]:
+                    raise fs.errors.DirectoryExpected(path)
+                rows = self._db.execute(
+                    f"SELECT {_COLUMNS} FROM nodes WHERE parent = ? AND path != '/'",
+                    (path_,),
+                ).fetchall()
+            return [_to_info(row) for row in rows]
+
+        return await self._run(scandir)
+
+    async def readbytes(self, path: str) -> bytes:
+        def readbytes() -> bytes:
+            with self.open(path, "rb") as f:
+                return f.read()
+
+        return await self._run(readbytes)
+
+    def open(self, path: str, mode: str) -> BinaryIO:
+        path = _normalize(path)
+        with self._lock:
+            node = self._node(path)
+            if node is not None and node[3]:
+                raise fs.errors.FileExpected(path)
+            if "r" in mode and node is None:
+                raise fs.errors.ResourceNotFound(path)
+            if "x" in mode and node is not None:
+                raise fs.errors.FileExists(path)
+            self._check_parent(path)
+        if mode in ("r", "rb"):
+            # the blob stays readable if the file is replaced meanwhile
+            return open(self.blob_path(node[7]), "rb")
+        return _StagedFile(self, path, node[7] if "r" in mode else None)
+
+    async def makedirs(self, path: str):
+        def makedirs():
+            path_ = _normalize(path)
+            now = time.time()
+            with self._lock, self._db:
+                if self._node(path_) is not None:
+                    raise fs.errors.DirectoryExists(path)
+                missing = []
+                current = path_
+                while (node := self._node(current)) is None:
+                    missing.append(current)
+                    current = fs.path.dirname(current)
+                if not node[3]:
+                    raise fs.errors.DirectoryExpected(current)
+                self._db.executemany(
+                    "INSERT INTO nodes VALUES (?, ?, ?, 1, 0, ?, ?, NULL)",
+                    [
+                        (p, fs.path.dirname(p), fs.path.basename(p), now, now)
+                        for p in missing
+                    ],
+                )
+
+        await self._run(makedirs)
+
+    async def remove(self, path: str):
+        def remove():
+            path_ = _normalize(path)
+            with self._lock, self._db:
+                node = self._file_node(path_)
+                self._db.execute("DELETE FROM nodes WHERE path = ?", (path_,))
+                self._add_refs(Counter({node[7]: -1}))
+
+        await self._run(remove)
+
+    async def removedir(self, path: str):
+        def removedir():
+            path_ = _normalize(path)
+            if path_ == "/":
+                raise fs.errors.RemoveRootError(path)
+            with self._lock, self._db:
+                node = self._node(path_)
+                if node is None:
+                    raise fs.errors.ResourceNotFound(path)
+                if not node[3]:
+                    raise fs.errors.DirectoryExpected(path)
+                if self._db.execute(
+                    "SELECT 1 FROM nodes WHERE parent = ? LIMIT 1", (path_,)
+                ).fetchone():
+                    raise fs.errors.DirectoryNotEmpty(path)
+                self._db.execute("DELETE FROM nodes WHERE path = ?", (path_,))
+
+        await self._run(removedir)
+
+    async def removetree(self, path: str):
+        def removetree():
+            path_ = _normalize(path)
+            with self._lock, self._db:
+                rows = self._subtree(path_)
+                if not rows:
+                    raise fs.errors.ResourceNotFound(path)
+                if path_ == "/":
+                    # the root stays
+                    self._db.execute("DELETE FROM nodes WHERE path != '/'")
+                else:
+                    self._delete_subtree(path_)
+                self._add_refs(Counter({row[7]: -1 for row in rows if row[7]}))
+
+        await self._run(removetree)
+
+    def _copy_file(self, src: str, dst: str, overwrite: bool, keep_src: bool):
+        src, dst = _normalize(src), _normalize(dst)
+        with self._lock, self._db:
+            node = self._file_node(src)
+            dst_node = self._node(dst)
+            if dst_node is not None and (not overwrite or dst_node[3]):
+                raise fs.errors.DestinationExists(dst)
+            self._check_parent(dst)
+            if keep_src:
+                self._put_file(dst, node[4], node[7], time.time())
+            else:
+                self._put_file(dst, node[4], node[7], node[5], node[6])
+                self._db.execute("DELETE FROM nodes WHERE path = ?", (src,))
+                self._add_refs(Counter({node[7]: -1}))
+
+    async def copy(self, src: str, dst: str, overwrite: bool = False):
+        # only the mapping is copied
+        await self._run(self._copy_file, src, dst, overwrite, True)
+
+    async def move(self, src: str, dst: str, overwrite: bool = False):
+        await self._run(self._copy_file, src, dst, overwrite, False)
+
+    def _copy_tree(self, src: str, dst: str, keep_src: bool):
+        """
+        Copy (or move) a directory, merged into `dst` if it exists
+        """
+        src, dst = _normalize(src), _normalize(dst)
+        if dst == src or dst.startswith(src.rstrip("/") + "/"):
+            raise fs.errors.IllegalDestination(dst)
+        now = time.time()
+        with self._lock, self._db:
+            rows = self._subtree(src)
+            if not rows:
+                raise fs.errors.ResourceNotFound(src)
+            if not self._node(src)[3]:
+                raise fs.errors.DirectoryExpected(src)
+            self._check_parent(dst)
+            refs = Counter()
+            for row in sorted(rows):
+                path = dst + row[0][len(src) :] if row[0] != src else dst
+                existing = self._node(path)
+                if existing is not None:
+                    if bool(existing[3]) != bool(row[3]):
+                        raise fs.errors.DestinationExists(path)
+                    if existing[3]:
+                        continue
+                    refs[existing[7]] -= 1
+                mtime, ctime = (now, now) if keep_src else (row[5], row[6])
+                self._db.execute(
+                    "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        path,
+                        fs.path.dirname(path),
+                        fs.path.basename(path),
+                        row[3],
+                        row[4],
+                        mtime,
+                        ctime,
+                        row[7],
+                    ),
+                )
+                if row[7]:
+                    refs[row[7]] += 1
+            if not keep_src:
+                self._delete_subtree(src)
+                for row in rows:
+                    if row[7]:
+                        refs[row[7]] -= 1
+            self._add_refs(refs)
+
+    async def copydir(self, src: str, dst: str):
+        await self._run(self._copy_tree, src, dst, True)
+
+    async def movedir(self, src: str, dst: str):
+        await self._run(self._copy_tree, src, dst, False)
+
+    async def concat(self, parts: list[str], dst: str):
+        def concat():
+            with self.open(dst, "wb") as out:
+                for part in parts:
+                    with self.open(part, "rb") as f:
+                        while chunk := f.read(COPY_CHUNK_SIZE):
+                            out.write(chunk)
+
+        await self._run(concat)
+
+
+# ------------------------------------------------------------------------------
+class _StagedFile(io.FileIO):
+    """
+    A file written in the tmp directory, stored as a blob when closed.
+    The content is hashed as it is written, unless it is not written in order
+    """
+
+    def __init__(self, backend: DedupBackend, path: str, initial: str | None):
+        """
+        :param initial: the blob to start from (for the updates in place), if any
+        """
+        tmp_path = os.path.join(backend.tmp_dir, uuid.uuid4().hex)
+        if initial is not None:
+            with open(backend.blob_path(initial), "rb") as src:
+                with open(tmp_path, "wb") as dst:
+                    while chunk := src.read(COPY_CHUNK_SIZE):
+                        dst.write(chunk)
+        super().__init__(tmp_path, "r+" if initial is not None else "w+")
+        self.backend = backend
+        self.path = path
+        self.tmp_path = tmp_path
+        self._digest = hashlib.sha256() if initial is None else None
+        self._hashed = 0
+
+    def write(self, b) -> int:
+        written = super().write(b)
+        if self._digest is not None:
+            if self.tell() == self._hashed + written:
+                self._digest.update(memoryview(b)[:written])
+                self._hashed += written
+            else:
+                self._digest = None
+        return written
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        pos = super().seek(pos, whence)
+        if pos != self._hashed:
+            self._digest = None
+        return pos
+
+    def truncate(self, size: int | None = None) -> int:
+        size = super().truncate(size)
+        if size != self._hashed:
+            self._digest = None
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._digest is None:
+                # hashed again from the start
+                self._digest = hashlib.sha256()
+                super().seek(0)
+                while chunk := super().read(COPY_CHUNK_SIZE):
+                    self._digest.update(chunk)
+            size = os.fstat(self.fileno()).st_size
+        except BaseException:
+            super().close()
+            os.remove(self.tmp_path)
+            raise
+        super().close()
+        try:
+            self.backend._commit(
+                self.path, self.tmp_path, self._digest.hexdigest(), size
+            )
+        except BaseException:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+            raise
+
+
+# ------------------------------------------------------------------------------
+def _normalize(path: str) -> str:
+    return fs.path.abspath(fs.path.normpath(path))
+
+
+def _to_info(row: tuple) -> ResourceInfo:
+    _, _, name, is_dir, size, mtime, ctime, digest = row
+    return ResourceInfo(name, bool(is_dir), size, mtime, ctime, etag=digest)
+
+
+__all__ = ["DedupBackend"]
@@ -0,0 +1,115 @@
+"""
+    A filesystem wrapper simulating a high-latency backend (NFS, SMB, cloud
+    storage...), to make the cost of every backend call visible in tests and
+    benchmarks
+"""
+
+import random
+import threading
+import time
+from collections import Counter
+
+from fs.base import FS
+from fs.wrapfs import WrapFS
+
+# ------------------------------------------------------------------------------
+# The operations that pay the latency
+OPERATIONS = (
+    "getinfo",
+    "listdir",
+    "scandir",
+    "openbin",
+    "readbytes",
+    "writebytes",
+    "makedir",
+    "makedirs",
+    "remove",
+    "removedir",
+    "removetree",
+    "setinfo",
+    "copy",
+    "copydir",
+    "move",
+    "movedir",
+    "exists",
+    "isdir",
+    "isfile",
+)
+
+
+# ------------------------------------------------------------------------------
+class LatencyFS(WrapFS):
+    """
+    Wraps a FS, adding a configurable latency (plus some random jitter) to each
+    operation, counting the calls made per operation and the most operations
+    that were running at once
+    """
+
+    def __init__(
+        self,
+        wrap_fs: FS,
+        latency: float = 0.01,
+        jitter: float = 0.0,
+        latencies: dict[str, float] | None = None,
+        seed: int | None = None,
+    ):
+        """
+        Create a new LatencyFS
+        :param wrap_fs: the filesystem to wrap
+        :param latency: the latency of each operation, in seconds
+        :param jitter: a random amount, up to `jitter` seconds, added to or
+            removed from each latency
+        :param latencies: per-operation latencies, overriding `latency`
+        :param seed: seed of the jitter random generator, for reproducible runs
+        """
+        super().__init__(wrap_fs)
+        self.latency = latency
+        self.jitter = jitter
+        self.latencies = latencies or {}
+        self.calls: Counter[str] = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._in_flight_lock = threading.Lock()
+
+    def _delay(self, op: str):
+        self.calls[op] += 1
+        delay = self.latencies.get(op, self.latency)
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _begin(self):
+        with self._in_flight_lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _end(self):
+        with self._in_flight_lock:
+            self.in_flight -= 1
+
+    def reset_calls(self):
+        self.calls.clear()
+        self.max_in_flight = self.in_flight
+
+
+def _delayed(op: str):
+    def method(self, *args, **kwargs):
+        self._begin()
+        try:
+            self._delay(op)
+            return getattr(super(LatencyFS, self), op)(*args, **kwargs)
+        finally:
+            self._end()
+
+    method.__name__ = op
+    method.__doc__ = getattr(WrapFS, op).__doc__
+    return method
+
+
+for _op in OPERATIONS:
+    setattr(LatencyFS, _op, _delayed(_op))
+
+
+__all__ = ["LatencyFS"]
@@ -0,0 +1,297 @@
+"""
+    Metrics : counters and latency histograms, readable from Python or in the
+    Prometheus text format
+"""
+
+import bisect
+import contextvars
+import time
+from typing import Any, BinaryIO, Callable, Iterable
+
+from asgiref.typing import ASGIReceiveCallable, ASGISendCallable, Scope
+
+from .backends import Backend
+
+# ------------------------------------------------------------------------------
+# Upper bounds of the latency histograms buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+labels_t = tuple[tuple[str, str], ...]
+
+# (name, type, labels, value) samples, as returned by the collectors
+sample_t = tuple[str, str, dict[str, str], float]
+
+
+# ------------------------------------------------------------------------------
+class Histogram:
+    """
+    A cumulative histogram with fixed buckets
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile (e.g. 0.99) by linear interpolation in its bucket
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+# ------------------------------------------------------------------------------
+class RequestStats:
+    """
+    What a single request spent its time on
+    """
+
+    __slots__ = ("backend_time", "send_time", "bytes_in", "bytes_out", "status")
+
+    def __init__(self):
+        self.backend_time = 0.0
+        self.send_time = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.status = 0
+
+
+current_request_stats: contextvars.ContextVar[RequestStats | None] = (
+    contextvars.ContextVar("current_request_stats", default=None)
+)
+
+
+# ------------------------------------------------------------------------------
+class Metrics:
+    """
+    A registry of counters and histograms.
+    Metrics objects are also ASGI applications serving the Prometheus text
+    format, e.g. `fastapi_app.mount("/metrics", metrics)`
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters: dict[str, dict[labels_t, float]] = {}
+        self.histograms: dict[str, dict[labels_t, Histogram]] = {}
+        self.collectors: list[Callable[[], Iterable[sample_t]]] = []
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        series = self.counters.setdefault(name, {})
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        series = self.histograms.setdefault(name, {})
+        key = tuple(labels.items())
+        histogram = series.get(key)
+        if histogram is None:
+            series[key] = histogram = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def histogram(self, name: str, **labels: str) -> Histogram | None:
+        return self.histograms.get(name, {}).get(tuple(labels.items()))
+
+    def add_collector(self, collector: Callable[[], Iterable[sample_t]]):
+        """
+        Register a function returning samples computed when the metrics are read
+        """
+        self.collectors.append(collector)
+
+    def snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        """
+        Get the current values of all the metrics
+        """
+        result: dict[str, list[dict[str, Any]]] = {}
+        for name, series in self.counters.items():
+            result[name] = [
+                {"labels": dict(labels), "value": value}
+                for labels, value in series.items()
+            ]
+        for name, series in self.histograms.items():
+            result[name] = [
+                {
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.sum,
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                }
+                for labels, h in series.items()
+            ]
+        for collector in self.collectors:
+            for name, _, labels, value in collector():
+                result.setdefault(name, []).append({"labels": labels, "value": value})
+        return result
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, series in self.counters.items():
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, series in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in series.items():
+                cumulated = 0
+                for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulated += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels + (('le', le),))} "
+                        f"{cumulated}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        typed = set()
+        for collector in self.collectors:
+            for name, type_, labels, value in collector():
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {type_}")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(tuple(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def __call__(
+        self, scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable
+    ):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                await send({"type": message["type"] + ".complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+        body = self.render_prometheus().encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8"),
+                    (b"Content-Length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+# ------------------------------------------------------------------------------
+class InstrumentedBackend(Backend):
+    """
+    A Backend wrapper timing the calls made to another backend
+    """
+
+    def __init__(self, backend: Backend, metrics: Metrics):
+        super().__init__(backend.executor)
+        self.backend = backend
+        self.metrics = metrics
+
+    def __getattr__(self, name: str) -> Any:
+        # attributes specific to the wrapped backend, e.g. FSBackend.fs
+        return getattr(self.backend, name)
+
+    async def _timed(self, op: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe("asgi_dav_backend_call_seconds", elapsed, op=op)
+            stats = current_request_stats.get()
+            if stats is not None:
+                stats.backend_time += elapsed
+
+    async def start(self):
+        await self.backend.start()
+
+    async def close(self):
+        await self.backend.close()
+
+    def getsyspath(self, path: str) -> str:
+        return self.backend.getsyspath(path)
+
+    async def getinfo(self, path: str):
+        return await self._timed("getinfo", self.backend.getinfo, path)
+
+    async def scandir(self, path: str):
+        return await self._timed("scandir", self.backend.scandir, path)
+
+    async def readbytes(self, path: str) -> bytes:
+        return await self._timed("readbytes", self.backend.readbytes, path)
+
+    def open(self, path: str, mode: str) -> BinaryIO:
+        return self.backend.open(path, mode)
+
+    async def makedirs(self, path: str):
+        await self._timed("makedirs", self.backend.makedirs, path)
+
+    async def remove(self, path: str):
+        await self._timed("remove", self.backend.remove, path)
+
+    async def removedir(self, path: str):
+        await self._timed("removedir", self.backend.removedir, path)
+
+    async def copy(self, src: str, dst: str, overwrite: bool = False):
+        await self._timed("copy", self.backend.copy, src, dst, overwrite)
+
+    async def copydir(self, src: str, dst: str):
+        await self._timed("copydir", self.backend.copydir, src, dst)
+
+    async def move(self, src: str, dst: str, overwrite: bool = False):
+        await self._timed("move", self.backend.move, src, dst, overwrite)
+
+    async def movedir(self, src: str, dst: str):
+        await self._timed("movedir", self.backend.movedir, src, dst)
+
+    async def removetree(self, path: str):
+        await self._timed("removetree", self.backend.removetree, path)
+
+    async def concat(self, parts: list[str], dst: str):
+        await self._timed("concat", self.backend.concat, parts, dst)
+
+
+# ------------------------------------------------------------------------------
+def _format_labels(labels: labels_t) -> str:
+    if not labels:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    ]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+__all__ = ["Metrics", "Histogram", "InstrumentedBackend", "RequestStats"]
@@ -0,0 +1,343 @@
+"""
+    Several filesystems served by a single DAVApp, each one under its own path
+    prefix : the backend of a path is found with a trie of the prefixes, and
+    the copies and moves between the filesystems are streamed
+"""
+
+import asyncio
+import logging
+import shutil
+from concurrent.futures import Executor
+from typing import BinaryIO
+
+import fs.errors
+import fs.path
+from fs.base import FS
+from fs.info import Info
+
+from .backends import COPY_CHUNK_SIZE, Backend, FSBackend, ResourceInfo
+
+
+# ------------------------------------------------------------------------------
+class _TrieNode:
+    __slots__ = ("children", "backend")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.backend: Backend | None = None
+
+
+class PrefixTrie:
+    """
+    The mount points, by path segment. Finding the backend of a path costs one
+    dict lookup per segment, whatever the number of mounts
+    """
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def insert(self, prefix: str, backend: Backend):
+        node = self.root
+        for segment in _segments(prefix):
+            node = node.children.setdefault(segment, _TrieNode())
+        node.backend = backend
+
+    def node(self, path: str) -> _TrieNode | None:
+        """
+        Get the node of a path, if it is a mount point or one of their ancestors
+        """
+        node = self.root
+        for segment in _segments(path):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def lookup(self, path: str) -> tuple[Backend, str] | None:
+        """
+        Get the backend of the longest prefix of `path`, and the path within it
+        """
+        segments = _segments(path)
+        node = self.root
+        found = (node.backend, 0) if node.backend is not None else None
+        for depth, segment in enumerate(segments, 1):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.backend is not None:
+                found = (node.backend, depth)
+        if found is None:
+            return None
+        backend, depth = found
+        return backend, "/" + "/".join(segments[depth:])
+
+
+# ------------------------------------------------------------------------------
+class MountBackend(Backend):
+    """
+    A backend dispatching to other backends by path prefix. The ancestors of
+    the mount points that are not in a mounted filesystem are read-only
+    collections listing them, and the mount points themselves cannot be
+    removed, moved or replaced
+    """
+
+    def __init__(
+        self, mounts: dict[str, FS | Backend], executor: Executor | None = None
+    ):
+        """
+        Create a new MountBackend
+        :param mounts: path prefix -> the filesystem (or backend) served there
+        :param executor: the executor the copies between the backends run in
+        """
+        super().__init__(executor)
+        self.mounts = {
+            _normalize(prefix): (
+                mount if isinstance(mount, Backend) else FSBackend(mount)
+            )
+            for prefix, mount in mounts.items()
+        }
+        self.trie = PrefixTrie()
+        for prefix, backend in self.mounts.items():
+            self.trie.insert(prefix, backend)
+
+    async def start(self):
+        for backend in self.mounts.values():
+            await backend.start()
+
+    async def close(self):
+        for backend in self.mounts.values():
+            await backend.close()
+
+    def is_read_only(self, path: str) -> bool:
+        """
+        Tell if a path is outside of the mounts, or is a mount point
+        """
+        found = self.trie.lookup(_normalize(path))
+        return found is None or found[1] == "/"
+
+    def resolve(self, path: str, write: bool = False) -> tuple[Backend, str]:
+        """
+        Get the backend of a path, and the path within it
+        :param write: the path is to be written, removed or moved
+        :raises fs.errors.ResourceReadOnly: for the paths outside of the mounts,
+            and the mount points when `write`
+        """
+        found = self.trie.lookup(_normalize(path))
+        if found is None or (write and found[1] == "/"):
+            raise fs.errors.ResourceReadOnly(path)
+        return found
+
+    # --------------------------------------------------------------------------
+    def getsyspath(self, path: str) -> str:
+        backend, sub = self.resolve(path)
+        return backend.getsyspath(sub)
+
+    async def getinfo(self, path: str) -> Info | ResourceInfo | None:
+        path = _normalize(path)
+        name = fs.path.basename(path)
+        found = self.trie.lookup(path)
+        if found is not None:
+            backend, sub = found
+            info = await backend.getinfo(sub)
+            if info is not None:
+                # the root of a mounted filesystem is named after its mount point
+                return _renamed(info, name) if sub == "/" and path != "/" else info
+        if self.trie.node(path) is not None:
+            return ResourceInfo(name, True, 0, None, None)
+        return None
+
+    async def scandir(self, path: str) -> list[Info | ResourceInfo]:
+        path = _normalize(path)
+        node = self.trie.node(path)
+        infos: dict[str, Info | ResourceInfo] = {}
+        found = self.trie.lookup(path)
+        if found is not None:
+            backend, sub = found
+            try:
+                infos = {info.name: info for info in await backend.scandir(sub)}
+            except fs.errors.ResourceNotFound:
+                if node is None:
+                    raise
+        elif node is None:
+            raise fs.errors.ResourceNotFound(path)
+        if node is not None and node.children:
+            # the mount points below hide what may have the same name
+            names = list(node.children)
+            mounted = await asyncio.gather(
+                *[self.getinfo(fs.path.join(path, name)) for name in names]
+            )
+            infos.update(zip(names, mounted))
+        return list(infos.values())
+
+    async def readbytes(self, path: str) -> bytes:
+        backend, sub = self.resolve(path)
+        return await backend.readbytes(sub)
+
+    def open(self, path: str, mode: str) -> BinaryIO:
+        backend, sub = self.resolve(path, write=mode not in ("r", "rb"))
+        return backend.open(sub, mode)
+
+    async def makedirs(self, path: str):
+        backend, sub = self.resolve(path, write=True)
+        await backend.makedirs(sub)
+
+    async def remove(self, path: str):
+        backend, sub = self.resolve(path, write=True)
+        await backend.remove(sub)
+
+    async def removedir(self, path: str):
+        backend, sub = self.resolve(path, write=True)
+        await backend.removedir(sub)
+
+    async def removetree(self, path: str):
+        backend, sub = self.resolve(path, write=True)
+        await backend.removetree(sub)
+
+    async def concat(self, parts: list[str], dst: str):
+        backend, sub = self.resolve(dst, write=True)
+        resolved = [self.resolve(part) for part in parts]
+        if all(part_backend is backend for part_backend, _ in resolved):
+            await backend.concat([part for _, part in resolved], sub)
+        else:
+            await super().concat(parts, dst)
+
+    # --------------------------------------------------------------------------
+    async def copy(self, src: str, dst: str, overwrite: bool = False):
+        src_backend, src_sub = self.resolve(src)
+        dst_backend, dst_sub = self.resolve(dst, write=True)
+        if src_backend is dst_backend:
+            await src_backend.copy(src_sub, dst_sub, overwrite=overwrite)
+        else:
+            await self._stream_file(
+                src_backend, src_sub, dst_backend, dst_sub, overwrite
+            )
+
+    async def move(self, src: str, dst: str, overwrite: bool = False):
+        src_backend, src_sub = self.resolve(src, write=True)
+        dst_backend, dst_sub = self.resolve(dst, write=True)
+        if src_backend is dst_backend:
+            await src_backend.move(src_sub, dst_sub, overwrite=overwrite)
+        else:
+            await self._stream_file(
+                src_backend, src_sub, dst_backend, dst_sub, overwrite
+            )
+            await src_backend.remove(src_sub)
+
+    async def copydir(self, src: str, dst: str):
+        src_backend, src_sub = self.resolve(src)
+        dst_backend, dst_sub = self.resolve(dst, write=True)
+        if src_backend is dst_backend:
+            await src_backend.copydir(src_sub, dst_sub)
+        else:
+            await self._stream_tree(src_backend, src_sub, dst_backend, dst_sub)
+
+    async def movedir(self, src: str, dst: str):
+        src_backend, src_sub = self.resolve(src, write=True)
+        dst_backend, dst_sub = self.resolve(dst, write=True)
+        if src_backend is dst_backend:
+            await src_backend.movedir(src_sub, dst_sub)
+        else:
+            await self._stream_tree(src_backend, src_sub, dst_backend, dst_sub)
+            await src_backend.removetree(src_sub)
+
+    async def _stream_file(
+        self,
+        src_backend: Backend,
+        src: str,
+        dst_backend: Backend,
+        dst: str,
+        overwrite: bool,
+    ):
+        """
+        Copy a file from a backend to another one, a chunk at a time
+        """
+        info, dst_info = await asyncio.gather(
+            src_backend.getinfo(src), dst_backend.getinfo(dst)
+        )
+        if info is None:
+            raise fs.errors.ResourceNotFound(src)
+        if info.is_dir:
+            raise fs.errors.FileExpected(src)
+        if dst_info is not None and (not overwrite or dst_info.is_dir):
+            raise fs.errors.DestinationExists(dst)
+
+        def copy():
+            with src_backend.open(src, "rb") as f:
+                with dst_backend.open(dst, "wb") as out:
+                    shutil.copyfileobj(f, out, COPY_CHUNK_SIZE)
+
+        try:
+            await self._run(copy)
+        except BaseException:
+            # not left partly written
+            await _discard(dst_backend.remove(dst))
+            raise
+
+    async def _stream_tree(
+        self, src_backend: Backend, src: str, dst_backend: Backend, dst: str
+    ):
+        """
+        Copy a directory from a backend to another one, merged into `dst` if it
+        exists. When `dst` is created, it is removed if the copy fails
+        """
+        dst_info = await dst_backend.getinfo(dst)
+        if dst_info is None:
+            await dst_backend.makedirs(dst)
+            try:
+                await self._stream_entries(src_backend, src, dst_backend, dst)
+            except BaseException:
+                await _discard(dst_backend.removetree(dst))
+                raise
+        elif not dst_info.is_dir:
+            raise fs.errors.DirectoryExpected(dst)
+        else:
+            await self._stream_entries(src_backend, src, dst_backend, dst)
+
+    async def _stream_entries(
+        self, src_backend: Backend, src: str, dst_backend: Backend, dst: str
+    ):
+        for info in await src_backend.scandir(src):
+            src_path = fs.path.join(src, info.name)
+            dst_path = fs.path.join(dst, info.name)
+            if info.is_dir:
+                await self._stream_tree(src_backend, src_path, dst_backend, dst_path)
+            else:
+                await self._stream_file(
+                    src_backend, src_path, dst_backend, dst_path, overwrite=True
+                )
+
+
+# ------------------------------------------------------------------------------
+def _normalize(path: str) -> str:
+    return fs.path.abspath(fs.path.normpath(path))
+
+
+async def _discard(cleanup):
+    """
+    Run a clean up coroutine, ignoring its errors : the original error matters
+    """
+    try:
+        await cleanup
+    except fs.errors.ResourceNotFound:
+        pass
+    except Exception:
+        logging.exception("cleaning up after a failed copy")
+
+
+def _segments(path: str) -> list[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+def _renamed(info: Info | ResourceInfo, name: str) -> ResourceInfo:
+    if isinstance(info, Info):
+        return ResourceInfo(
+            name,
+            info.is_dir,
+            info.size if not info.is_dir else 0,
+            info.get("details", "modified"),
+            info.get("details", "created"),
+        )
+    return ResourceInfo(name, info.is_dir, info.size, info.mtime, info.ctime, info.etag)
+
+
+__all__ = ["MountBackend", "PrefixTrie"]
@@ -0,0 +1,363 @@
+"""
+    Opt-in per-request profiling : a fraction of the requests, and the requests
+    slower than a threshold, are captured with a lightweight stack sampler (or
+    cProfile) into a bounded ring buffer
+"""
+
+import asyncio
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Literal
+
+from asgiref.typing import ASGIReceiveCallable, ASGISendCallable, HTTPScope, Scope
+
+# the deepest stack kept by the sampler
+MAX_STACK_DEPTH = 64
+
+
+# ------------------------------------------------------------------------------
+@dataclass
+class ProfileRecord:
+    """
+    A captured request
+    """
+
+    method: str
+    path: str
+    depth: str | None
+    started: float
+    duration: float = 0.0
+    status: int = 0
+    # why the request was kept : "sampled" or "slow"
+    reason: str = ""
+    # free-form details added by the handlers, e.g. {"entries": 500}
+    details: dict[str, Any] = field(default_factory=dict)
+    # folded stacks ("outer;inner;leaf") -> number of samples
+    samples: Counter = field(default_factory=Counter)
+    # the text report of cProfile, in cprofile mode
+    report: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "depth": self.depth,
+            "started": self.started,
+            "duration": self.duration,
+            "status": self.status,
+            "reason": self.reason,
+            "details": self.details,
+            "samples": dict(self.samples.most_common()),
+            "report": self.report,
+        }
+
+    def folded(self) -> str:
+        """
+        The samples in the 'folded' format used by flame graph tools
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+
+current_profile: contextvars.ContextVar[ProfileRecord | None] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+def annotate(**details: Any):
+    """
+    Add details (e.g. the number of entries of a listing) to the profile of the
+    current request, if it is being profiled
+    """
+    record = current_profile.get()
+    if record is not None:
+        record.details.update(details)
+
+
+# ------------------------------------------------------------------------------
+class _InFlight:
+    """
+    A request being sampled, and the frame of the task running it
+    """
+
+    __slots__ = ("record", "coro_frame")
+
+    def __init__(self, record: ProfileRecord, coro_frame):
+        self.record = record
+        self.coro_frame = coro_frame
+
+
+# ------------------------------------------------------------------------------
+class RequestProfiler:
+    """
+    Profiles a random fraction (`sample_rate`) of the requests, and keeps the
+    records of the requests that took longer than `slow_threshold` : the stacks
+    of those are sampled from the moment they pass the threshold (unless they
+    were sampled from the start). In cprofile mode, they are only timed.
+
+    In "sampling" mode, a background thread samples the stacks of the event loop
+    thread (attributed to the request running at that time) and of the worker
+    threads (attributed to the requests that are waiting, which is approximate
+    when several requests are in flight).
+    In "cprofile" mode, the sampled requests are profiled with cProfile, one at
+    a time. cProfile sees everything the interpreter runs meanwhile, including
+    the other requests : its reports are only meaningful when the requests are
+    served one at a time (e.g. a single client replaying a slow request).
+
+    RequestProfiler objects are also ASGI applications dumping the captured
+    profiles as JSON (or as folded stacks with ?format=folded), e.g.
+    `fastapi_app.mount("/_profiles", profiler)`
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.01,
+        slow_threshold: float | None = 1.0,
+        capacity: int = 100,
+        interval: float = 0.005,
+        mode: Literal["sampling", "cprofile"] = "sampling",
+        callback: Callable[[ProfileRecord], Awaitable[None]] | None = None,
+    ):
+        """
+        Create a new profiler
+        :param sample_rate: the fraction of the requests to profile (0 to 1)
+        :param slow_threshold: the requests slower than this (in seconds) are
+            kept, None to disable
+        :param capacity: the maximum number of profiles kept
+        :param interval: the time between two stack samples, in seconds
+        :param mode: "sampling" or "cprofile"
+        :param callback: coroutine called with each captured profile
+        """
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.interval = interval
+        self.mode = mode
+        self.callback = callback
+        self.profiles: deque[ProfileRecord] = deque(maxlen=capacity)
+        self._inflight: dict[int, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stopped = False
+        self._loop_thread_id: int | None = None
+        self._cprofile_busy = False
+
+    # --------------------------------------------------------------------------
+    async def profile(
+        self,
+        handler: Callable[..., Awaitable[None]],
+        scope: HTTPScope,
+        receive: ASGIReceiveCallable,
+        send: ASGISendCallable,
+    ):
+        """
+        Run a request handler, profiling it if it is sampled
+        """
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_threshold is None:
+            await handler(scope, receive, send)
+            return
+
+        record = ProfileRecord(
+            method=scope["method"],
+            path=scope["path"],
+            depth=_get_header(scope, b"depth"),
+            started=time.time(),
+        )
+        token = current_profile.set(record)
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                record.status = message["status"]
+            await send(message)
+
+        profiler = None
+        slow_timer = None
+        key = id(record)
+        if self.mode == "cprofile":
+            if sampled and not self._cprofile_busy:
+                self._cprofile_busy = True
+                profiler = cProfile.Profile()
+                profiler.enable()
+        else:
+            task = asyncio.current_task()
+            coro_frame = getattr(task.get_coro(), "cr_frame", None) if task else None
+            inflight = _InFlight(record, coro_frame)
+            if sampled:
+                self._start_sampling(key, inflight)
+            else:
+                # the fast requests never start the sampler
+                slow_timer = asyncio.get_running_loop().call_later(
+                    self.slow_threshold, self._start_sampling, key, inflight
+                )
+
+        start = time.perf_counter()
+        try:
+            await handler(scope, receive, recording_send)
+        finally:
+            record.duration = time.perf_counter() - start
+            current_profile.reset(token)
+            if slow_timer is not None:
+                slow_timer.cancel()
+            if profiler is not None:
+                profiler.disable()
+                self._cprofile_busy = False
+                report = io.StringIO()
+                pstats.Stats(profiler, stream=report).sort_stats(
+                    "cumulative"
+                ).print_stats(40)
+                record.report = report.getvalue()
+            with self._lock:
+                self._inflight.pop(key, None)
+
+            slow = (
+                self.slow_threshold is not None
+                and record.duration >= self.slow_threshold
+            )
+            if sampled or slow:
+                record.reason = "slow" if slow else "sampled"
+                self.profiles.append(record)
+                if self.callback is not None:
+                    try:
+                        await self.callback(record)
+                    except Exception:
+                        logging.exception("profile callback")
+
+    def records(self) -> list[dict[str, Any]]:
+        return [record.to_dict() for record in self.profiles]
+
+    def clear(self):
+        self.profiles.clear()
+
+    async def stop(self):
+        """
+        Stop the sampling thread
+        """
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    # --------------------------------------------------------------------------
+    def _start_sampling(self, key: int, inflight: _InFlight):
+        with self._lock:
+            self._inflight[key] = inflight
+        if self._thread is None:
+            self._stopped = False
+            self._loop_thread_id = threading.get_ident()
+            self._thread = threading.Thread(
+                target=self._sample_loop, name="asgi_dav-profiler", daemon=True
+            )
+            self._thread.start()
+        self._wakeup.set()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stopped:
+            with self._lock:
+                inflight = list(self._inflight.values())
+                if not inflight:
+                    self._wakeup.clear()
+            if not inflight:
+                self._wakeup.wait()
+                continue
+            self._sample(inflight, own_id)
+            time.sleep(self.interval)
+
+    def _sample(self, inflight: list[_InFlight], own_id: int):
+        frames = sys._current_frames()
+        loop_frame = frames.get(self._loop_thread_id)
+        running = None
+        if loop_frame is not None:
+            frame = loop_frame
+            while frame is not None:
+                for item in inflight:
+                    if frame is item.coro_frame:
+                        running = item
+                frame = frame.f_back
+            if running is not None:
+                running.record.samples[_fold(loop_frame)] += 1
+
+        waiting = [item for item in inflight if item is not running]
+        if not waiting:
+            return
+        for thread_id, frame in frames.items():
+            if thread_id in (own_id, self._loop_thread_id) or _is_idle(frame):
+                continue
+            stack = _fold(frame)
+            for item in waiting:
+                item.record.samples[stack] += 1
+
+    # --------------------------------------------------------------------------
+    async def __call__(
+        self, scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable
+    ):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.shutdown":
+                    await self.stop()
+                await send({"type": message["type"] + ".complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+        if b"format=folded" in scope.get("query_string", b""):
+            body = "\n".join(
+                f"# {r.method} {r.path} {r.duration:.3f}s ({r.reason})\n{r.folded()}"
+                for r in self.profiles
+            ).encode()
+            content_type = b"text/plain; charset=utf-8"
+        else:
+            body = json.dumps(self.records()).encode()
+            content_type = b"application/json"
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"Content-Type", content_type),
+                    (b"Content-Length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+# ------------------------------------------------------------------------------
+def _fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _is_idle(frame) -> bool:
+    """
+    Tell if a thread is an idle executor worker (or some other waiting thread)
+    """
+    name = frame.f_code.co_name
+    filename = frame.f_code.co_filename
+    return (name == "_worker" and filename.endswith("thread.py")) or (
+        name == "wait" and filename.endswith("threading.py")
+    )
+
+
+def _get_header(scope: HTTPScope, name: bytes) -> str | None:
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode()
+    return None
+
+
+__all__ = ["RequestProfiler", "ProfileRecord", "annotate"]
@@ -1,32 +1,72 @@
 from io import StringIO
-import datetime
 from typing import TextIO
 from fs.info import Info
-from xml.etree.ElementTree import Element, ElementTree
-from .utils import concat_uri, to_rfc_1123, to_iso_8601, guess_contenttype
+from xml.etree.ElementTree import Element, ElementTree, tostring
+from .utils import (
+    concat_uri,
+    guess_contenttype,
+    timestamp_to_rfc_1123,
+    timestamp_to_iso_8601,
+)
+from .backends import ResourceInfo
 from hashlib import md5
 
 
 # ------------------------------------------------------------------------------
 class FileProps:
     """
-    A class that wraps a FS Info object to provide the properties of a file
-    objects of this class are used in Jinja templates to display file properties
+    The properties of a file, extracted from a FS Info object (or a backend
+    ResourceInfo). Only the fields that are needed are kept, so that large
+    listings stay compact. Objects of this class are used in Jinja templates
+    to display file properties
     """
 
-    def __init__(self, info: Info, parent_href: str):
-        self.info = info
+    __slots__ = (
+        "name",
+        "size",
+        "mtime",
+        "ctime",
+        "is_dir",
+        "parent_href",
+        "sort_key",
+        "quota",
+        "_etag",
+        "_props",
+    )
+
+    def __init__(
+        self,
+        info: Info | ResourceInfo,
+        parent_href: str,
+        quota: tuple[int, int | None] | None = None,
+    ):
+        """
+        :param quota: for the collections, the (used bytes, available bytes)
+        """
+        self.name = info.name or "/"
+        self.is_dir = info.is_dir
+        self.size = info.size if not self.is_dir else 0
+        if isinstance(info, Info):
+            self.mtime = info.get("details", "modified")
+            self.ctime = info.get("details", "created")
+        else:
+            self.mtime = info.mtime
+            self.ctime = info.ctime
         self.parent_href = parent_href
-        self._etag = None
-        self._contenttype = None
+        # directories first, then by name
+        self.sort_key = (not self.is_dir, self.name)
+        self.quota = quota
+        self._etag: str | None = getattr(info, "etag", None)
+        self._props: dict[str, str] | None = None
 
     @property
     def etag(self) -> str:
         if self._etag is None:
             digest = md5()
-            digest.update(self.info.name.encode())
-            digest.update(str(self.info.size).encode())
-            digest.update(self.info.modified.strftime("%Y-%m-%d %H:%M:%S").encode())
+            digest.update(self.name.encode())
+            digest.update(str(self.size).encode())
+            # not rounded to the second : two writes in the same second differ
+            digest.update(repr(self.mtime).encode())
             self._etag = digest.hexdigest()
         return self._etag
 
@@ -34,72 +74,55 @@ class FileProps:
     def href(self) -> str:
         return concat_uri(self.parent_href, self.name)
 
-    @property
-    def name(self) -> str:
-        return self.info.name or "/"
-
     @property
     def contentlength(self) -> int:
-        return self.info.size
-
-    @property
-    def is_dir(self) -> bool:
-        return self.info.is_dir
+        return self.size
 
     @property
     def is_file(self) -> bool:
-        return self.info.is_file
-
-    @property
-    def size(self) -> int:
-        return self.info.size if self.info.is_file else 0
+        return not self.is_dir
 
     @property
     def lastmodified(self) -> str:
-        dt = self.info.modified or datetime.datetime.min
-        return to_rfc_1123(dt)
+        return timestamp_to_rfc_1123(self.mtime)
 
     @property
     def creationdate(self) -> str:
-        dt = self.info.created or datetime.datetime.min
-        return to_iso_8601(dt)
+        return timestamp_to_iso_8601(self.ctime)
 
     @property
     def content_type(self) -> str:
-        if self._contenttype is None:
-            self._contenttype = guess_contenttype(self.name)
-        return self._contenttype
+        return guess_contenttype(self.name)
 
     @property
     def props(self) -> dict[str, str]:
-        props = {
-            "D:displayname": self.name,
-            "D:creationdate": self.creationdate,
-            "D:getlastmodified": self.lastmodified,
-        }
-        if self.info.is_dir:
-            props.update(
-                {
+        if self._props is None:
+            if self.is_dir:
+                self._props = {
+                    "D:displayname": self.name,
+                    "D:creationdate": self.creationdate,
+                    "D:getlastmodified": self.lastmodified,
                     "D:getcontenttype": "httpd/unix-directory",
                 }
-            )
-        else:
-            props.update(
-                {
-                    "D:getcontentlength": str(self.contentlength),
+                if self.quota is not None:
+                    # RFC 4331
+                    used, available = self.quota
+                    self._props["D:quota-used-bytes"] = str(used)
+                    if available is not None:
+                        self._props["D:quota-available-bytes"] = str(available)
+            else:
+                self._props = {
+                    "D:displayname": self.name,
+                    "D:creationdate": self.creationdate,
+                    "D:getlastmodified": self.lastmodified,
+                    "D:getcontentlength": str(self.size),
                     "D:getcontenttype": self.content_type,
                     "D:getetag": self.etag,
                 }
-            )
-        return props
+        return self._props
 
     def __lt__(self, other: "FileProps") -> bool:
-        if self.is_dir and not other.is_dir:
-            return True
-        elif not self.is_dir and other.is_dir:
-            return False
-        else:
-            return self.name < other.name
+        return self.sort_key < other.sort_key
 
 
 # ------------------------------------------------------------------------------
@@ -168,3 +191,15 @@ class PropfindResponseBuilder:
         t = StringIO()
         self.write(t)
         return t.getvalue()
+
+    # the pieces of a multistatus document, for the responses that are streamed
+    def xml_head(self) -> str:
+        xmlns = " ".join(f'xmlns:{k}="{v}"' for k, v in self.namespaces.items())
+        return f"<?xml version='1.0' encoding='UTF-8'?>\n<D:multistatus {xmlns}>"
+
+    def render_response(self, fp: FileProps) -> str:
+        response = PropfindResponseBuilder.Response(fp.href, fp.is_dir, fp.props)
+        return tostring(response.to_element(), encoding="unicode")
+
+    def xml_tail(self) -> str:
+        return "</D:multistatus>"
@@ -0,0 +1,279 @@
+"""
+    Incremental quota accounting : the bytes and files of every collection,
+    updated as the resources change and reconciled by walking the tree in the
+    background, so that the usage never has to be computed on a request
+"""
+
+import asyncio
+import logging
+import time
+
+import fs.errors
+import fs.path
+from fs.info import Info
+
+from .backends import Backend, ResourceInfo
+
+# [bytes, files]
+usage_t = list[int]
+
+
+# ------------------------------------------------------------------------------
+class QuotaIndex:
+    """
+    The usage of every collection (including what it contains, recursively),
+    and the quota limits of some of them.
+
+    Until the first walk of the tree is over, the usage is unknown : nothing
+    is reported and no upload is rejected
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, int] | None = None,
+        reconcile_interval: float | None = 3600,
+    ):
+        """
+        Create a new QuotaIndex
+        :param limits: collection path -> maximum number of bytes it may hold
+        :param reconcile_interval: the time between two walks of the whole tree
+            correcting the usage, in seconds. The tree is only walked at startup
+            when None
+        """
+        self.limits = {
+            _normalize(path): limit for path, limit in (limits or {}).items()
+        }
+        self.reconcile_interval = reconcile_interval
+        self.backend: Backend | None = None
+        self.ready = False
+        # the files directly in each collection
+        self._own: dict[str, usage_t] = {}
+        # the files in each collection and below
+        self._total: dict[str, usage_t] = {}
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+
+    # --------------------------------------------------------------------------
+    async def start(self, backend: Backend):
+        self.backend = backend
+        self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _reconcile_loop(self):
+        while True:
+            try:
+                start = time.perf_counter()
+                await self.reconcile()
+                logging.info(
+                    f"quota usage reconciled in {time.perf_counter() - start:.1f}s"
+                )
+            except Exception:
+                logging.exception("reconciling the quota usage")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def schedule_reconcile(self):
+        """
+        Walk the whole tree again as soon as possible, e.g. when some changes
+        may have been missed
+        """
+        self._wakeup.set()
+
+    # --------------------------------------------------------------------------
+    def usage(self, path: str) -> tuple[int, int] | None:
+        """
+        Get the (bytes, files) held by a collection, None if unknown
+        """
+        if not self.ready:
+            return None
+        total = self._total.get(_normalize(path))
+        return (total[0], total[1]) if total is not None else None
+
+    def available(self, path: str) -> int | None:
+        """
+        Get the number of bytes that can still be written in a collection, None
+        when it is not limited (or the usage is not known yet)
+        """
+        if not self.ready or not self.limits:
+            return None
+        available = None
+        for ancestor in _ancestors(_normalize(path)):
+            if (limit := self.limits.get(ancestor)) is not None:
+                used = self._total.get(ancestor, [0, 0])[0]
+                left = max(0, limit - used)
+                available = left if available is None else min(available, left)
+        return available
+
+    def allows(self, path: str, extra_bytes: int, source: str | None = None) -> bool:
+        """
+        Tell if `extra_bytes` more bytes fit in the collection `path`
+        :param source: the collection the bytes are moved from : the limits
+            they already count against are not checked
+        """
+        if extra_bytes <= 0 or not self.ready or not self.limits:
+            return True
+        path = _normalize(path)
+        kept = set(_ancestors(_normalize(source))) if source is not None else set()
+        for ancestor in _ancestors(path):
+            if ancestor in kept:
+                continue
+            if (limit := self.limits.get(ancestor)) is not None:
+                used = self._total.get(ancestor, [0, 0])[0]
+                if extra_bytes > limit - used:
+                    return False
+        return True
+
+    # --------------------------------------------------------------------------
+    def file_changed(self, path: str, old_size: int | None, new_size: int | None):
+        """
+        Account for a file created (old_size None), replaced, or removed
+        (new_size None)
+        """
+        delta_bytes = (new_size or 0) - (old_size or 0)
+        delta_files = (new_size is not None) - (old_size is not None)
+        self._add(fs.path.dirname(_normalize(path)), delta_bytes, delta_files)
+
+    def dir_created(self, path: str):
+        self._add(_normalize(path), 0, 0)
+
+    def dir_removed(self, path: str):
+        path = _normalize(path)
+        total = self._total.get(path)
+        if total is None:
+            return
+        self._add_to_ancestors(fs.path.dirname(path), -total[0], -total[1])
+        for tree in (self._own, self._total):
+            for key in _subtree_keys(tree, path):
+                del tree[key]
+
+    def tree_copied(self, src: str, dst: str):
+        """
+        Account for the copy of a collection to a new place
+        """
+        src, dst = _normalize(src), _normalize(dst)
+        total = self._total.get(src)
+        if total is None:
+            return
+        for tree in (self._own, self._total):
+            for key in _subtree_keys(tree, src):
+                tree[dst + key[len(src) :]] = list(tree[key])
+        self._add_to_ancestors(fs.path.dirname(dst), total[0], total[1])
+
+    def tree_moved(self, src: str, dst: str):
+        """
+        Account for the move of a collection to a new place
+        """
+        self.tree_copied(src, dst)
+        self.dir_removed(src)
+
+    async def refresh(self, path: str):
+        """
+        Account for a change whose details are unknown (e.g. made by another
+        program) : the collection holding `path`, or the collection `path` itself,
+        is listed again
+        """
+        if not self.ready:
+            return
+        path = _normalize(path)
+        info = await self.backend.getinfo(path)
+        if info is not None and info.is_dir:
+            await self.reconcile(path)
+        elif info is None and path in self._total:
+            self.dir_removed(path)
+        else:
+            await self._rescan(fs.path.dirname(path))
+
+    async def reconcile(self, root: str = "/"):
+        """
+        Compute the usage of a collection by walking it, and correct the usage
+        of its ancestors.
+        Each collection is corrected as soon as it is listed, so that the
+        changes made meanwhile to the collections already listed are kept
+        """
+        root = _normalize(root)
+        # the collections that are no longer there once the walk is over
+        vanished = set(_subtree_keys(self._own, root))
+        directories = [root]
+        while directories:
+            path = directories.pop()
+            infos = await self._rescan(path)
+            if infos is None:
+                continue
+            vanished.discard(path)
+            directories.extend(
+                fs.path.join(path, info.name) for info in infos if info.is_dir
+            )
+        # the parents first : removing them removes their children
+        for path in sorted(vanished, key=len):
+            if path in self._own:
+                self.dir_removed(path)
+        self.ready = True
+
+    # --------------------------------------------------------------------------
+    async def _rescan(self, path: str) -> list[Info | ResourceInfo] | None:
+        """
+        List a collection again, to correct the size of the files it holds.
+        Return the listing, None if the collection does not exist
+        """
+        before = list(self._own.get(path, [0, 0]))
+        try:
+            infos = await self.backend.scandir(path)
+        except (fs.errors.ResourceNotFound, fs.errors.DirectoryExpected):
+            return None
+        files = [info for info in infos if not info.is_dir]
+        # the changes accounted for while the collection was being listed may or
+        # may not be in the listing : they are kept, never to under-count
+        self._add(
+            path, sum(info.size for info in files) - before[0], len(files) - before[1]
+        )
+        return infos
+
+    def _add(self, path: str, delta_bytes: int, delta_files: int):
+        own = self._own.setdefault(path, [0, 0])
+        own[0] += delta_bytes
+        own[1] += delta_files
+        self._add_to_ancestors(path, delta_bytes, delta_files)
+
+    def _add_to_ancestors(self, path: str, delta_bytes: int, delta_files: int):
+        for ancestor in _ancestors(path):
+            total = self._total.setdefault(ancestor, [0, 0])
+            total[0] += delta_bytes
+            total[1] += delta_files
+            self._own.setdefault(ancestor, [0, 0])
+
+
+# ------------------------------------------------------------------------------
+def _normalize(path: str) -> str:
+    return fs.path.abspath(fs.path.normpath(path))
+
+
+def _ancestors(path: str) -> list[str]:
+    """
+    The path itself, then its parent, up to the root
+    """
+    ancestors = [path]
+    while path != "/":
+        path = fs.path.dirname(path)
+        ancestors.append(path)
+    return ancestors
+
+
+def _subtree_keys(tree: dict[str, usage_t], path: str) -> list[str]:
+    if path == "/":
+        return list(tree)
+    prefix = path + "/"
+    return [key for key in tree if key == path or key.startswith(prefix)]
+
+
+__all__ = ["QuotaIndex"]
@@ -0,0 +1,330 @@
+"""
+    Admission control : concurrency limits per client and overall for the
+    expensive requests, weighted fair queuing between the clients waiting for
+    a slot, and token-bucket bandwidth shaping of the transfers
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable
+
+from asgiref.typing import HTTPScope
+
+# the clients kept while idle, beyond which those with nothing pending are dropped
+MAX_IDLE_CLIENTS = 1024
+
+
+# ------------------------------------------------------------------------------
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted : `status` is 429 when the client
+    has too many requests queued, 503 when the server has
+    """
+
+    def __init__(self, status: int, retry_after: int):
+        super().__init__(f"overloaded ({status}), retry after {retry_after}s")
+        self.status = status
+        self.retry_after = retry_after
+
+
+# ------------------------------------------------------------------------------
+class TokenBucket:
+    """
+    A token bucket refilled with `rate` tokens (bytes) per second, holding up to
+    `burst` tokens. Reservations may overdraw it : the caller waits for the
+    tokens to be refilled
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens, return how long to wait before using them
+        """
+        self.tokens = self.refill() - amount
+        return max(0.0, -self.tokens / self.rate)
+
+    @property
+    def full(self) -> bool:
+        return self.refill() >= self.burst
+
+
+# ------------------------------------------------------------------------------
+class Ticket:
+    """
+    A request admitted by the scheduler, to release when it is over
+    """
+
+    __slots__ = ("client", "wait", "granted")
+
+    def __init__(self, client: str, wait: float):
+        self.client = client
+        self.wait = wait
+        self.granted = time.monotonic()
+
+
+class _Client:
+    __slots__ = ("active", "waiters", "last_tag", "bucket")
+
+    def __init__(self, bucket: TokenBucket | None):
+        self.active = 0
+        # (tag, future) in arrival order
+        self.waiters: deque[tuple[float, asyncio.Future]] = deque()
+        self.last_tag = 0.0
+        self.bucket = bucket
+
+
+# ------------------------------------------------------------------------------
+def client_identity(scope: HTTPScope) -> str:
+    """
+    Identify the client of a request : the user authenticated by a middleware
+    (`scope["user"]`, e.g. Starlette's AuthenticationMiddleware) if any, the IP
+    address otherwise. The Authorization header is not trusted : unverified, it
+    would let a client get the slots of as many users as it makes up names.
+    Give another `client_key` to the Scheduler to identify the clients otherwise
+    """
+    user = scope.get("user")
+    if user is not None and getattr(user, "is_authenticated", True):
+        name = (
+            user
+            if isinstance(user, str)
+            else getattr(user, "identity", None) or getattr(user, "display_name", None)
+        )
+        if name:
+            return f"user:{name}"
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "unknown"
+
+
+# ------------------------------------------------------------------------------
+class Scheduler:
+    """
+    Admits the expensive requests (PROPFIND with a Depth, COPY, MOVE, SEARCH,
+    large GETs and PUTs) when a slot is available for their client and
+    overall. The others wait in a queue per client, and the slots freed are
+    given to the clients in weighted fair order (start-time fair queuing), so
+    that a client sending thousands of requests does not delay the others
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_concurrency_per_client: int = 4,
+        max_queue: int = 512,
+        max_queue_per_client: int = 32,
+        max_wait: float = 30.0,
+        bandwidth: float | None = None,
+        bandwidth_per_client: float | None = None,
+        weights: Callable[[str], float] | dict[str, float] | None = None,
+        client_key: Callable[[HTTPScope], str] = client_identity,
+        large_transfer_size: int = 16 * 1024 * 1024,
+    ):
+        """
+        Create a new Scheduler
+        :param max_concurrency: the expensive requests run at once, overall
+        :param max_concurrency_per_client: the expensive requests run at once by
+            a single client
+        :param max_queue: the requests waiting for a slot, overall. Beyond, the
+            requests are answered 503
+        :param max_queue_per_client: the requests waiting for a slot, for a
+            single client. Beyond, the requests are answered 429
+        :param max_wait: the time a request may wait for a slot before being
+            answered 503, in seconds
+        :param bandwidth: the bytes per second sent and received, overall
+        :param bandwidth_per_client: the bytes per second sent and received by a
+            single client
+        :param weights: the share of each client (by key, 1 by default)
+        :param client_key: identifies the client of a request
+        :param large_transfer_size: the size from which GETs and PUTs are
+            expensive
+        """
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_client = max_concurrency_per_client
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.max_wait = max_wait
+        self.bandwidth_per_client = bandwidth_per_client
+        self.weights = weights
+        self.client_key = client_key
+        self.large_transfer_size = large_transfer_size
+        self.bucket = TokenBucket(bandwidth) if bandwidth else None
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self._clients: dict[str, _Client] = {}
+        # the tag of the last request admitted from a queue
+        self._virtual_time = 0.0
+        # moving average of the time a slot is held, for Retry-After
+        self._hold_time = 1.0
+
+    # --------------------------------------------------------------------------
+    def operation(self, scope: HTTPScope) -> str | None:
+        """
+        Get the name of the expensive operation a request is, None if it is not
+        one (the size of a GET is only known once the file is found)
+        """
+        method = scope["method"]
+        if method in ("COPY", "MOVE", "SEARCH"):
+            return method
+        headers = {name.lower(): value for name, value in scope["headers"]}
+        if method == "PROPFIND" and headers.get(b"depth", b"1") != b"0":
+            return method
+        if method in ("PUT", "PATCH"):
+            length = headers.get(b"content-length", b"")
+            if length.isdigit() and int(length) >= self.large_transfer_size:
+                return method
+        return None
+
+    def weight(self, key: str) -> float:
+        if self.weights is None:
+            return 1.0
+        if callable(self.weights):
+            return self.weights(key)
+        return self.weights.get(key, 1.0)
+
+    def _client(self, key: str) -> _Client:
+        client = self._clients.get(key)
+        if client is None:
+            if len(self._clients) >= MAX_IDLE_CLIENTS:
+                self._prune()
+            bucket = None
+            if self.bandwidth_per_client:
+                bucket = TokenBucket(self.bandwidth_per_client)
+            client = self._clients[key] = _Client(bucket)
+        return client
+
+    def _prune(self):
+        for key, client in list(self._clients.items()):
+            if not client.active and not client.waiters:
+                if client.bucket is None or client.bucket.full:
+                    del self._clients[key]
+
+    def retry_after(self) -> int:
+        """
+        An estimate of the time it takes for the queued requests to be run
+        """
+        rounds = (self.queued + 1) / max(1, self.max_concurrency)
+        return max(1, math.ceil(rounds * self._hold_time))
+
+    # --------------------------------------------------------------------------
+    async def acquire(self, scope: HTTPScope) -> Ticket:
+        """
+        Wait for a slot
+        :raises Overloaded: when the queues are full, or the request waited for
+            `max_wait` seconds
+        """
+        key = self.client_key(scope)
+        client = self._client(key)
+        if (
+            not self.queued
+            and self.active < self.max_concurrency
+            and client.active < self.max_concurrency_per_client
+        ):
+            self._grant(client)
+            return Ticket(key, 0.0)
+
+        if len(client.waiters) >= self.max_queue_per_client:
+            self.rejected += 1
+            raise Overloaded(429, self.retry_after())
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(503, self.retry_after())
+
+        start = time.monotonic()
+        tag = max(self._virtual_time, client.last_tag) + 1.0 / self.weight(key)
+        client.last_tag = tag
+        future = asyncio.get_running_loop().create_future()
+        entry = (tag, future)
+        client.waiters.append(entry)
+        self.queued += 1
+        self._admit_waiters()
+        try:
+            await asyncio.wait([future], timeout=self.max_wait)
+        except BaseException:
+            # cancelled, e.g. the client went away
+            if future.done():
+                self._free(client)
+            else:
+                self._dequeue(client, entry)
+            raise
+        if not future.done():
+            self._dequeue(client, entry)
+            self.rejected += 1
+            raise Overloaded(503, self.retry_after())
+        return Ticket(key, time.monotonic() - start)
+
+    def release(self, ticket: Ticket):
+        held = time.monotonic() - ticket.granted
+        self._hold_time = 0.9 * self._hold_time + 0.1 * held
+        self._free(self._clients[ticket.client])
+
+    def _free(self, client: _Client):
+        client.active -= 1
+        self.active -= 1
+        self._admit_waiters()
+
+    def _dequeue(self, client: _Client, entry: tuple[float, asyncio.Future]):
+        entry[1].cancel()
+        client.waiters.remove(entry)
+        self.queued -= 1
+
+    def _grant(self, client: _Client):
+        client.active += 1
+        self.active += 1
+
+    def _admit_waiters(self):
+        """
+        Give the free slots to the waiting requests with the lowest tags, among
+        the clients below their own limit
+        """
+        while self.queued and self.active < self.max_concurrency:
+            best = None
+            for client in self._clients.values():
+                if (
+                    client.waiters
+                    and client.active < self.max_concurrency_per_client
+                    and (best is None or client.waiters[0][0] < best.waiters[0][0])
+                ):
+                    best = client
+            if best is None:
+                return
+            tag, future = best.waiters.popleft()
+            self.queued -= 1
+            self._virtual_time = tag
+            self._grant(best)
+            future.set_result(None)
+
+    # --------------------------------------------------------------------------
+    async def throttle(self, scope: HTTPScope, nbytes: int):
+        """
+        Wait until `nbytes` more bytes may be transferred for a request
+        """
+        delay = 0.0
+        if self.bucket is not None:
+            delay = self.bucket.reserve(nbytes)
+        if self.bandwidth_per_client:
+            client = self._client(self.client_key(scope))
+            delay = max(delay, client.bucket.reserve(nbytes))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @property
+    def shapes_bandwidth(self) -> bool:
+        return self.bucket is not None or bool(self.bandwidth_per_client)
+
+
+__all__ = ["Scheduler", "Overloaded", "TokenBucket", "client_identity"]
@@ -0,0 +1,530 @@
+"""
+    A persistent index of the names, sizes, dates and content types of the
+    resources (SQLite, with a FTS5 trigram index of the names), kept current
+    from the events, and the translation of DASL basicsearch queries into SQL
+"""
+
+import asyncio
+import datetime
+import email.utils
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any
+from urllib.parse import unquote, urlparse
+from xml.etree.ElementTree import Element
+
+import fs.errors
+import fs.path
+from fs.info import Info
+
+from .backends import Backend, ResourceInfo
+from .events import (
+    Event,
+    FileDownloadedEvent,
+    FileCopiedEvent,
+    DirectoryCopiedEvent,
+    DirectoryMovedEvent,
+)
+from .utils import guess_contenttype
+
+DAV_NS = "{DAV:}"
+
+# DAV property -> column
+PROPERTIES = {
+    "displayname": "name",
+    "getcontentlength": "size",
+    "getlastmodified": "mtime",
+    "creationdate": "ctime",
+    "getcontenttype": "content_type",
+}
+
+_COMPARISONS = {"eq": "=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL,
+    ctime REAL,
+    content_type TEXT NOT NULL,
+    generation INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_parent ON resources (parent);
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5 (
+    name, content='resources', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS resources_ai AFTER INSERT ON resources BEGIN
+    INSERT INTO names (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS resources_ad AFTER DELETE ON resources BEGIN
+    INSERT INTO names (names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS resources_au AFTER UPDATE OF name ON resources BEGIN
+    INSERT INTO names (names, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO names (rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO resources
+    (path, parent, name, is_dir, size, mtime, ctime, content_type, generation)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (path) DO UPDATE SET
+    is_dir = excluded.is_dir,
+    size = excluded.size,
+    mtime = excluded.mtime,
+    ctime = excluded.ctime,
+    content_type = excluded.content_type,
+    generation = excluded.generation
+"""
+
+# (sql, parameters)
+query_t = tuple[str, list[Any]]
+
+
+# ------------------------------------------------------------------------------
+class SearchQuery:
+    """
+    A search : a SQL condition on the resources table, a scope, an order and a
+    maximum number of results
+    """
+
+    def __init__(
+        self,
+        where: query_t = ("1", []),
+        scope: str = "/",
+        depth: str = "infinity",
+        order_by: list[tuple[str, bool]] | None = None,
+        limit: int | None = None,
+    ):
+        """
+        :param order_by: (column, ascending) pairs
+        """
+        self.where = where
+        self.scope = scope
+        self.depth = depth
+        self.order_by = order_by or [("path", True)]
+        self.limit = limit
+
+    @classmethod
+    def name_contains(cls, term: str, scope: str = "/") -> "SearchQuery":
+        return cls(_contains(term), scope)
+
+
+# ------------------------------------------------------------------------------
+class SearchIndex:
+    """
+    An index of the resources of a backend, for the SEARCH requests.
+    Updated from the events, and rebuilt by walking the whole backend when it
+    is empty at startup, when some events were missed (inotify overflows), or
+    when rebuild() is called. The hidden resources are not indexed
+    """
+
+    def __init__(
+        self,
+        database: str = ":memory:",
+        max_results: int = 10000,
+        rebuild_on_start: bool = False,
+    ):
+        """
+        Create a new SearchIndex
+        :param database: the SQLite database file, in memory by default
+        :param max_results: the maximum number of results of a search
+        :param rebuild_on_start: rebuild a persistent index at startup too, to
+            catch the changes made while the application was not running
+        """
+        self.database = database
+        self.max_results = max_results
+        self.rebuild_on_start = rebuild_on_start
+        self.backend: Backend | None = None
+        self._db = sqlite3.connect(database, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._rebuild_task: asyncio.Task | None = None
+        # the copied trees being indexed
+        self._tasks: set[asyncio.Task] = set()
+        with self._lock:
+            if database != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            self._db.commit()
+            self._generation = self._db.execute(
+                "SELECT COALESCE(MAX(generation), 0) FROM resources"
+            ).fetchone()[0]
+
+    async def _execute(self, fn, *args) -> Any:
+        def locked():
+            with self._lock:
+                try:
+                    result = fn(*args)
+                    self._db.commit()
+                    return result
+                except BaseException:
+                    self._db.rollback()
+                    raise
+
+        return await asyncio.to_thread(locked)
+
+    # --------------------------------------------------------------------------
+    async def start(self, backend: Backend):
+        self.backend = backend
+        if self.rebuild_on_start or await self.count() == 0:
+            self.schedule_rebuild()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            try:
+                await self._rebuild_task
+            except asyncio.CancelledError:
+                pass
+            self._rebuild_task = None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def schedule_rebuild(self):
+        """
+        Rebuild the index in the background, unless it is being rebuilt
+        """
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._logged_rebuild())
+
+    async def _logged_rebuild(self):
+        try:
+            start = time.perf_counter()
+            count = await self.rebuild()
+            logging.info(
+                f"search index rebuilt : {count} resources in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+        except Exception:
+            logging.exception("rebuilding the search index")
+
+    async def rebuild(self) -> int:
+        """
+        Index the whole backend again, return the number of resources indexed.
+        The changes reported while rebuilding are kept
+        """
+        self._generation += 1
+        generation = self._generation
+        count = await self._index_tree("/", generation)
+        await self._execute(
+            lambda: self._db.execute(
+                "DELETE FROM resources WHERE generation < ?", (generation,)
+            )
+        )
+        return count
+
+    async def count(self) -> int:
+        return await self._execute(
+            lambda: self._db.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+        )
+
+    # --------------------------------------------------------------------------
+    async def on_event(self, evt: Event, *args, **kwargs):
+        """
+        Update the index after a change, subscribed to all the events
+        """
+        if self.backend is None or isinstance(evt, FileDownloadedEvent):
+            return
+        if isinstance(evt, DirectoryMovedEvent):
+            await self.move_tree(evt.path, evt.dest_path)
+            return
+        if isinstance(evt, DirectoryCopiedEvent):
+            # the copy has to be walked : not while the request waits
+            task = asyncio.create_task(self._logged_refresh(evt.dest_path))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return
+        if not isinstance(evt, FileCopiedEvent):
+            await self.refresh(evt.path)
+        if dest_path := getattr(evt, "dest_path", None):
+            await self.refresh(dest_path)
+
+    async def refresh(self, path: str):
+        """
+        Index a resource (and what it contains) again, or remove it from the
+        index if it does not exist anymore
+        """
+        path = fs.path.abspath(fs.path.normpath(path))
+        if _is_hidden(path):
+            return
+        info = await self.backend.getinfo(path)
+        if info is None:
+            await self._remove_tree(path)
+        elif info.is_dir:
+            await self._remove_tree(path)
+            if path != "/":
+                await self._index([(path, info)], self._generation)
+            await self._index_tree(path, self._generation)
+        else:
+            await self._index([(path, info)], self._generation)
+
+    async def _logged_refresh(self, path: str):
+        try:
+            await self.refresh(path)
+        except Exception:
+            logging.exception(f"indexing {path}")
+
+    async def move_tree(self, src: str, dst: str):
+        """
+        Update the index after a directory was moved : the paths below it are
+        rewritten, it is not walked again
+        """
+        src = fs.path.abspath(fs.path.normpath(src))
+        dst = fs.path.abspath(fs.path.normpath(dst))
+        if _is_hidden(src) or _is_hidden(dst):
+            # not indexed before, or not after
+            await self._remove_tree(src)
+            await self.refresh(dst)
+            return
+
+        def move():
+            self._db.execute(
+                "DELETE FROM resources WHERE path = ? OR (path > ? AND path < ?)",
+                (dst, dst + "/", dst + "0"),
+            )
+            # the characters after `src`, e.g. '/child' (substr() counts from 1)
+            start = len(src) + 1
+            self._db.execute(
+                "UPDATE resources SET path = ? || substr(path, ?),"
+                " parent = ? || substr(parent, ?) WHERE path > ? AND path < ?",
+                (dst, start, dst, start, src + "/", src + "0"),
+            )
+            self._db.execute("DELETE FROM resources WHERE path = ?", (src,))
+
+        await self._execute(move)
+        if (info := await self.backend.getinfo(dst)) is not None:
+            await self._index([(dst, info)], self._generation)
+
+    async def _index_tree(self, root: str, generation: int) -> int:
+        count = 0
+        directories = [root]
+        while directories:
+            path = directories.pop()
+            try:
+                infos = await self.backend.scandir(path)
+            except (fs.errors.ResourceNotFound, fs.errors.DirectoryExpected):
+                continue
+            batch = []
+            for info in infos:
+                if info.name[0] == ".":
+                    continue
+                child = fs.path.join(path, info.name)
+                batch.append((child, info))
+                if info.is_dir:
+                    directories.append(child)
+            await self._index(batch, generation)
+            count += len(batch)
+        return count
+
+    async def _index(
+        self, entries: list[tuple[str, Info | ResourceInfo]], generation: int
+    ):
+        rows = []
+        for path, info in entries:
+            mtime, ctime = _timestamps(info)
+            rows.append(
+                (
+                    path,
+                    fs.path.dirname(path),
+                    info.name,
+                    int(info.is_dir),
+                    info.size if not info.is_dir else 0,
+                    mtime,
+                    ctime,
+                    (
+                        "httpd/unix-directory"
+                        if info.is_dir
+                        else guess_contenttype(info.name)
+                    ),
+                    generation,
+                )
+            )
+        if rows:
+            await self._execute(self._db.executemany, _UPSERT, rows)
+
+    async def _remove_tree(self, path: str):
+        if path == "/":
+            sql, params = "DELETE FROM resources", []
+        else:
+            sql, params = (
+                "DELETE FROM resources WHERE path = ? OR (path > ? AND path < ?)",
+                [path, path + "/", path + "0"],
+            )
+        await self._execute(self._db.execute, sql, params)
+
+    # --------------------------------------------------------------------------
+    async def search(self, query: SearchQuery) -> list[tuple[str, ResourceInfo]]:
+        """
+        Run a search, return the (path, info) of the resources found
+        """
+        where, params = query.where
+        conditions, params = [f"({where})"], list(params)
+        scope = fs.path.abspath(fs.path.normpath(query.scope))
+        if query.depth == "0":
+            conditions.append("path = ?")
+            params.append(scope)
+        elif query.depth == "1":
+            conditions.append("parent = ?")
+            params.append(scope)
+        elif scope != "/":
+            conditions.append("(path = ? OR (path > ? AND path < ?))")
+            params += [scope, scope + "/", scope + "0"]
+        order = ", ".join(
+            f"{column} {'ASC' if ascending else 'DESC'}"
+            for column, ascending in query.order_by
+        )
+        limit = max(1, min(query.limit or self.max_results, self.max_results))
+        sql = (
+            "SELECT path, name, is_dir, size, mtime, ctime FROM resources"
+            f" WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT {int(limit)}"
+        )
+        rows = await self._execute(lambda: self._db.execute(sql, params).fetchall())
+        return [
+            (path, ResourceInfo(name, bool(is_dir), size, mtime, ctime))
+            for path, name, is_dir, size, mtime, ctime in rows
+        ]
+
+
+# ------------------------------------------------------------------------------
+def parse_basicsearch(document: Element, root_path: str = "") -> SearchQuery:
+    """
+    Translate a DASL searchrequest document (RFC 5323) into a SearchQuery.
+    Supports and / or / not, eq / lt / lte / gt / gte, like, contains (on the
+    names), is-collection and is-defined, the scope and depth, the order and the
+    limit
+    :raises ValueError: for the queries that cannot be translated
+    """
+    basicsearch = document.find(f"{DAV_NS}basicsearch")
+    if document.tag != f"{DAV_NS}searchrequest" or basicsearch is None:
+        raise ValueError("a DAV:basicsearch request is expected")
+
+    query = SearchQuery()
+    scope = basicsearch.find(f"{DAV_NS}from/{DAV_NS}scope")
+    if scope is not None:
+        href = scope.findtext(f"{DAV_NS}href", "/").strip()
+        href = fs.path.abspath(unquote(urlparse(href).path))
+        if root_path and href.startswith(root_path):
+            href = href[len(root_path) :] or "/"
+        query.scope = href
+        query.depth = scope.findtext(f"{DAV_NS}depth", "infinity").strip().lower()
+        if query.depth not in ("0", "1", "infinity"):
+            raise ValueError(f"invalid depth {query.depth}")
+
+    where = basicsearch.find(f"{DAV_NS}where")
+    if where is not None and len(where):
+        query.where = _condition(where[0])
+
+    orderby = basicsearch.find(f"{DAV_NS}orderby")
+    if orderby is not None:
+        query.order_by = [
+            (
+                _column(order),
+                order.find(f"{DAV_NS}descending") is None,
+            )
+            for order in orderby.findall(f"{DAV_NS}order")
+        ] or query.order_by
+
+    nresults = basicsearch.findtext(f"{DAV_NS}limit/{DAV_NS}nresults")
+    if nresults:
+        query.limit = int(nresults)
+        if query.limit < 1:
+            raise ValueError(f"invalid number of results {nresults}")
+    return query
+
+
+def _condition(element: Element) -> query_t:
+    operator = element.tag.removeprefix(DAV_NS)
+    if operator in ("and", "or"):
+        parts = [_condition(child) for child in element]
+        if not parts:
+            raise ValueError(f"empty {operator}")
+        return (
+            f" {operator.upper()} ".join(f"({sql})" for sql, _ in parts),
+            [param for _, params in parts for param in params],
+        )
+    if operator == "not":
+        if len(element) != 1:
+            raise ValueError("not takes a single operand")
+        sql, params = _condition(element[0])
+        return f"NOT ({sql})", params
+    if operator == "is-collection":
+        return "is_dir = 1", []
+    if operator == "is-defined":
+        return f"{_column(element)} IS NOT NULL", []
+    if operator in _COMPARISONS:
+        column = _column(element)
+        return f"{column} {_COMPARISONS[operator]} ?", [
+            _literal(column, element.findtext(f"{DAV_NS}literal", ""))
+        ]
+    if operator == "like":
+        # the DASL wildcards are the SQL ones
+        column = _column(element)
+        return f"{column} LIKE ? ESCAPE '\\'", [
+            element.findtext(f"{DAV_NS}literal", "")
+        ]
+    if operator == "contains":
+        return _contains(element.text or "")
+    raise ValueError(f"unsupported operator {operator}")
+
+
+def _contains(term: str) -> query_t:
+    term = term.strip()
+    if len(term) >= 3:
+        # the trigram index finds any substring of at least 3 characters
+        escaped = term.replace('"', '""')
+        return (
+            "id IN (SELECT rowid FROM names WHERE names MATCH ?)",
+            [f'"{escaped}"'],
+        )
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "name LIKE ? ESCAPE '\\'", [f"%{escaped}%"]
+
+
+def _column(element: Element) -> str:
+    prop = element.find(f"{DAV_NS}prop")
+    if prop is None or not len(prop):
+        raise ValueError(f"{element.tag} has no property")
+    name = prop[0].tag.removeprefix(DAV_NS)
+    if name not in PROPERTIES:
+        raise ValueError(f"unsupported property {prop[0].tag}")
+    return PROPERTIES[name]
+
+
+def _literal(column: str, value: str) -> Any:
+    value = value.strip()
+    if column == "size":
+        return int(value)
+    if column in ("mtime", "ctime"):
+        try:
+            return email.utils.parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return datetime.datetime.fromisoformat(
+                value.replace("Z", "+00:00")
+            ).timestamp()
+    return value
+
+
+def _timestamps(info: Info | ResourceInfo) -> tuple[float | None, float | None]:
+    if isinstance(info, ResourceInfo):
+        return info.mtime, info.ctime
+    return info.get("details", "modified"), info.get("details", "created")
+
+
+def _is_hidden(path: str) -> bool:
+    return any(part[0] == "." for part in fs.path.iteratepath(path))
+
+
+__all__ = ["SearchIndex", "SearchQuery", "parse_basicsearch"]
@@ -0,0 +1,109 @@
+"""
+    Single-flight coalescing of concurrent identical operations, and locks
+    serializing the writes to a path
+"""
+
+import asyncio
+import contextlib
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+# ------------------------------------------------------------------------------
+class SingleFlight:
+    """
+    Coalesces concurrent calls of the same operation on the same path : the
+    first caller runs the operation, the callers that arrive while it is in
+    flight wait for it and share its result (or its exception).
+    Results are shared as-is, so callers must not mutate them.
+    """
+
+    def __init__(self):
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        # number of calls, and number of calls that were served by another
+        # in-flight call, per operation name
+        self.calls: Counter[str] = Counter()
+        self.collapsed: Counter[str] = Counter()
+
+    async def do(self, op: str, path: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `fn`, unless the same operation is already in flight for `path`
+        :param op: the name of the operation, e.g. "getinfo"
+        :param path: the path the operation applies to
+        :param fn: a coroutine function performing the operation
+        """
+        key = (op, path)
+        self.calls[op] += 1
+        while (future := self._inflight.get(key)) is not None:
+            self.collapsed[op] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # either we were cancelled, or the caller running the
+                # operation was : in the latter case, try again
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # the exception is raised to the caller, do not let asyncio warn
+            # about it never being retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """
+        Get the number of calls and collapsed calls per operation
+        """
+        return {
+            op: {"calls": self.calls[op], "collapsed": self.collapsed[op]}
+            for op in self.calls
+        }
+
+
+# ------------------------------------------------------------------------------
+class PathLocks:
+    """
+    One lock per path, so that checking a precondition (e.g. If-Match) and
+    writing happen at once. A lock only exists while it is held or waited for
+    """
+
+    def __init__(self):
+        # path -> (lock, number of holders and waiters)
+        self._locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+    @contextlib.asynccontextmanager
+    async def hold(self, path: str) -> AsyncIterator[None]:
+        lock, users = self._locks.get(path, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[path] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[path]
+            if users == 1:
+                del self._locks[path]
+            else:
+                self._locks[path] = (lock, users - 1)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+__all__ = ["SingleFlight", "PathLocks"]
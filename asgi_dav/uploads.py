@@ -0,0 +1,166 @@
+"""
+    Resumable, chunked uploads of large files, in the style of the Nextcloud
+    chunking v2 protocol : the parts of a file are uploaded (possibly in
+    parallel) to a staging collection, then assembled with a final MOVE
+"""
+
+import asyncio
+import logging
+import time
+
+import fs.errors
+import fs.path
+from fs.info import Info
+
+from .backends import Backend, ResourceInfo
+
+
+# ------------------------------------------------------------------------------
+class ChunkedUploads:
+    """
+    The staging area of the chunked uploads. With the default prefix :
+
+    MKCOL    /.uploads/<id>          start an upload (<id> is chosen by the client)
+    PUT      /.uploads/<id>/<n>      upload the part number n (1, 2, 3...)
+    PROPFIND /.uploads/<id>          list the parts received so far, to resume
+    MOVE     /.uploads/<id>/.file    assemble the parts at the Destination. An
+                                     optional OC-Total-Length header is checked
+    DELETE   /.uploads/<id>          abort the upload
+
+    No event is emitted for the staging area, only a 'file.uploaded' for the
+    assembled file. The uploads left untouched for `ttl` seconds are removed
+    """
+
+    # the name MOVEd to trigger the assembly
+    ASSEMBLY_NAME = ".file"
+
+    def __init__(
+        self,
+        prefix: str = "/.uploads",
+        ttl: float = 24 * 3600,
+        sweep_interval: float | None = None,
+    ):
+        """
+        Create a new ChunkedUploads
+        :param prefix: the staging collection. Hidden from the listings when its
+            name starts with a dot
+        :param ttl: the time after which an inactive upload is removed, in seconds
+        :param sweep_interval: the time between two removals of the expired
+            uploads, in seconds (ttl / 4, within 1s and 1 hour, by default)
+        """
+        self.prefix = fs.path.normpath(fs.path.abspath(prefix)).rstrip("/")
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval or max(1.0, min(ttl / 4, 3600))
+        self._task: asyncio.Task | None = None
+
+    def is_staging(self, path: str) -> bool:
+        return path == self.prefix or path.startswith(self.prefix + "/")
+
+    def assembly_upload(self, path: str) -> str | None:
+        """
+        Get the upload collection a MOVE of `path` assembles, if any
+        """
+        upload, name = fs.path.split(path.rstrip("/"))
+        if name == self.ASSEMBLY_NAME and fs.path.dirname(upload) == self.prefix:
+            return upload
+        return None
+
+    # --------------------------------------------------------------------------
+    async def parts(self, backend: Backend, upload: str) -> list[Info | ResourceInfo]:
+        """
+        Get the parts received for an upload, in order
+        """
+        parts = [
+            info
+            for info in await backend.scandir(upload)
+            if info.name.isdigit() and not info.is_dir
+        ]
+        parts.sort(key=lambda info: int(info.name))
+        return parts
+
+    async def assemble(
+        self,
+        backend: Backend,
+        upload: str,
+        dst: str,
+        total_length: int | None = None,
+        overwrite: bool = True,
+    ):
+        """
+        Assemble the parts of an upload into `dst`, then remove the upload.
+        A single part is moved, several parts are concatenated in the staging
+        area first, so that `dst` is replaced at once
+        :raises ValueError: when there is no part, the parts are not numbered
+            1..n, or they do not add up to `total_length`
+        :raises fs.errors.DestinationExists: if dst exists and not `overwrite`
+        """
+        parts = await self.parts(backend, upload)
+        if not parts:
+            raise ValueError(f"no part uploaded in {upload}")
+        numbers = [int(info.name) for info in parts]
+        if numbers != list(range(1, len(parts) + 1)):
+            raise ValueError(f"the parts of {upload} are not numbered 1..n: {numbers}")
+        size = sum(info.size for info in parts)
+        if total_length is not None and size != total_length:
+            raise ValueError(f"expected {total_length} bytes, got {size}")
+        if not overwrite and await backend.getinfo(dst) is not None:
+            raise fs.errors.DestinationExists(dst)
+
+        paths = [fs.path.join(upload, info.name) for info in parts]
+        if len(paths) == 1:
+            assembled = paths[0]
+        else:
+            assembled = fs.path.join(upload, self.ASSEMBLY_NAME)
+            await backend.concat(paths, assembled)
+        await backend.move(assembled, dst, overwrite=True)
+        await backend.removetree(upload)
+
+    async def sweep(self, backend: Backend) -> int:
+        """
+        Remove the expired uploads, return how many were removed
+        """
+        try:
+            uploads = await backend.scandir(self.prefix)
+        except fs.errors.ResourceNotFound:
+            return 0
+        now = time.time()
+        removed = 0
+        for info in uploads:
+            if not info.is_dir:
+                continue
+            upload = fs.path.join(self.prefix, info.name)
+            try:
+                parts = await backend.scandir(upload)
+                times = [i.modified.timestamp() for i in [info, *parts] if i.modified]
+                if now - max(times, default=now) > self.ttl:
+                    await backend.removetree(upload)
+                    removed += 1
+            except fs.errors.ResourceNotFound:
+                # assembled or aborted in the meantime
+                continue
+        return removed
+
+    # --------------------------------------------------------------------------
+    async def start(self, backend: Backend):
+        self._task = asyncio.create_task(self._sweep_loop(backend))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sweep_loop(self, backend: Backend):
+        while True:
+            try:
+                if removed := await self.sweep(backend):
+                    logging.info(f"removed {removed} expired uploads")
+            except Exception:
+                logging.exception("sweeping the expired uploads")
+            await asyncio.sleep(self.sweep_interval)
+
+
+__all__ = ["ChunkedUploads"]
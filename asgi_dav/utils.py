@@ -1,6 +1,7 @@
 from urllib.parse import quote
 from pathlib import Path
 from base64 import b64encode
+from functools import lru_cache
 import datetime
 import mimetypes
 import re
@@ -16,6 +17,19 @@ def concat_uri(*parts: str) -> str:
     return f"/{'/'.join(filtered_parts)}"
 
 
+# ------------------------------------------------------------------------------
+def content_disposition(filename: str) -> str:
+    """
+    Build the Content-Disposition of a download (RFC 6266) : an ASCII fallback
+    for the old clients, and the UTF-8 name
+    """
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", filename)
+    return (
+        f'attachment; filename="{fallback}"; '
+        f"filename*=UTF-8''{quote(filename, safe='')}"
+    )
+
+
 # ------------------------------------------------------------------------------
 def to_rfc_1123(dt: datetime.datetime) -> str:
     """
@@ -30,12 +44,54 @@ def to_iso_8601(dt: datetime.datetime) -> str:
     return (dt or datetime.datetime.min).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
+# ------------------------------------------------------------------------------
+def _from_timestamp(timestamp: int | None) -> datetime.datetime:
+    if timestamp is None:
+        return datetime.datetime.min
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+# The formatted timestamps are cached, as many files of a listing usually share
+# the same modification times. Timestamps are truncated to the second, as
+# the formats are.
+@lru_cache(maxsize=8192)
+def _timestamp_to_rfc_1123(timestamp: int | None) -> str:
+    return to_rfc_1123(_from_timestamp(timestamp))
+
+
+@lru_cache(maxsize=8192)
+def _timestamp_to_iso_8601(timestamp: int | None) -> str:
+    return to_iso_8601(_from_timestamp(timestamp))
+
+
+def timestamp_to_rfc_1123(timestamp: float | None) -> str:
+    """
+    Convert an epoch timestamp to a string in RFC 1123 format
+    """
+    return _timestamp_to_rfc_1123(None if timestamp is None else int(timestamp))
+
+
+def timestamp_to_iso_8601(timestamp: float | None) -> str:
+    """
+    Convert an epoch timestamp to a string in ISO 8601 format
+    """
+    return _timestamp_to_iso_8601(None if timestamp is None else int(timestamp))
+
+
 # ------------------------------------------------------------------------------
 def guess_contenttype(filename: str, include_charset: bool = True) -> str:
     """
     Guess the content type of a file based on its extension
     """
-    mimetype, encoding = mimetypes.guess_type(filename)
+    # only the (double) extension matters, e.g. '.tar.gz' : memoize on it
+    parts = filename.rsplit(".", 2)
+    extension = "." + ".".join(parts[1:]) if len(parts) > 1 else ""
+    return _guess_contenttype(extension, include_charset)
+
+
+@lru_cache(maxsize=1024)
+def _guess_contenttype(extension: str, include_charset: bool) -> str:
+    mimetype, encoding = mimetypes.guess_type("x" + extension)
     if mimetype:
         contenttype = mimetype
         if encoding and include_charset:
@@ -45,6 +101,8 @@ def guess_contenttype(filename: str, include_charset: bool = True) -> str:
     return contenttype
 
 
+# The icons are encoded once, for every listing of every mount
+@lru_cache(maxsize=None)
 def make_data_url(filename: str) -> str:
     """
     Create a data URL for a file in the templates directory. Used for embedding images in html
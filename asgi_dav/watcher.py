@@ -0,0 +1,319 @@
+"""
+    Linux inotify watcher that reports the changes made to a local directory
+    tree by other programs (rsync, cron jobs, NFS peers, ...) as Event objects
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import sys
+import time
+from typing import Awaitable, Callable
+
+from .events import (
+    Event,
+    eventname_t,
+    FileUploadedEvent,
+    FileDeletedEvent,
+    FileMovedEvent,
+    DirectoryCreatedEvent,
+    DirectoryDeletedEvent,
+    DirectoryMovedEvent,
+)
+
+# ------------------------------------------------------------------------------
+# inotify constants, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# ------------------------------------------------------------------------------
+watcher_callback_t = Callable[[eventname_t, Event], Awaitable[None]]
+
+
+# ------------------------------------------------------------------------------
+def inotify_available() -> bool:
+    """
+    Tell if the inotify API can be used on this platform
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    libname = ctypes.util.find_library("c")
+    if not libname:
+        return False
+    return hasattr(ctypes.CDLL(libname), "inotify_init1")
+
+
+# ------------------------------------------------------------------------------
+class InotifyWatcher:
+    """
+    Watches a directory tree and turns the inotify events into the Event
+    dataclasses emitted by DAVApp.
+    Bursts of events are coalesced : they are buffered for `coalesce_delay`
+    seconds, duplicates are dropped, and MOVED_FROM/MOVED_TO pairs are merged
+    into a single move event.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        callback: watcher_callback_t,
+        coalesce_delay: float = 0.2,
+        suppress_window: float = 1.0,
+        overflow_callback: Callable[[], None] | None = None,
+    ):
+        """
+        Create a new watcher
+        :param root: the local directory to watch (recursively)
+        :param callback: coroutine called with (event name, event) for each change
+        :param coalesce_delay: how long events are buffered before being reported
+        :param suppress_window: how long an event stays ignored after `suppress()`
+        :param overflow_callback: called when some changes may not be reported :
+            the kernel dropped events, or a directory could not be watched
+        """
+        self.root = os.path.abspath(root)
+        self.callback = callback
+        self.coalesce_delay = coalesce_delay
+        self.suppress_window = suppress_window
+        self.overflow_callback = overflow_callback
+        self._libc: ctypes.CDLL | None = None
+        self._fd = -1
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wd_to_path: dict[int, str] = {}
+        self._pending: dict[tuple, tuple[eventname_t, Event]] = {}
+        self._moved_from: dict[int, tuple[str, bool]] = {}
+        # (event name, path, dest_path) -> deadline
+        self._suppressed: dict[tuple, float] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        # the new directories being walked, in the executor
+        self._walks: set[asyncio.Future] = set()
+
+    # --------------------------------------------------------------------------
+    async def start(self):
+        """
+        Start watching. Must be called from within the running event loop
+        """
+        if not inotify_available():
+            raise OSError("inotify is not available on this platform")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._loop = asyncio.get_running_loop()
+        # walking a large tree takes a while : the kernel queues the events
+        # meanwhile, they are read once it is over
+        await self._loop.run_in_executor(None, self._add_tree, "/")
+        self._loop.add_reader(self._fd, self._read_events)
+
+    async def stop(self):
+        """
+        Stop watching, reporting the events that are still buffered
+        """
+        if self._fd < 0:
+            return
+        self._loop.remove_reader(self._fd)
+        if self._walks:
+            await asyncio.gather(*self._walks, return_exceptions=True)
+        os.close(self._fd)
+        self._fd = -1
+        self._wd_to_path.clear()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def suppress(self, name: eventname_t, path: str, dest_path: str | None = None):
+        """
+        Ignore the `name` events of `path` (moved to `dest_path`) for a short
+        while. Used by DAVApp so that its own mutations are not reported twice :
+        the other changes, even below `path`, are still reported
+        """
+        self._suppressed[(name, path, dest_path)] = (
+            time.monotonic() + self.suppress_window
+        )
+
+    # --------------------------------------------------------------------------
+    def _syspath(self, path: str) -> str:
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def _add_watch(self, path: str) -> bool:
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(self._syspath(path)), WATCH_MASK
+        )
+        if wd < 0:
+            error = ctypes.get_errno()
+            # unless the directory was removed in the meantime, its changes will
+            # not be seen (e.g. ENOSPC : fs.inotify.max_user_watches is reached)
+            if error not in (errno.ENOENT, errno.ENOTDIR):
+                logging.warning(
+                    f"cannot watch {self._syspath(path)}: {os.strerror(error)}"
+                )
+                if self.overflow_callback is not None:
+                    # may be called from the thread walking the tree at startup
+                    self._loop.call_soon_threadsafe(self.overflow_callback)
+            return False
+        self._wd_to_path[wd] = path
+        return True
+
+    def _add_tree(self, path: str):
+        """
+        Watch a directory and all of its subdirectories
+        """
+        if not self._add_watch(path):
+            return
+        try:
+            entries = list(os.scandir(self._syspath(path)))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                self._add_tree(_join(path, entry.name))
+
+    def _walk_tree(self, path: str):
+        """
+        Watch a new directory tree, walked in the executor as it may be large
+        """
+        walk = self._loop.run_in_executor(None, self._add_tree, path)
+        self._walks.add(walk)
+        walk.add_done_callback(self._walks.discard)
+
+    def _rename_tree(self, src: str, dst: str):
+        """
+        Update the watched paths after a directory has been moved inside the tree
+        """
+        # the executor may be adding watches meanwhile
+        for wd, path in list(self._wd_to_path.items()):
+            if path == src or path.startswith(src + "/"):
+                self._wd_to_path[wd] = dst + path[len(src) :]
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            self._handle_event(wd, mask, cookie, name)
+        if (self._pending or self._moved_from) and self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(
+                self.coalesce_delay, self._schedule_flush
+            )
+
+    def _handle_event(self, wd: int, mask: int, cookie: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            logging.warning("inotify queue overflow, some changes were not reported")
+            if self.overflow_callback is not None:
+                self.overflow_callback()
+            return
+        if mask & IN_IGNORED:
+            self._wd_to_path.pop(wd, None)
+            return
+        parent = self._wd_to_path.get(wd)
+        if parent is None or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            return
+        path = _join(parent, name)
+        is_dir = bool(mask & IN_ISDIR)
+
+        if mask & IN_CREATE and is_dir:
+            self._walk_tree(path)
+            self._queue("directory.created", DirectoryCreatedEvent(path=path))
+        elif mask & IN_CLOSE_WRITE:
+            self._queue("file.uploaded", FileUploadedEvent(path=path))
+        elif mask & IN_DELETE:
+            if is_dir:
+                self._queue("directory.deleted", DirectoryDeletedEvent(path=path))
+            else:
+                self._queue("file.deleted", FileDeletedEvent(path=path))
+        elif mask & IN_MOVED_FROM:
+            self._moved_from[cookie] = (path, is_dir)
+        elif mask & IN_MOVED_TO:
+            source = self._moved_from.pop(cookie, None)
+            if source is None:
+                # moved in from outside of the watched tree
+                if is_dir:
+                    self._walk_tree(path)
+                    self._queue("directory.created", DirectoryCreatedEvent(path=path))
+                else:
+                    self._queue("file.uploaded", FileUploadedEvent(path=path))
+            elif is_dir:
+                self._rename_tree(source[0], path)
+                self._queue(
+                    "directory.moved",
+                    DirectoryMovedEvent(path=source[0], dest_path=path),
+                )
+            else:
+                self._queue(
+                    "file.moved", FileMovedEvent(path=source[0], dest_path=path)
+                )
+
+    def _queue(self, name: eventname_t, evt: Event):
+        key = (name, evt.path, getattr(evt, "dest_path", None))
+        if key not in self._pending:
+            self._pending[key] = (name, evt)
+
+    def _schedule_flush(self):
+        self._flush_handle = None
+        task = self._loop.create_task(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        # the moves whose MOVED_TO never came went out of the watched tree
+        for path, is_dir in self._moved_from.values():
+            if is_dir:
+                self._queue("directory.deleted", DirectoryDeletedEvent(path=path))
+            else:
+                self._queue("file.deleted", FileDeletedEvent(path=path))
+        self._moved_from.clear()
+
+        pending, self._pending = list(self._pending.values()), {}
+        now = time.monotonic()
+        self._suppressed = {p: t for p, t in self._suppressed.items() if t > now}
+        for name, evt in pending:
+            if (name, evt.path, getattr(evt, "dest_path", None)) in self._suppressed:
+                continue
+            try:
+                await self.callback(name, evt)
+            except Exception:
+                logging.exception(name)
+
+
+# ------------------------------------------------------------------------------
+def _join(parent: str, name: str) -> str:
+    return f"{parent.rstrip('/')}/{name}"
+
+
+__all__ = ["InotifyWatcher", "inotify_available"]
@@ -0,0 +1,219 @@
+"""
+    Benchmark suite for DAVApp.
+
+    Every scenario runs in its own process (so that its peak RSS can be measured)
+    against a freshly populated filesystem, either straight at the ASGI level or
+    over HTTP through uvicorn (tests/server).
+
+    python -m benchmarks                                 # everything, ASGI level
+    python -m benchmarks --backends memory --scenarios 'get_*,put_*'
+    python -m benchmarks --sizes 10,1000 --output baseline.json
+    python -m benchmarks --sizes 10,1000 --compare baseline.json
+    python -m benchmarks --driver uvicorn --backends osfs
+    python -m benchmarks --backends memory --latency 0.01    # 10ms per FS call
+"""
+
+import asyncio
+import datetime
+import fnmatch
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser, SUPPRESS
+
+from fs.memoryfs import MemoryFS
+from fs.osfs import OSFS
+
+from asgi_dav import DAVApp, OSBackend
+from asgi_dav.latency import LatencyFS
+from .harness import AsgiDriver, UvicornDriver, REPO_ROOT, measure, peak_rss_kb
+from .scenarios import TREE_SIZES, all_scenarios, populate
+
+BACKENDS = ("memory", "osfs", "osbackend")
+
+
+# ------------------------------------------------------------------------------
+async def run_worker(
+    backend: str,
+    driver_name: str,
+    scenario_name: str,
+    sizes: tuple[int, ...],
+    latency: float = 0.0,
+) -> dict:
+    """
+    Run a single scenario, in the current process
+    """
+    scenario = next(s for s in all_scenarios(sizes) if s.name == scenario_name)
+    with tempfile.TemporaryDirectory() as root:
+        if driver_name == "uvicorn":
+            # the server builds the backend, from what is in the directory
+            populate(OSFS(root), scenario.needs)
+            driver = UvicornDriver(root, backend, latency)
+        else:
+            if backend == "memory":
+                fs = MemoryFS()
+                populate(fs, scenario.needs)
+            else:
+                fs = OSFS(root)
+                populate(fs, scenario.needs)
+            if latency and backend != "osbackend":
+                fs = LatencyFS(fs, latency=latency, jitter=latency / 5, seed=0)
+            driver = AsgiDriver(
+                DAVApp(OSBackend(root) if backend == "osbackend" else fs)
+            )
+
+        rss_before = peak_rss_kb()
+        await driver.start()
+        try:
+
+            async def once():
+                method, path, headers, body = scenario.next_request()
+                return await driver.request(method, path, headers, body)
+
+            result = await measure(once)
+        finally:
+            await driver.stop()
+        # over HTTP, what matters is the memory used by the server
+        result["peak_rss_kb"] = getattr(driver, "server_peak_rss_kb", None) or (
+            peak_rss_kb()
+        )
+        result["setup_rss_kb"] = rss_before
+        unexpected = {s: n for s, n in result["statuses"].items() if s[0] != "2"}
+        if unexpected:
+            result["error"] = f"unexpected statuses {unexpected}"
+        return result
+
+
+def run_in_subprocess(
+    backend: str, driver: str, scenario: str, sizes: tuple[int, ...], latency: float
+) -> dict:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks",
+            "--worker",
+            backend,
+            driver,
+            scenario,
+            ",".join(map(str, sizes)),
+            str(latency),
+        ],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if output.returncode != 0:
+        return {"error": output.stderr.strip().splitlines()[-1:]}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+# ------------------------------------------------------------------------------
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """
+    Print the p50 latency changes against a baseline, return True when no
+    scenario got slower than `threshold` (e.g. 0.1 for 10%)
+    """
+    ok = True
+    print(f"\n{'scenario':<40} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, result in results.items():
+        before = baseline.get("results", {}).get(key)
+        if not before or "p50_ms" not in before or "p50_ms" not in result:
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0
+        flag = ""
+        if change > threshold:
+            flag, ok = "  REGRESSION", False
+        print(
+            f"{key:<40} {before['p50_ms']:>8.2f}ms {result['p50_ms']:>8.2f}ms"
+            f" {change * 100:>+7.1f}%{flag}"
+        )
+    return ok
+
+
+def main():
+    parser = ArgumentParser(description="DAVApp benchmarks")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--driver", default="asgi", choices=("asgi", "uvicorn"))
+    parser.add_argument("--scenarios", default="*", help="comma separated globs")
+    parser.add_argument("--sizes", default=",".join(map(str, TREE_SIZES)))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON file saved with --output")
+    parser.add_argument("--threshold", default=0.1, type=float)
+    parser.add_argument(
+        "--latency",
+        default=0.0,
+        type=float,
+        help="seconds added to each filesystem call (not osbackend)",
+    )
+    parser.add_argument("--worker", nargs=5, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        backend, driver, scenario, sizes, latency = args.worker
+        sizes = tuple(int(s) for s in sizes.split(","))
+        result = asyncio.run(
+            run_worker(backend, driver, scenario, sizes, float(latency))
+        )
+        print(json.dumps(result))
+        return
+
+    sizes = tuple(int(s) for s in args.sizes.split(","))
+    patterns = args.scenarios.split(",")
+    results = {}
+    for backend in args.backends.split(","):
+        for scenario in all_scenarios(sizes):
+            if not any(fnmatch.fnmatch(scenario.name, p) for p in patterns):
+                continue
+            key = f"{args.driver}/{backend}/{scenario.name}"
+            result = run_in_subprocess(
+                backend, args.driver, scenario.name, sizes, args.latency
+            )
+            results[key] = result
+            if "error" in result:
+                print(f"{key:<40} ERROR {result['error']}")
+            else:
+                print(
+                    f"{key:<40} {result['throughput_rps']:>9.1f} req/s"
+                    f"  p50 {result['p50_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms"
+                    f"  rss {result['peak_rss_kb'] // 1024:>5} MiB"
+                    f"  {result['statuses']}"
+                )
+
+    document = {
+        "meta": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "commit": _git_commit(),
+            "latency": args.latency,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+    if any("error" in result for result in results.values()):
+        sys.exit(1)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    main()
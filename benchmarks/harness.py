@@ -0,0 +1,221 @@
+"""
+    Drivers and measurement helpers shared by the benchmarks
+"""
+
+import asyncio
+import http.client
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# (status, size of the response body)
+response_t = tuple[int, int]
+
+
+# ------------------------------------------------------------------------------
+class AsgiDriver:
+    """
+    Sends requests straight to an ASGI application, without any server
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def start(self):
+        # run the lifespan startup, as a server would
+        self._lifespan_queue: asyncio.Queue = asyncio.Queue()
+        self._lifespan_done: asyncio.Queue = asyncio.Queue()
+        self._lifespan = asyncio.create_task(
+            self.app(
+                {"type": "lifespan"},
+                self._lifespan_queue.get,
+                self._lifespan_done.put,
+            )
+        )
+        await self._lifespan_queue.put({"type": "lifespan.startup"})
+        await self._lifespan_done.get()
+
+    async def stop(self):
+        await self._lifespan_queue.put({"type": "lifespan.shutdown"})
+        await self._lifespan_done.get()
+        await self._lifespan
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: dict[str, str] | None = None,
+        body: bytes = b"",
+    ) -> response_t:
+        raw_headers = [
+            (k.lower().encode(), v.encode()) for k, v in (headers or {}).items()
+        ]
+        if body:
+            raw_headers.append((b"content-length", str(len(body)).encode()))
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": raw_headers,
+        }
+        status, size = 0, 0
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            else:
+                size += len(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, size
+
+
+# ------------------------------------------------------------------------------
+class UvicornDriver:
+    """
+    Sends requests over HTTP to the test server (tests/server) run by uvicorn,
+    serving `root` under /WEBDAV through the given backend
+    """
+
+    def __init__(self, root: str, backend: str = "osfs", latency: float = 0.0):
+        """
+        :param backend: "osfs", "osbackend", or "memory" (a copy of `root`)
+        :param latency: seconds added to each filesystem call (not osbackend)
+        """
+        self.root = root
+        self.backend = backend
+        self.latency = latency
+        self.port = _free_port()
+        self._process: subprocess.Popen | None = None
+        self._connection: http.client.HTTPConnection | None = None
+        # peak RSS of the server process, when it can be known (Linux)
+        self.server_peak_rss_kb: int | None = None
+
+    async def start(self):
+        env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+        self._process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "tests.server",
+                "--port",
+                str(self.port),
+                "--backend",
+                self.backend,
+                "--root",
+                self.root,
+                "--latency",
+                str(self.latency),
+            ],
+            cwd=REPO_ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), 0.1).close()
+                break
+            except OSError:
+                await asyncio.sleep(0.05)
+        else:
+            raise RuntimeError("the test server did not start")
+        self._connection = http.client.HTTPConnection("127.0.0.1", self.port)
+
+    async def stop(self):
+        self._connection.close()
+        try:
+            with open(f"/proc/{self._process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        self.server_peak_rss_kb = int(line.split()[1])
+        except OSError:
+            pass
+        self._process.terminate()
+        self._process.wait()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: dict[str, str] | None = None,
+        body: bytes = b"",
+    ) -> response_t:
+        headers = dict(headers or {})
+        if "Destination" in headers:
+            headers["Destination"] = "/WEBDAV" + headers["Destination"]
+        self._connection.request(method, "/WEBDAV" + path, body=body, headers=headers)
+        response = self._connection.getresponse()
+        return response.status, len(response.read())
+
+
+# ------------------------------------------------------------------------------
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_kb() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+async def measure(
+    fn: Callable[[], Awaitable[response_t]],
+    min_time: float = 1.0,
+    min_iterations: int = 5,
+    max_iterations: int = 1000,
+) -> dict:
+    """
+    Call `fn` repeatedly, return the throughput, latency percentiles and the
+    status codes seen
+    """
+    latencies = []
+    statuses: dict[int, int] = {}
+    total_bytes = 0
+    started = time.perf_counter()
+    while len(latencies) < max_iterations and (
+        len(latencies) < min_iterations or time.perf_counter() - started < min_time
+    ):
+        start = time.perf_counter()
+        status, size = await fn()
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+        total_bytes += size
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "bytes_per_request": total_bytes // len(latencies),
+        "statuses": {str(k): v for k, v in statuses.items()},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
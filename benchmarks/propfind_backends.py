@@ -0,0 +1,66 @@
+"""
+Compare Depth:1 PROPFIND on a large local directory, served through the
+pyfilesystem2 OSFS adapter and through the native OSBackend.
+
+    python -m benchmarks.propfind_backends --entries 50000
+"""
+
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from fs.osfs import OSFS
+from asgi_dav import DAVApp, OSBackend
+from .harness import AsgiDriver
+
+
+async def propfind(app: DAVApp, path: str) -> tuple[int, int]:
+    """
+    Send a Depth:1 PROPFIND straight to the ASGI app, return (status, body size)
+    """
+    return await AsgiDriver(app).request("PROPFIND", path, {"Depth": "1"})
+
+
+def populate(root: str, entries: int):
+    os.makedirs(os.path.join(root, "big"))
+    for i in range(entries):
+        with open(os.path.join(root, "big", f"file-{i:06d}.txt"), "wb") as f:
+            f.write(b"x" * (i % 4096))
+
+
+async def bench(app: DAVApp, rounds: int) -> list[float]:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        status, _ = await propfind(app, "/big")
+        timings.append(time.perf_counter() - start)
+        assert status == 207, status
+    return timings
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--entries", default=50000, type=int)
+    parser.add_argument("--rounds", default=5, type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        populate(root, args.entries)
+        backends = {
+            "OSFS (pyfilesystem2)": DAVApp(OSFS(root)),
+            "OSBackend": DAVApp(OSBackend(root)),
+        }
+        print(f"Depth:1 PROPFIND, {args.entries} entries, {args.rounds} rounds")
+        for name, app in backends.items():
+            timings = asyncio.run(bench(app, args.rounds))
+            print(
+                f"{name:<24} median {statistics.median(timings) * 1000:8.1f} ms"
+                f"   min {min(timings) * 1000:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+    The benchmarked scenarios, and the synthetic trees they run against
+"""
+
+import itertools
+from dataclasses import dataclass, field
+from typing import Callable
+
+from fs.base import FS
+
+SMALL_FILE_SIZE = 1024
+LARGE_FILE_SIZE = 8 * 1024 * 1024
+
+# number of entries of the synthetic directories
+TREE_SIZES = (10, 1000, 100000)
+
+
+# ------------------------------------------------------------------------------
+@dataclass
+class Scenario:
+    name: str
+    # returns the (method, path, headers, body) of the next request
+    next_request: Callable[[], tuple[str, str, dict[str, str], bytes]]
+    # what has to exist in the filesystem before running
+    needs: set[str] = field(default_factory=set)
+
+
+# ------------------------------------------------------------------------------
+def populate(fs: FS, needs: set[str]):
+    """
+    Create the files and directories a scenario needs
+    """
+    if "files" in needs:
+        fs.writebytes("/small.bin", b"s" * SMALL_FILE_SIZE)
+        fs.writebytes("/large.bin", b"l" * LARGE_FILE_SIZE)
+        fs.makedirs("/upload", recreate=True)
+        fs.makedirs("/copies", recreate=True)
+    if "copydir" in needs:
+        fs.makedirs("/copydir/src", recreate=True)
+        for i in range(100):
+            fs.writebytes(f"/copydir/src/file-{i:03d}.bin", b"c" * SMALL_FILE_SIZE)
+    for size in TREE_SIZES:
+        if f"tree{size}" in needs:
+            make_tree(fs, f"/tree{size}", size)
+
+
+def make_tree(fs: FS, root: str, entries: int):
+    """
+    Create a directory of `entries` entries : 90% files, 10% subdirectories
+    each holding a few files
+    """
+    fs.makedirs(root, recreate=True)
+    dirs = max(1, entries // 10)
+    for i in range(entries - dirs):
+        fs.writebytes(f"{root}/file-{i:06d}.txt", b"x" * (i % 512))
+    for i in range(dirs):
+        fs.makedir(f"{root}/dir-{i:06d}")
+        for j in range(3):
+            fs.writebytes(f"{root}/dir-{i:06d}/file-{j}.txt", b"y")
+
+
+# ------------------------------------------------------------------------------
+def all_scenarios(sizes: tuple[int, ...] = TREE_SIZES) -> list[Scenario]:
+    scenarios = [
+        Scenario("get_small", lambda: ("GET", "/small.bin", {}, b""), {"files"}),
+        Scenario("get_large", lambda: ("GET", "/large.bin", {}, b""), {"files"}),
+        Scenario(
+            "get_range",
+            lambda: ("GET", "/large.bin", {"Range": "bytes=1000-1049575"}, b""),
+            {"files"},
+        ),
+        Scenario("head", lambda: ("HEAD", "/large.bin", {}, b""), {"files"}),
+        _counter_scenario(
+            "put_small",
+            lambda i: ("PUT", f"/upload/small-{i}", {}, b"p" * SMALL_FILE_SIZE),
+        ),
+        _counter_scenario(
+            "put_large",
+            lambda i: ("PUT", f"/upload/large-{i % 4}", {}, _LARGE_BODY),
+        ),
+        _counter_scenario(
+            "copy_file",
+            lambda i: (
+                "COPY",
+                "/small.bin",
+                {"Destination": f"/copies/small-{i}", "Overwrite": "T"},
+                b"",
+            ),
+        ),
+        _counter_scenario(
+            "move_file",
+            lambda i: (
+                "MOVE",
+                "/small.bin" if i % 2 == 0 else "/moved.bin",
+                {"Destination": "/moved.bin" if i % 2 == 0 else "/small.bin"},
+                b"",
+            ),
+        ),
+        _counter_scenario(
+            "copy_dir",
+            lambda i: (
+                "COPY",
+                "/copydir/src",
+                {"Destination": f"/copydir/dst-{i}"},
+                b"",
+            ),
+            {"copydir"},
+        ),
+    ]
+    for size in sizes:
+        tree = f"/tree{size}"
+        # Depth:infinity is answered 501 Not Implemented by the server
+        for depth in ("0", "1"):
+            scenarios.append(
+                Scenario(
+                    f"propfind_d{depth}_{size}",
+                    _constant("PROPFIND", tree, {"Depth": depth}),
+                    {f"tree{size}"},
+                )
+            )
+        scenarios.append(
+            Scenario(f"listing_{size}", _constant("GET", tree, {}), {f"tree{size}"})
+        )
+    return scenarios
+
+
+_LARGE_BODY = b"P" * LARGE_FILE_SIZE
+
+
+def _constant(method: str, path: str, headers: dict[str, str]):
+    return lambda: (method, path, headers, b"")
+
+
+def _counter_scenario(
+    name: str, make: Callable, needs: set[str] | None = None
+) -> Scenario:
+    counter = itertools.count()
+    return Scenario(name, lambda: make(next(counter)), {"files"} | (needs or set()))
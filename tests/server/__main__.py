@@ -1,16 +1,43 @@
-from asgi_dav import DAVApp
+from asgi_dav import DAVApp, OSBackend
+from asgi_dav.latency import LatencyFS
+from fs.copy import copy_fs
+from fs.memoryfs import MemoryFS
 from fs.osfs import OSFS
 from argparse import ArgumentParser
 import uvicorn
 from fastapi import FastAPI
 
-app = FastAPI()
-app.mount("/WEBDAV", DAVApp(OSFS(".")))
+
+def make_app(backend: str, root: str, latency: float) -> FastAPI:
+    if backend == "osbackend":
+        dav = DAVApp(OSBackend(root))
+    else:
+        fs = OSFS(root)
+        if backend == "memory":
+            # served from memory, with a copy of the directory
+            fs, disk = MemoryFS(), fs
+            copy_fs(disk, fs)
+        if latency:
+            fs = LatencyFS(fs, latency=latency, jitter=latency / 5, seed=0)
+        dav = DAVApp(fs)
+    app = FastAPI()
+    app.mount("/WEBDAV", dav)
+    return app
+
 
 def main():
     parser = ArgumentParser()
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", default=8080, type=int)
+    parser.add_argument(
+        "--backend", default="osfs", choices=("osfs", "osbackend", "memory")
+    )
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--latency", default=0.0, type=float)
     args = parser.parse_args()
-    uvicorn.run(app, host=args.host, port=args.port)
+    uvicorn.run(
+        make_app(args.backend, args.root, args.latency), host=args.host, port=args.port
+    )
+
+
 main()
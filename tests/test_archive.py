@@ -0,0 +1,110 @@
+import io
+import tarfile
+import zipfile
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from fs.memoryfs import MemoryFS
+
+BIG = bytes(range(256)) * 8192  # 2MiB, more than the queue can hold
+
+
+def make_fs() -> MemoryFS:
+    fs = MemoryFS()
+    fs.makedirs("/dir/sub/empty")
+    fs.writetext("/dir/a.txt", "hello " * 100)
+    fs.writebytes("/dir/photo.jpg", b"\xff\xd8" + b"x" * 1000)
+    fs.writebytes("/dir/sub/big.bin", BIG)
+    fs.writetext("/dir/.hidden", "secret")
+    fs.writetext("/other.txt", "not in the archive")
+    return fs
+
+
+@pytest.mark.asyncio
+async def test_zip_archive():
+    app = DAVApp(make_fs())
+    downloaded = []
+
+    async def on_download(evt):
+        downloaded.append(evt.path)
+
+    app.on("file.downloaded", on_download)
+    async with TestClient(app) as client:
+        response = await client.get("/dir", query_string={"archive": "zip"})
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "application/zip"
+        assert 'filename="dir.zip"' in response.headers["Content-Disposition"]
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert sorted(archive.namelist()) == [
+            "a.txt",
+            "photo.jpg",
+            "sub/",
+            "sub/big.bin",
+            "sub/empty/",
+        ]
+        assert archive.read("a.txt") == b"hello " * 100
+        assert archive.read("sub/big.bin") == BIG
+        assert archive.getinfo("a.txt").compress_type == zipfile.ZIP_DEFLATED
+        # already compressed
+        assert archive.getinfo("photo.jpg").compress_type == zipfile.ZIP_STORED
+    assert sorted(downloaded) == ["/dir/a.txt", "/dir/photo.jpg", "/dir/sub/big.bin"]
+
+
+@pytest.mark.asyncio
+async def test_tar_archive():
+    async with TestClient(DAVApp(make_fs())) as client:
+        response = await client.get("/dir", query_string={"archive": "tar"})
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "application/x-tar"
+
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        assert sorted(archive.getnames()) == [
+            "a.txt",
+            "photo.jpg",
+            "sub",
+            "sub/big.bin",
+            "sub/empty",
+        ]
+        assert archive.getmember("sub/empty").isdir()
+        assert archive.extractfile("sub/big.bin").read() == BIG
+
+
+@pytest.mark.asyncio
+async def test_tar_zst_archive():
+    zstandard = pytest.importorskip("zstandard")
+    async with TestClient(DAVApp(make_fs())) as client:
+        response = await client.get("/dir", query_string={"archive": "tar.zst"})
+        assert response.status_code == 200
+
+    reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(response.content))
+    with tarfile.open(fileobj=reader, mode="r|") as archive:
+        assert "sub/big.bin" in [member.name for member in archive]
+
+
+@pytest.mark.asyncio
+async def test_unsupported_archive_format():
+    async with TestClient(DAVApp(make_fs())) as client:
+        response = await client.get("/dir", query_string={"archive": "rar"})
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_archive_filename():
+    fs = make_fs()
+    fs.makedir('/ré"sumé')
+    async with TestClient(DAVApp(fs)) as client:
+        response = await client.get('/ré"sumé', query_string={"archive": "tar"})
+        assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == (
+        "attachment; filename=\"r__sum_.tar\"; filename*=UTF-8''r%C3%A9%22sum%C3%A9.tar"
+    )
+
+
+@pytest.mark.asyncio
+async def test_archives_after_a_restart():
+    app = DAVApp(make_fs())
+    for _ in range(2):
+        async with TestClient(app) as client:
+            response = await client.get("/dir", query_string={"archive": "tar"})
+            assert response.status_code == 200
@@ -0,0 +1,84 @@
+import os
+import pytest
+import fs.errors
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp, OSBackend
+from fs.osfs import OSFS
+
+
+@pytest.fixture(params=["osbackend", "osfs"])
+def app(request, tmp_path):
+    (tmp_path / "foo").mkdir()
+    (tmp_path / "foo" / "bar").write_text("bar")
+    (tmp_path / "foo" / "baz").write_text("bazbaz")
+    if request.param == "osbackend":
+        return DAVApp(OSBackend(str(tmp_path)))
+    return DAVApp(OSFS(str(tmp_path)))
+
+
+@pytest.mark.asyncio
+async def test_propfind(app):
+    async with TestClient(app) as client:
+        response = await client.open("/foo", method="PROPFIND", headers={"Depth": "1"})
+        assert response.status_code == 207
+        assert "<D:href>/foo/bar</D:href>" in response.text
+        assert "<D:getcontentlength>6</D:getcontentlength>" in response.text
+
+
+@pytest.mark.asyncio
+async def test_get_put_delete(app):
+    async with TestClient(app) as client:
+        response = await client.get("/foo/bar")
+        assert response.text == "bar"
+        response = await client.put("/foo/qux", data=b"qux")
+        assert response.status_code == 201
+        response = await client.get("/foo/qux")
+        assert response.text == "qux"
+        response = await client.delete("/foo/qux")
+        assert response.status_code == 204
+        response = await client.get("/foo/qux")
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_mkcol_copy_move(app):
+    async with TestClient(app) as client:
+        response = await client.open("/dir", method="MKCOL")
+        assert response.status_code == 201
+        response = await client.open(
+            "/foo/bar", method="COPY", headers={"Destination": "http://h/dir/bar"}
+        )
+        assert response.status_code == 201
+        response = await client.open(
+            "/foo/baz", method="MOVE", headers={"Destination": "http://h/dir/bar"}
+        )
+        assert response.status_code == 409
+        response = await client.open(
+            "/foo",
+            method="MOVE",
+            headers={"Destination": "http://h/moved"},
+        )
+        assert response.status_code == 204
+        response = await client.get("/moved/baz")
+        assert response.text == "bazbaz"
+        response = await client.get("/dir/bar")
+        assert response.text == "bar"
+
+
+@pytest.mark.asyncio
+async def test_osbackend_stays_in_root(tmp_path):
+    app = DAVApp(OSBackend(str(tmp_path)))
+    with pytest.raises(Exception):
+        app.backend.getsyspath("/../etc/passwd")
+
+
+@pytest.mark.asyncio
+async def test_osbackend_permission_denied(tmp_path, monkeypatch):
+    backend = OSBackend(str(tmp_path))
+
+    def stat(path):
+        raise PermissionError(13, "Permission denied", path)
+
+    monkeypatch.setattr(os, "stat", stat)
+    with pytest.raises(fs.errors.PermissionDenied):
+        await backend.getinfo("/foo")
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from asgi_dav.dedup import DedupBackend
+
+CONTENT = b"installer " * 10000
+
+
+def blobs(root) -> list[str]:
+    return sorted(
+        name for _, _, names in os.walk(os.path.join(root, "blobs")) for name in names
+    )
+
+
+@pytest.mark.asyncio
+async def test_identical_files_are_stored_once(tmp_path):
+    backend = DedupBackend(str(tmp_path))
+    async with TestClient(DAVApp(backend)) as client:
+        await client.open("/a", method="MKCOL")
+        response = await client.put("/a/setup.exe", data=CONTENT)
+        assert response.status_code == 201
+        response = await client.put("/a/setup-copy.exe", data=CONTENT)
+        assert response.status_code == 201
+        assert blobs(tmp_path) == [hashlib.sha256(CONTENT).hexdigest()]
+
+        # the ETag is the content hash
+        response = await client.get("/a/setup.exe")
+        assert response.content == CONTENT
+        assert response.headers["ETag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+
+        # a metadata operation
+        response = await client.open(
+            "/a", method="COPY", headers={"Destination": "http://localhost/b"}
+        )
+        assert response.status_code == 201
+        assert len(blobs(tmp_path)) == 1
+        response = await client.get("/b/setup.exe")
+        assert response.content == CONTENT
+
+        response = await client.open("/b", method="PROPFIND", headers={"Depth": "1"})
+        assert response.status_code == 207
+        assert "setup-copy.exe" in response.text
+
+
+@pytest.mark.asyncio
+async def test_unreferenced_blobs_are_collected(tmp_path):
+    backend = DedupBackend(str(tmp_path))
+    async with TestClient(DAVApp(backend)) as client:
+        await client.put("/one.bin", data=b"one")
+        await client.open(
+            "/one.bin",
+            method="COPY",
+            headers={"Destination": "http://localhost/two.bin"},
+        )
+        await client.delete("/one.bin")
+        # still referenced by the copy
+        assert await backend.gc() == 0
+
+        # replaced
+        await client.put("/two.bin", data=b"two")
+        assert await backend.gc() == 1
+        assert blobs(tmp_path) == [hashlib.sha256(b"two").hexdigest()]
+
+        await client.open(
+            "/two.bin", method="MOVE", headers={"Destination": "http://localhost/2.bin"}
+        )
+        assert await backend.gc() == 0
+        await client.delete("/2.bin")
+        assert await backend.gc() == 1
+        assert blobs(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_partial_update(tmp_path):
+    backend = DedupBackend(str(tmp_path))
+    async with TestClient(DAVApp(backend)) as client:
+        await client.put("/file", data=b"0123456789")
+        response = await client.put(
+            "/file", data=b"ab", headers={"Content-Range": "bytes 2-3/*"}
+        )
+        assert response.status_code == 204
+        response = await client.get("/file")
+        assert response.content == b"01ab456789"
+        assert response.headers["ETag"] == (
+            f'"{hashlib.sha256(b"01ab456789").hexdigest()}"'
+        )
+        # the original content is no longer referenced
+        assert await backend.gc() == 1
+
+
+@pytest.mark.asyncio
+async def test_staging_does_not_block_the_loop(tmp_path):
+    backend = DedupBackend(str(tmp_path))
+    threads = []
+    commit = backend._commit
+
+    def record(*args):
+        threads.append(threading.current_thread())
+        commit(*args)
+
+    backend._commit = record
+    async with TestClient(DAVApp(backend)) as client:
+        await client.put("/file", data=CONTENT)
+        await client.put("/file", data=b"ab", headers={"Content-Range": "bytes 2-3/*"})
+    # copied, hashed and stored in the executor
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_tree_is_persistent(tmp_path):
+    backend = DedupBackend(str(tmp_path))
+    await backend.makedirs("/docs/2024")
+    with backend.open("/docs/2024/report.txt", "wb") as f:
+        f.write(b"report")
+    await backend.movedir("/docs", "/archive")
+
+    backend = DedupBackend(str(tmp_path))
+    assert await backend.getinfo("/docs") is None
+    assert [info.name for info in await backend.scandir("/archive")] == ["2024"]
+    assert await backend.readbytes("/archive/2024/report.txt") == b"report"
@@ -0,0 +1,74 @@
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from asgi_dav.latency import LatencyFS
+from fs.base import FS
+from fs.memoryfs import MemoryFS
+
+
+class NaiveLatencyFS(LatencyFS):
+    """
+    A LatencyFS listing directories with one getinfo() call per entry
+    """
+
+    scandir = FS.scandir
+
+
+def make_fs(cls=LatencyFS, latency=0.05) -> LatencyFS:
+    memfs = MemoryFS()
+    memfs.makedir("/foo")
+    for i in range(20):
+        memfs.writetext(f"/foo/{i}", "bar")
+    return cls(memfs, latency=latency)
+
+
+def test_latencyfs_counts_calls():
+    fs = make_fs(latency=0)
+    assert fs.exists("/foo")
+    fs.getinfo("/foo")
+    fs.listdir("/foo")
+    assert fs.calls["exists"] == 1
+    assert fs.calls["getinfo"] == 1
+    assert fs.calls["listdir"] == 1
+    assert fs.max_in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_propfind_fetches_info_and_listing_concurrently():
+    fs = make_fs()
+    app = DAVApp(fs)
+    async with TestClient(app) as client:
+        response = await client.open("/foo", method="PROPFIND", headers={"Depth": "1"})
+    assert response.status_code == 207
+    assert fs.calls["getinfo"] == 1
+    assert fs.calls["scandir"] == 1
+    # one round-trip to the backend, not two
+    assert fs.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_propfind_prefetches_children_metadata():
+    fs = make_fs(NaiveLatencyFS, latency=0.02)
+    app = DAVApp(fs)
+    async with TestClient(app) as client:
+        response = await client.open("/foo", method="PROPFIND", headers={"Depth": "1"})
+    assert response.status_code == 207
+    assert response.text.count("<D:response>") == 21
+    assert fs.calls["getinfo"] == 21
+    # not 20 sequential getinfo() calls
+    assert fs.max_in_flight > 1
+
+
+@pytest.mark.asyncio
+async def test_put_in_missing_collection_conflicts():
+    fs = make_fs(latency=0)
+    app = DAVApp(fs)
+    async with TestClient(app) as client:
+        response = await client.put("/missing/bar", data=b"bar")
+        assert response.status_code == 409
+        response = await client.open(
+            "/foo/1", method="COPY", headers={"Destination": "http://h/missing/1"}
+        )
+        assert response.status_code == 409
+        response = await client.put("/foo/new", data=b"new")
+        assert response.status_code == 201
@@ -0,0 +1,80 @@
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from asgi_dav.cache import NegativeCache
+from asgi_dav.metrics import Metrics, Histogram
+from fs.memoryfs import MemoryFS
+
+
+def test_histogram_quantile():
+    h = Histogram((1.0, 2.0, 3.0))
+    for value in [0.5, 1.5, 1.5, 2.5]:
+        h.observe(value)
+    assert h.count == 4
+    assert h.sum == 6.0
+    assert 1.0 <= h.quantile(0.5) <= 2.0
+    assert 2.0 <= h.quantile(0.99) <= 3.0
+
+
+@pytest.mark.asyncio
+async def test_requests_are_measured():
+    fs = MemoryFS()
+    fs.writetext("/foo", "foo")
+    metrics = Metrics()
+    app = DAVApp(fs, negative_cache=NegativeCache(), metrics=metrics)
+    async with TestClient(app) as client:
+        await client.get("/foo")
+        await client.get("/foo")
+        await client.get("/missing")
+        await client.put("/bar", data=b"barbar")
+
+    assert (
+        metrics.histogram("asgi_dav_request_seconds", method="GET", status="200").count
+        == 2
+    )
+    assert (
+        metrics.histogram("asgi_dav_request_seconds", method="GET", status="404").count
+        == 1
+    )
+    assert metrics.histogram("asgi_dav_backend_call_seconds", op="getinfo").count >= 3
+    assert (
+        metrics.histogram(
+            "asgi_dav_event_dispatch_seconds", event="file.uploaded"
+        ).count
+        == 1
+    )
+
+    snapshot = metrics.snapshot()
+    sent = {
+        s["labels"]["method"]: s["value"] for s in snapshot["asgi_dav_sent_bytes_total"]
+    }
+    received = {
+        s["labels"]["method"]: s["value"]
+        for s in snapshot["asgi_dav_received_bytes_total"]
+    }
+    assert sent["GET"] >= 6
+    assert received["PUT"] == 6
+    assert snapshot["asgi_dav_negative_cache_entries"][0]["value"] == 1
+
+
+@pytest.mark.asyncio
+async def test_prometheus_endpoint():
+    metrics = Metrics()
+    app = DAVApp(MemoryFS(), metrics=metrics)
+    async with TestClient(app) as client:
+        await client.open("/", method="PROPFIND", headers={"Depth": "1"})
+    async with TestClient(metrics) as client:
+        response = await client.get("/")
+    assert response.status_code == 200
+    assert "# TYPE asgi_dav_request_seconds histogram" in response.text
+    assert (
+        'asgi_dav_request_seconds_count{method="PROPFIND",status="207"} 1'
+        in response.text
+    )
+    assert 'asgi_dav_singleflight_calls_total{op="scandir"} 1' in response.text
+
+
+def test_no_metrics_no_wrapping():
+    app = DAVApp(MemoryFS())
+    assert app.metrics is None
+    assert type(app.backend).__name__ == "FSBackend"
@@ -0,0 +1,172 @@
+import io
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp, OSBackend
+from asgi_dav.mounts import MountBackend, PrefixTrie
+from fs.memoryfs import MemoryFS
+
+
+def make_app(tmp_path) -> tuple[DAVApp, MemoryFS, MemoryFS]:
+    alice, bob = MemoryFS(), MemoryFS()
+    alice.makedirs("/docs/2024")
+    alice.writetext("/docs/2024/report.txt", "report")
+    alice.writetext("/notes.txt", "notes")
+    bob.writetext("/todo.txt", "todo")
+    (tmp_path / "readme.txt").write_text("public")
+    app = DAVApp(
+        {
+            "/shares/alice": alice,
+            "/shares/bob": bob,
+            "/public": OSBackend(str(tmp_path)),
+        }
+    )
+    return app, alice, bob
+
+
+def test_prefix_trie():
+    trie = PrefixTrie()
+    root, a, ab = object(), object(), object()
+    trie.insert("/", root)
+    trie.insert("/a", a)
+    trie.insert("/a/b", ab)
+    assert trie.lookup("/a/b/c/d") == (ab, "/c/d")
+    assert trie.lookup("/a/bc") == (a, "/bc")
+    assert trie.lookup("/a") == (a, "/")
+    assert trie.lookup("/x") == (root, "/x")
+    assert sorted(trie.node("/a").children) == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_mounts_are_served(tmp_path):
+    app, _, _ = make_app(tmp_path)
+    async with TestClient(app) as client:
+        response = await client.get("/shares/alice/notes.txt")
+        assert response.text == "notes"
+        response = await client.get("/shares/bob/todo.txt")
+        assert response.text == "todo"
+        response = await client.get("/public/readme.txt")
+        assert response.text == "public"
+        response = await client.get("/shares/carol/todo.txt")
+        assert response.status_code == 404
+
+        # the ancestors of the mount points list them
+        response = await client.open("/shares", method="PROPFIND")
+        assert response.status_code == 207
+        assert "/shares/alice" in response.text
+        assert "/shares/bob" in response.text
+        response = await client.open("/", method="PROPFIND")
+        assert "/public" in response.text
+
+        # but cannot be written
+        response = await client.put("/shares/file.txt", data=b"x")
+        assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_cross_mount_copy_and_move(tmp_path):
+    app, alice, bob = make_app(tmp_path)
+    async with TestClient(app) as client:
+        response = await client.open(
+            "/shares/alice/notes.txt",
+            method="COPY",
+            headers={"Destination": "http://localhost/shares/bob/notes.txt"},
+        )
+        assert response.status_code == 201
+        assert bob.readtext("/notes.txt") == "notes"
+        assert alice.exists("/notes.txt")
+
+        response = await client.open(
+            "/shares/alice/docs",
+            method="MOVE",
+            headers={"Destination": "http://localhost/public/docs"},
+        )
+        assert response.status_code == 204
+        assert (tmp_path / "docs" / "2024" / "report.txt").read_text() == "report"
+        assert not alice.exists("/docs")
+
+        # within a mount, the backend copies
+        response = await client.open(
+            "/shares/bob/todo.txt",
+            method="MOVE",
+            headers={"Destination": "http://localhost/shares/bob/done.txt"},
+        )
+        assert response.status_code == 204
+        assert bob.readtext("/done.txt") == "todo"
+
+
+@pytest.mark.asyncio
+async def test_mount_at_root(tmp_path):
+    main, extra = MemoryFS(), MemoryFS()
+    main.writetext("/index.txt", "main")
+    extra.writetext("/extra.txt", "extra")
+    backend = MountBackend({"/": main, "/mnt/extra": extra})
+    assert sorted(info.name for info in await backend.scandir("/")) == [
+        "index.txt",
+        "mnt",
+    ]
+    assert [info.name for info in await backend.scandir("/mnt")] == ["extra"]
+    info = await backend.getinfo("/mnt/extra")
+    assert info.name == "extra" and info.is_dir
+    assert await backend.readbytes("/mnt/extra/extra.txt") == b"extra"
+
+
+@pytest.mark.asyncio
+async def test_mount_points_are_immutable(tmp_path):
+    app, _, bob = make_app(tmp_path)
+    async with TestClient(app) as client:
+        response = await client.open(
+            "/shares/bob",
+            method="MOVE",
+            headers={"Destination": "http://localhost/public/bob"},
+        )
+        assert response.status_code == 403
+        assert bob.readtext("/todo.txt") == "todo"
+
+        response = await client.delete("/shares/bob")
+        assert response.status_code == 403
+        response = await client.delete("/public")
+        assert response.status_code == 403
+        assert (tmp_path / "readme.txt").exists()
+
+        response = await client.open(
+            "/shares/alice/notes.txt",
+            method="COPY",
+            headers={"Destination": "http://localhost/shares/bob"},
+        )
+        assert response.status_code == 403
+
+        # a mount point can still be copied from
+        response = await client.open(
+            "/shares/bob",
+            method="COPY",
+            headers={"Destination": "http://localhost/public/bob"},
+        )
+        assert response.status_code == 201
+        assert (tmp_path / "bob" / "todo.txt").read_text() == "todo"
+
+
+class FailingFile(io.RawIOBase):
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        raise OSError("I/O error")
+
+
+@pytest.mark.asyncio
+async def test_failed_cross_mount_move_cleans_up(tmp_path):
+    src, dst = MemoryFS(), MemoryFS()
+    src.makedirs("/dir")
+    src.writetext("/dir/file.txt", "content")
+    backend = MountBackend({"/src": src, "/dst": dst})
+    backend.mounts["/src"].open = lambda path, mode: FailingFile()
+
+    with pytest.raises(OSError):
+        await backend.movedir("/src/dir", "/dst/dir")
+    assert not dst.exists("/dir")
+    assert src.exists("/dir/file.txt")
+
+    with pytest.raises(OSError):
+        await backend.move("/src/dir/file.txt", "/dst/file.txt")
+    assert not dst.exists("/file.txt")
+    assert src.exists("/dir/file.txt")
@@ -0,0 +1,108 @@
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from asgi_dav.cache import NegativeCache, CLIENT_PROBE_PATTERNS
+from fs.memoryfs import MemoryFS
+
+
+class CountingMemoryFS(MemoryFS):
+    def __init__(self):
+        super().__init__()
+        self.getinfo_calls = 0
+
+    def getinfo(self, path, namespaces=None):
+        self.getinfo_calls += 1
+        return super().getinfo(path, namespaces)
+
+
+def test_negative_cache_is_bounded():
+    cache = NegativeCache(maxsize=2)
+    cache.add("/a")
+    cache.add("/b")
+    cache.add("/c")
+    assert len(cache) == 2
+    assert not cache.is_missing("/a")
+    assert cache.is_missing("/c")
+
+
+def test_negative_cache_invalidates_subtree():
+    cache = NegativeCache()
+    cache.add("/foo/bar")
+    cache.add("/foobar")
+    cache.invalidate("/foo")
+    assert not cache.is_missing("/foo/bar")
+    assert cache.is_missing("/foobar")
+
+
+def test_negative_cache_skips_stale_lookups():
+    cache = NegativeCache()
+    generation = cache.generation
+    # created while it was looked up
+    cache.invalidate("/foo")
+    cache.add("/foo", generation)
+    assert not cache.is_missing("/foo")
+    cache.add("/foo", cache.generation)
+    assert cache.is_missing("/foo")
+
+
+@pytest.mark.asyncio
+async def test_misses_are_cached_until_put():
+    fs = CountingMemoryFS()
+    cache = NegativeCache()
+    app = DAVApp(fs, negative_cache=cache)
+    async with TestClient(app) as client:
+        for _ in range(3):
+            response = await client.get("/foo")
+            assert response.status_code == 404
+        assert fs.getinfo_calls == 1
+        assert cache.avoided == 2
+
+        response = await client.put("/foo", data=b"foo")
+        assert response.status_code == 201
+        response = await client.get("/foo")
+        assert response.status_code == 200
+        assert response.text == "foo"
+
+
+@pytest.mark.asyncio
+async def test_misses_are_cached_until_mkcol_and_move():
+    fs = MemoryFS()
+    fs.writetext("/bar", "bar")
+    app = DAVApp(fs, negative_cache=NegativeCache())
+    async with TestClient(app) as client:
+        response = await client.open("/dir", method="PROPFIND")
+        assert response.status_code == 404
+        response = await client.open("/dir", method="MKCOL")
+        assert response.status_code == 201
+        response = await client.open("/dir", method="PROPFIND")
+        assert response.status_code == 207
+
+        response = await client.get("/dir/bar")
+        assert response.status_code == 404
+        response = await client.open(
+            "/bar", method="MOVE", headers={"Destination": "http://localhost/dir/bar"}
+        )
+        assert response.status_code == 204
+        response = await client.get("/dir/bar")
+        assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_probe_patterns_do_not_touch_the_fs():
+    fs = CountingMemoryFS()
+    fs.makedir("/foo")
+    fs.getinfo_calls = 0
+    cache = NegativeCache(patterns=CLIENT_PROBE_PATTERNS)
+    app = DAVApp(fs, negative_cache=cache)
+    async with TestClient(app) as client:
+        for path in ["/.Spotlight-V100", "/foo/.metadata_never_index"]:
+            response = await client.open(path, method="PROPFIND")
+            assert response.status_code == 404
+        assert fs.getinfo_calls == 0
+        assert cache.avoided == 2
+
+        # may be user content
+        response = await client.put("/foo/folder.jpg", data=b"jpeg")
+        assert response.status_code == 201
+        response = await client.get("/foo/folder.jpg")
+        assert response.content == b"jpeg"
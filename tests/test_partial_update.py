@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp, OSBackend
+from fs.memoryfs import MemoryFS
+from fs.osfs import OSFS
+
+PATCH_HEADERS = {"Content-Type": "application/x-sabredav-partialupdate"}
+
+
+@pytest.fixture(params=["osbackend", "osfs"])
+def app(request, tmp_path):
+    (tmp_path / "image.bin").write_bytes(b"0123456789")
+    if request.param == "osbackend":
+        return DAVApp(OSBackend(str(tmp_path)))
+    return DAVApp(OSFS(str(tmp_path)))
+
+
+@pytest.mark.asyncio
+async def test_put_content_range(app):
+    uploaded = []
+
+    async def on_upload(evt):
+        uploaded.append(evt.path)
+
+    app.on("file.uploaded", on_upload)
+    async with TestClient(app) as client:
+        response = await client.put(
+            "/image.bin", data=b"ab", headers={"Content-Range": "bytes 2-3/*"}
+        )
+        assert response.status_code == 204
+        assert response.headers["ETag"]
+        response = await client.get("/image.bin")
+        assert response.content == b"01ab456789"
+
+        # with a total length, the file is truncated
+        response = await client.put(
+            "/image.bin", data=b"XY", headers={"Content-Range": "bytes 4-5/6"}
+        )
+        assert response.status_code == 204
+        response = await client.get("/image.bin")
+        assert response.content == b"01abXY"
+
+        response = await client.put(
+            "/image.bin", data=b"abc", headers={"Content-Range": "bytes 2-3/*"}
+        )
+        assert response.status_code == 400
+
+    assert uploaded == ["/image.bin", "/image.bin"]
+
+
+@pytest.mark.asyncio
+async def test_patch(app):
+    async with TestClient(app) as client:
+        headers = dict(PATCH_HEADERS, **{"X-Update-Range": "bytes=1-2"})
+        response = await client.patch("/image.bin", data=b"ab", headers=headers)
+        assert response.status_code == 204
+
+        headers = dict(PATCH_HEADERS, **{"X-Update-Range": "append"})
+        response = await client.patch("/image.bin", data=b"++", headers=headers)
+        assert response.status_code == 204
+
+        headers = dict(PATCH_HEADERS, **{"X-Update-Range": "bytes=-3"})
+        response = await client.patch("/image.bin", data=b"END", headers=headers)
+        assert response.status_code == 204
+
+        response = await client.get("/image.bin")
+        assert response.content == b"0ab345678END"
+
+        headers = dict(PATCH_HEADERS, **{"X-Update-Range": "bytes=100-"})
+        response = await client.patch("/image.bin", data=b"x", headers=headers)
+        assert response.status_code == 416
+
+        response = await client.patch(
+            "/image.bin", data=b"x", headers={"X-Update-Range": "append"}
+        )
+        assert response.status_code == 415
+
+        headers = dict(PATCH_HEADERS, **{"X-Update-Range": "append"})
+        response = await client.patch("/missing", data=b"x", headers=headers)
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_if_match(app):
+    async with TestClient(app) as client:
+        etag = (await client.get("/image.bin")).headers["ETag"]
+
+        headers = dict(PATCH_HEADERS, **{"X-Update-Range": "bytes=0-0"})
+        response = await client.patch(
+            "/image.bin", data=b"x", headers=dict(headers, **{"If-Match": '"nope"'})
+        )
+        assert response.status_code == 412
+
+        response = await client.patch(
+            "/image.bin", data=b"x", headers=dict(headers, **{"If-Match": etag})
+        )
+        assert response.status_code == 204
+        response = await client.get("/image.bin")
+        assert response.content == b"x123456789"
+
+        response = await client.put("/new", data=b"x", headers={"If-Match": etag})
+        assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_concurrent_if_match():
+    fs = MemoryFS()
+    fs.writebytes("/image.bin", b"0123456789")
+    async with TestClient(DAVApp(fs)) as client:
+        etag = (await client.get("/image.bin")).headers["ETag"]
+        headers = dict(
+            PATCH_HEADERS, **{"X-Update-Range": "bytes=0-0", "If-Match": etag}
+        )
+        # same length, in the same second : only the first one matches
+        responses = await asyncio.gather(
+            client.patch("/image.bin", data=b"x", headers=headers),
+            client.patch("/image.bin", data=b"y", headers=headers),
+        )
+        assert sorted(r.status_code for r in responses) == [204, 412]
+        assert (await client.get("/image.bin")).headers["ETag"] != etag
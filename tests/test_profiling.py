@@ -0,0 +1,90 @@
+import json
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from asgi_dav.latency import LatencyFS
+from asgi_dav.profiling import RequestProfiler
+from fs.memoryfs import MemoryFS
+
+
+def make_fs() -> MemoryFS:
+    fs = MemoryFS()
+    fs.makedir("/dir")
+    for i in range(5):
+        fs.writetext(f"/dir/file{i}", "x")
+    return fs
+
+
+@pytest.mark.asyncio
+async def test_only_slow_requests_are_kept():
+    fs = LatencyFS(make_fs(), latency=0, latencies={"scandir": 0.1})
+    profiler = RequestProfiler(sample_rate=0, slow_threshold=0.04, interval=0.002)
+    app = DAVApp(fs, profiler=profiler)
+    async with TestClient(app) as client:
+        await client.get("/dir/file0")
+        # the sampler only starts once a request passes the threshold
+        assert profiler._thread is None
+        response = await client.open("/dir", method="PROPFIND", headers={"Depth": "1"})
+        assert response.status_code == 207
+
+    assert len(profiler.profiles) == 1
+    record = profiler.profiles[0]
+    assert (record.method, record.path, record.depth) == ("PROPFIND", "/dir", "1")
+    assert record.reason == "slow"
+    assert record.status == 207
+    assert record.details == {"entries": 5}
+    assert record.duration >= 0.04
+    # sampled from the threshold on : sleeping in the filesystem
+    assert any("_delay" in stack for stack in record.samples)
+
+
+@pytest.mark.asyncio
+async def test_slow_sampled_requests():
+    fs = LatencyFS(make_fs(), latency=0, latencies={"scandir": 0.05})
+    profiler = RequestProfiler(sample_rate=1, slow_threshold=0.04, interval=0.002)
+    app = DAVApp(fs, profiler=profiler)
+    async with TestClient(app) as client:
+        await client.open("/dir", method="PROPFIND", headers={"Depth": "1"})
+
+    record = profiler.profiles[0]
+    assert record.reason == "slow"
+    # the time spent in the worker thread, sleeping in the filesystem
+    assert any("_delay" in stack for stack in record.samples)
+
+
+@pytest.mark.asyncio
+async def test_sampled_requests_and_dump():
+    captured = []
+
+    async def callback(record):
+        captured.append(record)
+
+    profiler = RequestProfiler(
+        sample_rate=1, slow_threshold=None, capacity=2, callback=callback
+    )
+    app = DAVApp(make_fs(), profiler=profiler)
+    async with TestClient(app) as client:
+        for i in range(3):
+            await client.get(f"/dir/file{i}")
+
+    assert len(captured) == 3
+    # the ring buffer keeps the most recent ones
+    assert [r.path for r in profiler.profiles] == ["/dir/file1", "/dir/file2"]
+    assert all(r.reason == "sampled" for r in profiler.profiles)
+
+    async with TestClient(profiler) as client:
+        response = await client.get("/")
+        records = json.loads(response.content)
+        assert [r["path"] for r in records] == ["/dir/file1", "/dir/file2"]
+        response = await client.get("/", query_string={"format": "folded"})
+        assert response.text.startswith("# GET /dir/file1")
+
+
+@pytest.mark.asyncio
+async def test_cprofile_mode():
+    profiler = RequestProfiler(sample_rate=1, slow_threshold=None, mode="cprofile")
+    app = DAVApp(make_fs(), profiler=profiler)
+    async with TestClient(app) as client:
+        await client.open("/dir", method="PROPFIND", headers={"Depth": "1"})
+
+    assert "propfind" in profiler.profiles[0].report
@@ -0,0 +1,45 @@
+from hashlib import md5
+from fs.memoryfs import MemoryFS
+from asgi_dav.props import FileProps
+from asgi_dav.backends import ResourceInfo
+from asgi_dav.utils import guess_contenttype, timestamp_to_rfc_1123
+
+
+def test_fileprops_is_compact():
+    fp = FileProps(ResourceInfo("foo.txt", False, 3, 0.0, None), "/")
+    assert not hasattr(fp, "__dict__")
+    assert fp.lastmodified == "Thu, 01 Jan 1970 00:00:00 GMT"
+    assert fp.creationdate.endswith("01-01T00:00:00Z")
+    assert fp.props["D:getcontentlength"] == "3"
+    assert fp.props["D:getcontenttype"] == "text/plain"
+
+
+def test_fileprops_from_info():
+    fs = MemoryFS()
+    fs.writetext("/foo.txt", "foo")
+    info = fs.getinfo("/foo.txt", ["details"])
+    fp = FileProps(info, "/")
+    assert fp.href == "/foo.txt"
+    assert fp.size == 3
+    assert fp.lastmodified == timestamp_to_rfc_1123(info.raw["details"]["modified"])
+    digest = md5()
+    digest.update(b"foo.txt")
+    digest.update(b"3")
+    digest.update(repr(info.raw["details"]["modified"]).encode())
+    assert fp.etag == digest.hexdigest()
+
+
+def test_fileprops_sort_directories_first():
+    fprops = [
+        FileProps(ResourceInfo("b", False, 0, None, None), "/"),
+        FileProps(ResourceInfo("c", True, 0, None, None), "/"),
+        FileProps(ResourceInfo("a", False, 0, None, None), "/"),
+    ]
+    assert [fp.name for fp in sorted(fprops)] == ["c", "a", "b"]
+
+
+def test_guess_contenttype_by_extension():
+    assert guess_contenttype("foo.txt") == "text/plain"
+    assert guess_contenttype("FOO.bar.HTML") == "text/html"
+    assert guess_contenttype("archive.tar.gz") == "application/x-tar; charset=gzip"
+    assert guess_contenttype("README") == "application/octet-stream"
@@ -0,0 +1,235 @@
+import asyncio
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp, ChunkedUploads, QuotaIndex
+from asgi_dav.latency import LatencyFS
+from fs.memoryfs import MemoryFS
+
+
+def make_fs() -> MemoryFS:
+    fs = MemoryFS()
+    fs.makedirs("/home/alice/docs")
+    fs.makedirs("/home/bob")
+    fs.writebytes("/home/alice/a.bin", b"a" * 100)
+    fs.writebytes("/home/alice/docs/b.bin", b"b" * 50)
+    fs.writebytes("/home/bob/c.bin", b"c" * 10)
+    return fs
+
+
+async def wait_ready(quota: QuotaIndex):
+    while not quota.ready:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_usage_after_reconcile():
+    quota = QuotaIndex({"/home/alice": 1000})
+    async with TestClient(DAVApp(make_fs(), quota=quota)):
+        await wait_ready(quota)
+        assert quota.usage("/") == (160, 3)
+        assert quota.usage("/home/alice") == (150, 2)
+        assert quota.usage("/home/alice/docs") == (50, 1)
+        assert quota.available("/home/alice/docs") == 850
+        assert quota.available("/home/bob") is None
+
+
+@pytest.mark.asyncio
+async def test_usage_follows_the_changes():
+    quota = QuotaIndex()
+    async with TestClient(DAVApp(make_fs(), quota=quota)) as client:
+        await wait_ready(quota)
+
+        response = await client.put("/home/bob/d.bin", data=b"d" * 40)
+        assert response.status_code == 201
+        assert quota.usage("/home/bob") == (50, 2)
+
+        # replaced by a smaller file
+        await client.put("/home/bob/d.bin", data=b"d" * 5)
+        assert quota.usage("/home/bob") == (15, 2)
+
+        response = await client.delete("/home/bob/c.bin")
+        assert quota.usage("/home/bob") == (5, 1)
+
+        response = await client.open(
+            "/home/alice",
+            method="COPY",
+            headers={"Destination": "http://localhost/home/bob/alice"},
+        )
+        assert response.status_code == 201
+        assert quota.usage("/home/bob") == (155, 3)
+        assert quota.usage("/home/bob/alice/docs") == (50, 1)
+        assert quota.usage("/home") == (305, 5)
+
+        await client.open(
+            "/home/bob/alice/docs",
+            method="MOVE",
+            headers={"Destination": "http://localhost/home/docs"},
+        )
+        assert quota.usage("/home/bob") == (105, 2)
+        assert quota.usage("/home/docs") == (50, 1)
+        assert quota.usage("/home/bob/alice/docs") is None
+
+        await client.open("/home/carol", method="MKCOL")
+        assert quota.usage("/home/carol") == (0, 0)
+
+        await client.delete("/home/carol")
+        assert quota.usage("/home/carol") is None
+        assert quota.usage("/home") == (305, 5)
+
+        # the incremental updates agree with a full walk
+        usage = dict(quota._total)
+        await quota.reconcile()
+        assert quota._total == usage
+
+
+@pytest.mark.asyncio
+async def test_changes_during_a_reconcile():
+    fs = LatencyFS(make_fs(), latency=0, latencies={"scandir": 0.05})
+    quota = QuotaIndex({"/": 1000})
+    async with TestClient(DAVApp(fs, quota=quota)) as client:
+        await wait_ready(quota)
+        fs.reset_calls()
+        reconcile = asyncio.create_task(quota.reconcile("/"))
+        # "/" is listed, the walk goes on below
+        while fs.calls["scandir"] < 2:
+            await asyncio.sleep(0.005)
+        response = await client.put("/big.bin", data=b"x" * 500)
+        assert response.status_code == 201
+        await reconcile
+
+        assert quota.usage("/") == (660, 4)
+        response = await client.put("/bigger.bin", data=b"x" * 900)
+        assert response.status_code == 507
+
+
+@pytest.mark.asyncio
+async def test_put_over_quota():
+    quota = QuotaIndex({"/home/alice": 200})
+    async with TestClient(DAVApp(make_fs(), quota=quota)) as client:
+        await wait_ready(quota)
+
+        response = await client.put("/home/alice/docs/big.bin", data=b"x" * 51)
+        assert response.status_code == 507
+        # replacing a file only counts the difference
+        response = await client.put("/home/alice/a.bin", data=b"x" * 150)
+        assert response.status_code == 201
+        assert quota.available("/home/alice") == 0
+        # not limited
+        response = await client.put("/home/bob/big.bin", data=b"x" * 1000)
+        assert response.status_code == 201
+
+        response = await client.open(
+            "/home/bob/big.bin",
+            method="COPY",
+            headers={"Destination": "http://localhost/home/alice/big.bin"},
+        )
+        assert response.status_code == 507
+
+
+@pytest.mark.asyncio
+async def test_quota_properties():
+    quota = QuotaIndex({"/home": 1000})
+    async with TestClient(DAVApp(make_fs(), quota=quota)) as client:
+        await wait_ready(quota)
+        response = await client.open("/home", method="PROPFIND", headers={"Depth": "1"})
+        assert response.status_code == 207
+        body = response.text
+        assert "<D:quota-used-bytes>160</D:quota-used-bytes>" in body
+        assert "<D:quota-available-bytes>840</D:quota-available-bytes>" in body
+        # the children, limited by their parent
+        assert "<D:quota-used-bytes>150</D:quota-used-bytes>" in body
+        assert body.count("<D:quota-available-bytes>840<") == 3
+
+
+@pytest.mark.asyncio
+async def test_partial_updates_over_quota():
+    quota = QuotaIndex({"/home/alice": 200})
+    async with TestClient(DAVApp(make_fs(), quota=quota)) as client:
+        await wait_ready(quota)
+
+        response = await client.open(
+            "/home/alice/a.bin",
+            method="PATCH",
+            data=b"x" * 51,
+            headers={
+                "Content-Type": "application/x-sabredav-partialupdate",
+                "X-Update-Range": "append",
+            },
+        )
+        assert response.status_code == 507
+        # overwriting does not need more room
+        response = await client.open(
+            "/home/alice/a.bin",
+            method="PATCH",
+            data=b"x" * 51,
+            headers={
+                "Content-Type": "application/x-sabredav-partialupdate",
+                "X-Update-Range": "bytes=0-50",
+            },
+        )
+        assert response.status_code == 204
+
+        response = await client.put(
+            "/home/alice/a.bin",
+            data=b"x" * 51,
+            headers={"Content-Range": "bytes 100-150/*"},
+        )
+        assert response.status_code == 507
+        assert quota.usage("/home/alice") == (150, 2)
+
+
+@pytest.mark.asyncio
+async def test_move_over_quota():
+    quota = QuotaIndex({"/home/alice": 200})
+    async with TestClient(DAVApp(make_fs(), quota=quota)) as client:
+        await wait_ready(quota)
+        await client.put("/home/bob/big.bin", data=b"x" * 51)
+
+        response = await client.open(
+            "/home/bob/big.bin",
+            method="MOVE",
+            headers={"Destination": "http://localhost/home/alice/big.bin"},
+        )
+        assert response.status_code == 507
+        response = await client.open(
+            "/home/bob",
+            method="MOVE",
+            headers={"Destination": "http://localhost/home/alice/bob"},
+        )
+        assert response.status_code == 507
+
+        # full, but the bytes stay in the collection
+        await client.put("/home/alice/docs/c.bin", data=b"c" * 50)
+        assert quota.available("/home/alice") == 0
+        response = await client.open(
+            "/home/alice/docs",
+            method="MOVE",
+            headers={"Destination": "http://localhost/home/alice/archive"},
+        )
+        assert response.status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_chunked_upload_over_quota():
+    quota = QuotaIndex({"/home/alice": 200})
+    app = DAVApp(make_fs(), quota=quota, uploads=ChunkedUploads())
+    async with TestClient(app) as client:
+        await wait_ready(quota)
+        await client.open("/.uploads/xfer", method="MKCOL")
+        for n in (1, 2):
+            await client.put(f"/.uploads/xfer/{n}", data=b"x" * 30)
+
+        response = await client.open(
+            "/.uploads/xfer/.file",
+            method="MOVE",
+            headers={"Destination": "/home/alice/big.bin"},
+        )
+        assert response.status_code == 507
+        # replacing a file only counts the difference
+        response = await client.open(
+            "/.uploads/xfer/.file",
+            method="MOVE",
+            headers={"Destination": "/home/alice/docs/b.bin"},
+        )
+        assert response.status_code == 204
+        assert quota.usage("/home/alice") == (160, 2)
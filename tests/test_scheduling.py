@@ -0,0 +1,199 @@
+import asyncio
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from asgi_dav.metrics import Metrics
+from asgi_dav.scheduling import Overloaded, Scheduler, TokenBucket, client_identity
+from fs.memoryfs import MemoryFS
+
+
+def scope(client: str, method: str = "COPY", headers=()) -> dict:
+    return {
+        "method": method,
+        "headers": list(headers),
+        "client": (client, 1234),
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limits():
+    scheduler = Scheduler(max_concurrency=2, max_concurrency_per_client=1)
+    a1 = await scheduler.acquire(scope("a"))
+    # 'a' is at its limit, 'b' gets the last slot
+    waiting = asyncio.create_task(scheduler.acquire(scope("a")))
+    await asyncio.sleep(0)
+    b1 = await scheduler.acquire(scope("b"))
+    assert scheduler.active == 2 and scheduler.queued == 1
+
+    scheduler.release(b1)
+    await asyncio.sleep(0)
+    # still waiting for a slot of its own
+    assert not waiting.done()
+    scheduler.release(a1)
+    a2 = await waiting
+    assert a2.wait > 0
+    scheduler.release(a2)
+    assert scheduler.active == 0 and scheduler.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_queuing():
+    scheduler = Scheduler(max_concurrency=1, max_concurrency_per_client=1)
+    first = await scheduler.acquire(scope("greedy"))
+    order = []
+
+    async def request(client):
+        ticket = await scheduler.acquire(scope(client))
+        order.append(client)
+        scheduler.release(ticket)
+
+    tasks = [asyncio.create_task(request("greedy")) for _ in range(5)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("polite")))
+    await asyncio.sleep(0)
+    scheduler.release(first)
+    await asyncio.gather(*tasks)
+    # served after one request of the greedy client, not after all of them
+    assert order.index("polite") == 1
+
+
+@pytest.mark.asyncio
+async def test_weights():
+    scheduler = Scheduler(
+        max_concurrency=1, max_concurrency_per_client=1, weights={"ip:b": 3}
+    )
+    first = await scheduler.acquire(scope("a"))
+    order = []
+
+    async def request(client):
+        ticket = await scheduler.acquire(scope(client))
+        order.append(client)
+        scheduler.release(ticket)
+
+    tasks = [asyncio.create_task(request(c)) for c in "aaaa" + "bbbbbb"]
+    await asyncio.sleep(0)
+    scheduler.release(first)
+    await asyncio.gather(*tasks)
+    assert order[:4].count("b") == 3
+
+
+@pytest.mark.asyncio
+async def test_overflow():
+    scheduler = Scheduler(
+        max_concurrency=1,
+        max_concurrency_per_client=1,
+        max_queue=2,
+        max_queue_per_client=1,
+        max_wait=0.05,
+    )
+    ticket = await scheduler.acquire(scope("a"))
+    waiting = asyncio.create_task(scheduler.acquire(scope("a")))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as e:
+        await scheduler.acquire(scope("a"))
+    assert e.value.status == 429
+    assert e.value.retry_after >= 1
+
+    asyncio.create_task(scheduler.acquire(scope("b")))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as e:
+        await scheduler.acquire(scope("c"))
+    assert e.value.status == 503
+
+    # waited too long
+    with pytest.raises(Overloaded) as e:
+        await waiting
+    assert e.value.status == 503
+    scheduler.release(ticket)
+
+
+def test_client_identity():
+    class User:
+        is_authenticated = True
+        identity = "alice"
+
+    assert client_identity(dict(scope("10.0.0.1"), user=User())) == "user:alice"
+    User.is_authenticated = False
+    assert client_identity(dict(scope("10.0.0.1"), user=User())) == "ip:10.0.0.1"
+    # the credentials sent by the client are not verified
+    headers = [(b"authorization", b"Basic Ym9iOnNlY3JldA==")]
+    assert client_identity(scope("10.0.0.1", headers=headers)) == "ip:10.0.0.1"
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1000, burst=500)
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(250) == pytest.approx(0.25, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_dav_app_answers_429():
+    metrics = Metrics()
+    scheduler = Scheduler(max_concurrency_per_client=1, max_queue_per_client=0)
+    fs = MemoryFS()
+    fs.makedir("/dir")
+    app = DAVApp(fs, scheduler=scheduler, metrics=metrics)
+    async with TestClient(app) as client:
+        # the test client has no address
+        ticket = await scheduler.acquire({"method": "COPY", "headers": []})
+        response = await client.open("/dir", method="PROPFIND", headers={"Depth": "1"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        # not an expensive request
+        response = await client.open("/dir", method="PROPFIND", headers={"Depth": "0"})
+        assert response.status_code == 207
+        scheduler.release(ticket)
+
+        response = await client.open("/dir", method="PROPFIND", headers={"Depth": "1"})
+        assert response.status_code == 207
+    snapshot = metrics.snapshot()
+    assert "asgi_dav_scheduler_wait_seconds" in str(snapshot)
+    assert "asgi_dav_scheduler_rejected_total" in str(snapshot)
+
+
+@pytest.mark.asyncio
+async def test_bandwidth_shaping(monkeypatch):
+    delays = []
+    reserve = TokenBucket.reserve
+
+    def recording_reserve(self, amount):
+        delay = reserve(self, amount)
+        delays.append(delay)
+        return delay
+
+    monkeypatch.setattr(TokenBucket, "reserve", recording_reserve)
+    fs = MemoryFS()
+    fs.writebytes("/big.bin", b"x" * 600 * 1024)
+    scheduler = Scheduler(bandwidth_per_client=2 * 1024 * 1024, large_transfer_size=0)
+    async with TestClient(DAVApp(fs, scheduler=scheduler)) as client:
+        response = await client.get("/big.bin")
+        assert len(response.content) == 600 * 1024
+        # the first 2MiB are a burst : nothing is delayed yet
+        assert delays and max(delays) == 0
+        scheduler.bandwidth_per_client = 1024 * 1024
+        scheduler._clients.clear()
+        delays.clear()
+        await client.get("/big.bin")
+        await client.get("/big.bin")
+        # 1.2MiB in total, 1MiB of burst
+        assert max(delays) > 0
+
+
+@pytest.mark.asyncio
+async def test_archives_are_shaped():
+    fs = MemoryFS()
+    fs.makedir("/dir")
+    fs.writebytes("/dir/big.bin", b"x" * 600 * 1024)
+    scheduler = Scheduler(bandwidth_per_client=1024 * 1024, large_transfer_size=0)
+    throttled = []
+    throttle = scheduler.throttle
+
+    async def counting_throttle(scope, nbytes):
+        throttled.append(nbytes)
+        await throttle(scope, nbytes)
+
+    scheduler.throttle = counting_throttle
+    async with TestClient(DAVApp(fs, scheduler=scheduler)) as client:
+        response = await client.get("/dir", query_string={"archive": "tar"})
+        assert response.status_code == 200
+    assert sum(throttled) == len(response.content)
@@ -0,0 +1,169 @@
+import asyncio
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp, SearchIndex
+from asgi_dav.search import SearchQuery
+from fs.memoryfs import MemoryFS
+
+
+def make_fs() -> MemoryFS:
+    fs = MemoryFS()
+    fs.makedirs("/docs/reports")
+    fs.writetext("/docs/reports/annual-report-2023.pdf", "x" * 100)
+    fs.writetext("/docs/reports/annual-report-2024.pdf", "x" * 5000)
+    fs.writetext("/docs/notes.txt", "notes")
+    fs.writetext("/docs/.secret-report.txt", "hidden")
+    fs.writetext("/photo.jpg", "jpeg")
+    return fs
+
+
+def basicsearch(where: str, scope: str = "/", extra: str = "") -> str:
+    return f"""<?xml version="1.0" encoding="utf-8" ?>
+<D:searchrequest xmlns:D="DAV:">
+  <D:basicsearch>
+    <D:select><D:allprop/></D:select>
+    <D:from><D:scope><D:href>{scope}</D:href><D:depth>infinity</D:depth></D:scope></D:from>
+    <D:where>{where}</D:where>
+    {extra}
+  </D:basicsearch>
+</D:searchrequest>"""
+
+
+async def started(client, index: SearchIndex):
+    # wait for the initial indexing
+    await client.options("/")
+    await index._rebuild_task
+
+
+@pytest.mark.asyncio
+async def test_search_method():
+    index = SearchIndex()
+    app = DAVApp(make_fs(), search=index)
+    async with TestClient(app) as client:
+        await started(client, index)
+        assert await index.count() == 6
+
+        response = await client.open(
+            "/",
+            method="SEARCH",
+            data=basicsearch("<D:contains>report</D:contains>"),
+        )
+        assert response.status_code == 207
+        assert "<D:href>/docs/reports/annual-report-2023.pdf</D:href>" in response.text
+        assert "<D:href>/docs/reports/annual-report-2024.pdf</D:href>" in response.text
+        assert "secret" not in response.text
+
+        where = """<D:and>
+            <D:like><D:prop><D:displayname/></D:prop><D:literal>%.pdf</D:literal></D:like>
+            <D:gt><D:prop><D:getcontentlength/></D:prop><D:literal>1000</D:literal></D:gt>
+        </D:and>"""
+        response = await client.open("/", method="SEARCH", data=basicsearch(where))
+        assert "annual-report-2024.pdf" in response.text
+        assert "annual-report-2023.pdf" not in response.text
+
+        response = await client.open(
+            "/",
+            method="SEARCH",
+            data=basicsearch(
+                "<D:is-collection/>",
+                extra="<D:limit><D:nresults>1</D:nresults></D:limit>",
+            ),
+        )
+        assert response.text.count("<D:response>") == 1
+        response = await client.open(
+            "/",
+            method="SEARCH",
+            data=basicsearch(
+                "<D:is-collection/>",
+                extra="<D:limit><D:nresults>-1</D:nresults></D:limit>",
+            ),
+        )
+        assert response.status_code == 400
+
+        for where in ("<D:unknown/>", "<D:not/>", "<D:and/>", "<D:or/>"):
+            response = await client.open("/", method="SEARCH", data=basicsearch(where))
+            assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_index_follows_the_changes():
+    index = SearchIndex()
+    app = DAVApp(make_fs(), search=index)
+    async with TestClient(app) as client:
+        await started(client, index)
+
+        await client.put("/docs/budget.ods", data=b"budget")
+        response = await client.get("/docs", query_string={"search": "budget"})
+        assert response.status_code == 207
+        assert "<D:href>/docs/budget.ods</D:href>" in response.text
+
+        await client.open(
+            "/docs/reports",
+            method="MOVE",
+            headers={"Destination": "/archive"},
+        )
+        response = await client.get("/", query_string={"search": "annual"})
+        assert "/archive/annual-report-2023.pdf" in response.text
+        assert "/docs/reports" not in response.text
+
+        await client.delete("/archive/annual-report-2023.pdf")
+        response = await client.get("/", query_string={"search": "2023"})
+        assert "<D:response>" not in response.text
+
+
+@pytest.mark.asyncio
+async def test_directory_moves_and_copies():
+    index = SearchIndex(max_results=10)
+    app = DAVApp(make_fs(), search=index)
+    async with TestClient(app) as client:
+        await started(client, index)
+        scanned = []
+        scandir = app.backend.scandir
+
+        async def counting_scandir(path):
+            scanned.append(path)
+            return await scandir(path)
+
+        app.backend.scandir = counting_scandir
+        await client.open("/docs", method="MOVE", headers={"Destination": "/old"})
+        # rewritten in the index, not walked again
+        assert scanned == []
+        results = await index.search(SearchQuery.name_contains("report"))
+        assert sorted(path for path, _ in results) == [
+            "/old/reports",
+            "/old/reports/annual-report-2023.pdf",
+            "/old/reports/annual-report-2024.pdf",
+        ]
+        results = await index.search(SearchQuery.name_contains("notes", scope="/old"))
+        assert [path for path, _ in results] == ["/old/notes.txt"]
+
+        await client.open("/old", method="COPY", headers={"Destination": "/new"})
+        # indexed in the background
+        await asyncio.gather(*index._tasks)
+        results = await index.search(SearchQuery.name_contains("2024"))
+        assert sorted(path for path, _ in results) == [
+            "/new/reports/annual-report-2024.pdf",
+            "/old/reports/annual-report-2024.pdf",
+        ]
+
+        query = SearchQuery.name_contains("")
+        query.limit = -1
+        assert len(await index.search(query)) == 1
+
+
+@pytest.mark.asyncio
+async def test_persistent_index(tmp_path):
+    database = str(tmp_path / "index.sqlite")
+    fs = make_fs()
+    index = SearchIndex(database)
+    async with TestClient(DAVApp(fs, search=index)) as client:
+        await started(client, index)
+    index.close()
+
+    # reopened, the index is not rebuilt
+    index = SearchIndex(database)
+    async with TestClient(DAVApp(fs, search=index)) as client:
+        assert index._rebuild_task is None
+        response = await client.get("/", query_string={"search": "photo"})
+        assert "<D:href>/photo.jpg</D:href>" in response.text
+    index.close()
@@ -0,0 +1,75 @@
+import asyncio
+import time
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp
+from asgi_dav.singleflight import SingleFlight
+from fs.memoryfs import MemoryFS
+
+
+class SlowMemoryFS(MemoryFS):
+    """
+    A MemoryFS with slow directory listings, that counts them
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.scandir_calls = 0
+
+    def scandir(self, path, namespaces=None, page=None):
+        self.scandir_calls += 1
+        time.sleep(0.1)
+        return super().scandir(path, namespaces=namespaces, page=page)
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_result():
+    sf = SingleFlight()
+    calls = 0
+
+    async def op():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    results = await asyncio.gather(*[sf.do("op", "/foo", op) for _ in range(5)])
+    assert results == [1] * 5
+    assert calls == 1
+    assert sf.stats() == {"op": {"calls": 5, "collapsed": 4}}
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_exception():
+    sf = SingleFlight()
+
+    async def op():
+        await asyncio.sleep(0.05)
+        raise KeyError("foo")
+
+    results = await asyncio.gather(
+        *[sf.do("op", "/foo", op) for _ in range(3)], return_exceptions=True
+    )
+    assert all(isinstance(r, KeyError) for r in results)
+    # nothing is left in flight : the next call runs the operation again
+    with pytest.raises(KeyError):
+        await sf.do("op", "/foo", op)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_propfinds_are_collapsed():
+    fs = SlowMemoryFS()
+    fs.makedir("/foo")
+    for i in range(10):
+        fs.writetext(f"/foo/{i}", "bar")
+    app = DAVApp(fs)
+    async with TestClient(app) as client:
+        responses = await asyncio.gather(
+            *[
+                client.open("/foo", method="PROPFIND", headers={"Depth": "1"})
+                for _ in range(5)
+            ]
+        )
+    assert all(r.status_code == 207 for r in responses)
+    assert fs.scandir_calls == 1
+    assert app.singleflight.collapsed["scandir"] == 4
@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp, OSBackend, ChunkedUploads
+from fs.memoryfs import MemoryFS
+
+PARTS = [b"a" * 1000, b"b" * 1000, b"c" * 10]
+
+
+@pytest.fixture(params=["memory", "osbackend"])
+def app(request, tmp_path):
+    if request.param == "osbackend":
+        return DAVApp(OSBackend(str(tmp_path)), uploads=ChunkedUploads())
+    return DAVApp(MemoryFS(), uploads=ChunkedUploads())
+
+
+@pytest.mark.asyncio
+async def test_chunked_upload(app):
+    uploaded = []
+
+    async def on_upload(evt):
+        uploaded.append(evt.path)
+
+    app.on("file.uploaded", on_upload)
+    async with TestClient(app) as client:
+        response = await client.open("/.uploads/xfer1", method="MKCOL")
+        assert response.status_code == 201
+        # the parts can come in any order, in parallel
+        responses = await asyncio.gather(
+            *[client.put(f"/.uploads/xfer1/{n}", data=PARTS[n - 1]) for n in (3, 1, 2)]
+        )
+        assert all(r.status_code == 201 for r in responses)
+
+        # what was received, to resume an interrupted transfer
+        response = await client.open(
+            "/.uploads/xfer1", method="PROPFIND", headers={"Depth": "1"}
+        )
+        for n in (1, 2, 3):
+            assert f"<D:href>/.uploads/xfer1/{n}</D:href>" in response.text
+
+        response = await client.open(
+            "/.uploads/xfer1/.file",
+            method="MOVE",
+            headers={"Destination": "/big.bin", "OC-Total-Length": "2010"},
+        )
+        assert response.status_code == 201
+        response = await client.get("/big.bin")
+        assert response.content == b"".join(PARTS)
+        response = await client.open("/.uploads/xfer1", method="PROPFIND")
+        assert response.status_code == 404
+
+    # nothing is reported for the staging area
+    assert uploaded == ["/big.bin"]
+
+
+@pytest.mark.asyncio
+async def test_assembly_checks_the_length(app):
+    async with TestClient(app) as client:
+        await client.open("/.uploads/xfer2", method="MKCOL")
+        await client.put("/.uploads/xfer2/1", data=b"1234")
+        response = await client.open(
+            "/.uploads/xfer2/.file",
+            method="MOVE",
+            headers={"Destination": "/file", "OC-Total-Length": "5"},
+        )
+        assert response.status_code == 400
+        response = await client.get("/file")
+        assert response.status_code == 404
+
+        # the part is still there : the upload can be completed
+        await client.put("/.uploads/xfer2/2", data=b"5")
+        response = await client.open(
+            "/.uploads/xfer2/.file",
+            method="MOVE",
+            headers={"Destination": "/file", "OC-Total-Length": "5"},
+        )
+        assert response.status_code == 201
+        response = await client.get("/file")
+        assert response.content == b"12345"
+
+
+@pytest.mark.asyncio
+async def test_assembly_checks_the_parts(app):
+    async with TestClient(app) as client:
+        await client.open("/.uploads/xfer3", method="MKCOL")
+        # the length adds up, but part 2 is missing
+        await client.put("/.uploads/xfer3/1", data=b"12")
+        await client.put("/.uploads/xfer3/3", data=b"345")
+        response = await client.open(
+            "/.uploads/xfer3/.file",
+            method="MOVE",
+            headers={"Destination": "/file", "OC-Total-Length": "5"},
+        )
+        assert response.status_code == 400
+        response = await client.get("/file")
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_concurrent_assemblies(app):
+    running = peak = 0
+    assemble = app.uploads.assemble
+
+    async def slow_assemble(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            # long enough for the other request to come in
+            await asyncio.sleep(0.05)
+            await assemble(*args, **kwargs)
+        finally:
+            running -= 1
+
+    app.uploads.assemble = slow_assemble
+    async with TestClient(app) as client:
+        await client.open("/.uploads/xfer4", method="MKCOL")
+        for n, part in enumerate(PARTS, 1):
+            await client.put(f"/.uploads/xfer4/{n}", data=part)
+        responses = await asyncio.gather(
+            *[
+                client.open(
+                    "/.uploads/xfer4/.file",
+                    method="MOVE",
+                    headers={"Destination": "/big.bin"},
+                )
+                for _ in range(2)
+            ]
+        )
+        assert sorted(r.status_code for r in responses) == [201, 404]
+        assert peak == 1
+        response = await client.get("/big.bin")
+        assert response.content == b"".join(PARTS)
+
+
+@pytest.mark.asyncio
+async def test_expired_uploads_are_removed():
+    fs = MemoryFS()
+    uploads = ChunkedUploads(ttl=3600)
+    app = DAVApp(fs, uploads=uploads)
+    async with TestClient(app) as client:
+        await client.open("/.uploads/old", method="MKCOL")
+        await client.put("/.uploads/old/1", data=b"x")
+
+    assert await uploads.sweep(app.backend) == 0
+    uploads.ttl = -1
+    assert await uploads.sweep(app.backend) == 1
+    assert fs.listdir("/.uploads") == []
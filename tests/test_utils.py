@@ -1,4 +1,4 @@
-from asgi_dav.utils import to_rfc_1123, get_parent_href
+from asgi_dav.utils import to_rfc_1123, get_parent_href, make_data_url
 import datetime
 
 def test_to_rfc_1123():
@@ -13,4 +13,10 @@ def test_parent_href():
     assert get_parent_href("/a/b/c") == "/a/b/"
     assert get_parent_href("/a/b/c/") == "/a/b/"
     assert get_parent_href("/a/") == "/"
-    assert get_parent_href("/") == "/"
\ No newline at end of file
+    assert get_parent_href("/") == "/"
+
+def test_make_data_url():
+    url = make_data_url("folder.svg")
+    assert url.startswith("data:image/svg+xml;base64,")
+    # encoded once
+    assert make_data_url("folder.svg") is url
@@ -0,0 +1,174 @@
+import asyncio
+import ctypes
+import errno
+import threading
+import pytest
+from async_asgi_testclient import TestClient
+from asgi_dav import DAVApp, ChunkedUploads, OSBackend
+from asgi_dav.watcher import InotifyWatcher, inotify_available
+from fs.memoryfs import MemoryFS
+from fs.osfs import OSFS
+
+pytestmark = pytest.mark.skipif(
+    not inotify_available(), reason="inotify is not available"
+)
+
+
+@pytest.mark.asyncio
+async def test_external_changes_are_emitted(tmp_path):
+    app = DAVApp(OSFS(str(tmp_path)), watch=True)
+    received = []
+
+    async def on_event(evt):
+        received.append(evt)
+
+    app.on("*", on_event)
+    async with TestClient(app):
+        (tmp_path / "foo").write_text("foo")
+        (tmp_path / "foo").write_text("foofoo")
+        (tmp_path / "dir").mkdir()
+        await asyncio.sleep(0.5)
+        (tmp_path / "foo").rename(tmp_path / "dir" / "bar")
+        await asyncio.sleep(0.5)
+
+    assert [type(evt).__name__ for evt in received] == [
+        "FileUploadedEvent",
+        "DirectoryCreatedEvent",
+        "FileMovedEvent",
+    ]
+    assert received[2].path == "/foo"
+    assert received[2].dest_path == "/dir/bar"
+
+
+@pytest.mark.asyncio
+async def test_own_changes_are_not_reported_twice(tmp_path):
+    app = DAVApp(OSFS(str(tmp_path)), watch=True)
+    received = []
+
+    async def on_event(evt):
+        received.append(evt)
+
+    app.on("file.uploaded", on_event)
+    async with TestClient(app) as client:
+        response = await client.put("/foo", data=b"foo")
+        assert response.status_code == 201
+        await asyncio.sleep(0.5)
+
+    assert len(received) == 1
+
+
+@pytest.mark.asyncio
+async def test_mounts_are_watched(tmp_path):
+    app = DAVApp({"/local": OSBackend(str(tmp_path)), "/mem": MemoryFS()}, watch=True)
+    received = []
+
+    async def on_event(evt):
+        received.append(evt)
+
+    app.on("*", on_event)
+    async with TestClient(app) as client:
+        (tmp_path / "foo").write_text("foo")
+        await asyncio.sleep(0.5)
+        response = await client.put("/local/bar", data=b"bar")
+        assert response.status_code == 201
+        await asyncio.sleep(0.5)
+
+    assert [evt.path for evt in received] == ["/local/foo", "/local/bar"]
+
+
+def test_watch_requires_a_local_mount():
+    with pytest.raises(ValueError):
+        DAVApp({"/a": MemoryFS(), "/b": MemoryFS()}, watch=True)
+
+
+@pytest.mark.asyncio
+async def test_only_own_changes_are_suppressed(tmp_path):
+    app = DAVApp(OSFS(str(tmp_path)), watch=True, uploads=ChunkedUploads())
+    received = []
+
+    async def on_event(evt):
+        received.append((type(evt).__name__, evt.path))
+
+    app.on("*", on_event)
+    async with TestClient(app) as client:
+        await client.open("/dir", method="MKCOL")
+        await client.put("/dir/a", data=b"a")
+        # made by another program, right after
+        (tmp_path / "dir" / "b").write_text("b")
+        await client.open(
+            "/dir", method="COPY", headers={"Destination": "http://localhost/copy"}
+        )
+        await client.open("/.uploads/xfer", method="MKCOL")
+        await client.put("/.uploads/xfer/1", data=b"c")
+        await client.open(
+            "/.uploads/xfer/.file", method="MOVE", headers={"Destination": "/c"}
+        )
+        await asyncio.sleep(0.5)
+
+    assert sorted(received) == [
+        ("DirectoryCopiedEvent", "/dir"),
+        ("DirectoryCreatedEvent", "/dir"),
+        ("FileUploadedEvent", "/c"),
+        ("FileUploadedEvent", "/dir/a"),
+        ("FileUploadedEvent", "/dir/b"),
+    ]
+
+
+class NoWatchLeft:
+    def inotify_add_watch(self, fd, path, mask):
+        ctypes.set_errno(errno.ENOSPC)
+        return -1
+
+
+@pytest.mark.asyncio
+async def test_watch_failures_are_reported(tmp_path, caplog):
+    overflows = []
+
+    async def callback(event, evt):
+        pass
+
+    watcher = InotifyWatcher(
+        str(tmp_path), callback, overflow_callback=lambda: overflows.append(True)
+    )
+    watcher._loop = asyncio.get_running_loop()
+    watcher._libc = NoWatchLeft()
+    assert not watcher._add_watch("/")
+    await asyncio.sleep(0)
+    assert overflows == [True]
+    assert "cannot watch" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_new_trees_are_walked_in_the_executor(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    outside = tmp_path / "outside"
+    (outside / "a" / "b").mkdir(parents=True)
+    received = []
+    threads = []
+
+    async def callback(event, evt):
+        received.append((type(evt).__name__, evt.path))
+
+    watcher = InotifyWatcher(str(root), callback, coalesce_delay=0.05)
+    add_tree = watcher._add_tree
+
+    def recording_add_tree(path):
+        threads.append(threading.current_thread())
+        add_tree(path)
+
+    watcher._add_tree = recording_add_tree
+    await watcher.start()
+    try:
+        outside.rename(root / "moved")
+        await asyncio.sleep(0.2)
+        (root / "moved" / "a" / "b" / "f").write_text("f")
+        await asyncio.sleep(0.2)
+    finally:
+        await watcher.stop()
+
+    assert received == [
+        ("DirectoryCreatedEvent", "/moved"),
+        ("FileUploadedEvent", "/moved/a/b/f"),
+    ]
+    assert threading.main_thread() not in threads